@@ -1,7 +1,11 @@
+import threading
 import time
+from collections import OrderedDict
 from functools import wraps
 from typing import Any, Callable
 
+from src.primitive_db.metrics import metrics
+
 
 def handle_db_errors(func: Callable) -> Callable:
 	"""
@@ -27,15 +31,31 @@ def handle_db_errors(func: Callable) -> Callable:
 	return wrapper
 
 
+# Подтверждать опасные действия без вопроса (ключ --yes)
+_confirm_settings = {"assume_yes": False}
+
+
+def set_assume_yes(assume_yes: bool) -> None:
+	"""
+	Включает или выключает автоматическое подтверждение операций confirm_action.
+
+	:param assume_yes: (bool) True - не спрашивать подтверждение
+	"""
+	_confirm_settings["assume_yes"] = assume_yes
+
+
 def confirm_action(action_name: str) -> Callable:
 	"""
 	Декоратор-фабрика, запрашивающий подтверждение перед выполнением операции.
+	Если включено set_assume_yes(True), операция выполняется без вопроса.
 
 	:param action_name: человекочитаемое описание действия (например,"удалить таблицу")
 	"""
 	def decorator(func: Callable) -> Callable:
 		@wraps(func)
 		def wrapper(*args: Any, **kwargs: Any) -> Any:
+			if _confirm_settings["assume_yes"]:
+				return func(*args, **kwargs)
 			answer = (input(f'Вы уверены, что хотите "{action_name}"? [y/n]: ').strip()
                                                                             .lower())
 			if answer != "y":
@@ -54,43 +74,96 @@ def log_time(func: Callable) -> Callable:
 	"""
 	Декоратор, замеряющий время выполнения функции.
 
-	Выводит сообщение вида:
-	Функция <имя_функции> выполнилась за X.XXX секунд.
+	Время не печатается, а попадает в гистограмму function.<имя_функции>
+	метрик процесса (см. src.primitive_db.metrics и команду stats).
 	"""
+	name = f"function.{func.__name__}"
+
 	@wraps(func)
 	def wrapper(*args: Any, **kwargs: Any) -> Any:
-		start = time.monotonic()
-		result = func(*args, **kwargs)
-		elapsed = time.monotonic() - start
-		print(f"Функция '{func.__name__}' выполнилась за {elapsed:.3f} секунд.")
-		return result
+		with metrics.phase(name):
+			return func(*args, **kwargs)
 	return wrapper
 
 
-def create_cacher() -> Callable[[str, Callable[[], Any]], Any]:
+def create_cacher(max_size: int = 128,
+                  ttl: float | None = 300) -> Callable[[tuple, Callable[[], Any]], Any]:
 	"""
-	Функция-замыкание, реализующая кэширование результатов.
-
-	Возвращает внутреннюю функцию cache_result(key, value_func),
-	которая проверяет наличие результата в кэше по ключу.
-	Если значение есть — возвращает его.
-	Если нет — вызывает value_func(), сохраняет результат и возвращает его.
+	Функция-замыкание, реализующая LRU-кэширование результатов.
+
+	Возвращает внутреннюю функцию cache_result(key, value_func), которая проверяет
+	наличие результата в кэше по ключу. Ключ - кортеж, первый элемент которого имя
+	таблицы. Если значение есть и не старше ttl секунд - возвращает его.
+	Если нет - вызывает value_func(), сохраняет результат и возвращает его.
+	Когда записей больше max_size, вытесняется та, к которой дольше всего
+	не обращались. Для случаев, когда результат вычисляется по частям, есть
+	cache_result.get(key) и cache_result.put(key, value). Операции с кэшем
+	защищены блокировкой, поэтому кэш можно использовать из нескольких потоков.
+
+	:param max_size: (int) максимальное число записей в кэше
+	:param ttl: (float | None) время жизни записи в секундах, None - без ограничения
 	"""
-	cache = {}
-
-	def cache_result(key: str, value_func: Callable[[], Any]) -> Any:
-		if key in cache:
-			print(f"[КЭШ] Используется сохранённый результат для ключа: '{key}'")
-			return cache[key]
-		result = value_func()
-		cache[key] = result
+	cache: OrderedDict[tuple, tuple[float, Any]] = OrderedDict()
+	counters = {"hits": 0, "misses": 0, "evictions": 0}
+	lock = threading.Lock()
+
+	def get(key: tuple) -> Any | None:
+		"""Возвращает сохранённый результат по ключу или None."""
+		with lock:
+			entry = cache.get(key)
+			if entry is None or (ttl is not None
+					and time.monotonic() - entry[0] >= ttl):
+				counters["misses"] += 1
+				return None
+			cache.move_to_end(key)
+			counters["hits"] += 1
+		print(f"[КЭШ] Используется сохранённый результат для ключа: '{key}'")
+		return entry[1]
+
+	def put(key: tuple, value: Any) -> None:
+		"""Сохраняет результат по ключу, вытесняя давно не используемые записи."""
+		with lock:
+			cache[key] = (time.monotonic(), value)
+			cache.move_to_end(key)
+			while len(cache) > max_size:
+				cache.popitem(last=False)
+				counters["evictions"] += 1
+
+	def cache_result(key: tuple, value_func: Callable[[], Any]) -> Any:
+		result = get(key)
+		if result is None:
+			result = value_func()
+			put(key, result)
 		return result
 
-	def clear_cache() -> None:
-		"""Очищает весь кэш."""
-		cache.clear()
-		print("[КЭШ] Очищен.")
-
+	def clear_cache(table_name: str | None = None) -> None:
+		"""
+		Очищает кэш таблицы table_name, а если она не указана - весь кэш.
+		"""
+		with lock:
+			if table_name is None:
+				cache.clear()
+			else:
+				for key in [key for key in cache if key[0] == table_name]:
+					del cache[key]
+		if table_name is None:
+			print("[КЭШ] Очищен.")
+			return
+		print(f'[КЭШ] Очищен для таблицы "{table_name}".')
+
+	def stats() -> dict[str, Any]:
+		"""Возвращает статистику обращений к кэшу."""
+		with lock:
+			total = counters["hits"] + counters["misses"]
+			return {
+				**counters,
+				"size": len(cache),
+				"hit_ratio": counters["hits"] / total if total else 0.0,
+			}
+
+	cache_result.get = get
+	cache_result.put = put
 	cache_result.clear_cache = clear_cache
+	cache_result.stats = stats
 
 	return cache_result
@@ -0,0 +1,194 @@
+import re
+from collections.abc import Iterable, Mapping
+from typing import Any
+
+from src.primitive_db.rows import column_getter
+
+# Агрегатная функция в списке столбцов select: count(*), sum(age), ...
+_AGGREGATE = re.compile(r"(count|sum|min|max|avg)\((\*|[^()\s]+)\)", re.IGNORECASE)
+
+# Типы столбцов, по которым считаются sum и avg
+_NUMERIC_TYPES = {"int"}
+
+
+class _Count:
+	__slots__ = ("value",)
+
+	def __init__(self) -> None:
+		self.value = 0
+
+	def add(self, _: Any) -> None:
+		self.value += 1
+
+	def result(self) -> int:
+		return self.value
+
+
+class _Sum:
+	__slots__ = ("value",)
+
+	def __init__(self) -> None:
+		self.value = 0
+
+	def add(self, value: int) -> None:
+		self.value += value
+
+	def result(self) -> int:
+		return self.value
+
+
+class _Min:
+	__slots__ = ("value",)
+
+	def __init__(self) -> None:
+		self.value = None
+
+	def add(self, value: Any) -> None:
+		if self.value is None or value < self.value:
+			self.value = value
+
+	def result(self) -> Any:
+		return self.value
+
+
+class _Max:
+	__slots__ = ("value",)
+
+	def __init__(self) -> None:
+		self.value = None
+
+	def add(self, value: Any) -> None:
+		if self.value is None or value > self.value:
+			self.value = value
+
+	def result(self) -> Any:
+		return self.value
+
+
+class _Avg:
+	__slots__ = ("total", "count")
+
+	def __init__(self) -> None:
+		self.total = 0
+		self.count = 0
+
+	def add(self, value: int) -> None:
+		self.total += value
+		self.count += 1
+
+	def result(self) -> float | None:
+		return self.total / self.count if self.count else None
+
+
+_ACCUMULATORS = {"count": _Count, "sum": _Sum, "min": _Min, "max": _Max, "avg": _Avg}
+
+
+class Aggregate:
+	"""
+	Агрегатная функция из списка столбцов select.
+
+	:param func: (str) count, sum, min, max или avg
+	:param column: (str | None) столбец, None - count(*)
+	"""
+
+	def __init__(self, func: str, column: str | None) -> None:
+		self.func = func
+		self.column = column
+		self.name = f"{func}({column or '*'})"
+
+	def __repr__(self) -> str:
+		return f"Aggregate({self.name!r})"
+
+
+def is_aggregate(projection: list[str]) -> bool:
+	"""
+	Проверяет, есть ли в списке столбцов select агрегатные функции.
+
+	:param projection: (list[str]) столбцы из команды select
+	:return: (bool) True - запрос агрегирующий
+	"""
+	return any(_AGGREGATE.fullmatch(item) for item in projection)
+
+
+def parse_aggregates(projection: list[str], columns: dict[str, str],
+                     group_by: list[str]) -> list[Aggregate | str]:
+	"""
+	Разбирает список столбцов агрегирующего select. Кроме агрегатных функций в
+	нём допустимы только столбцы из group by.
+
+	:param projection: (list[str]) столбцы из команды select
+	:param columns: (dict[str, str]) схема таблицы {столбец: тип}
+	:param group_by: (list[str]) столбцы группировки
+	:return: (list[Aggregate | str]) агрегатные функции и столбцы группировки
+	:raises ValueError: если функция или столбец некорректны
+	"""
+	for col in group_by:
+		if col not in columns:
+			raise ValueError(f"столбца '{col}' не существует")
+
+	items = []
+	for item in projection:
+		match = _AGGREGATE.fullmatch(item)
+		if match is None:
+			if item not in group_by:
+				raise ValueError(f"столбец {item} должен быть в group by или "
+					f"внутри агрегатной функции")
+			items.append(item)
+			continue
+		func, column = match.group(1).lower(), match.group(2)
+		if column == "*":
+			if func != "count":
+				raise ValueError(f"{func}(*) не поддерживается")
+			column = None
+		elif column not in columns:
+			raise ValueError(f"столбца '{column}' не существует")
+		elif func in ("sum", "avg") and columns[column] not in _NUMERIC_TYPES:
+			raise ValueError(f"{func} применим только к столбцам типа int, "
+				f"а {column}:{columns[column]}")
+		items.append(Aggregate(func, column))
+	return items
+
+
+def aggregate_rows(rows: Iterable[Mapping], items: list[Aggregate | str],
+                   group_by: list[str]) -> list[dict]:
+	"""
+	Вычисляет агрегаты за один проход по записям: для каждой группы (значений
+	столбцов group by) заводится свой набор накопителей в хеш-таблице.
+
+	:param rows: (Iterable[Mapping]) записи
+	:param items: (list[Aggregate | str]) результат parse_aggregates
+	:param group_by: (list[str]) столбцы группировки, пустой список - одна группа
+	:return: (list[dict]) строки результата {столбец: значение}, по порядку групп
+	"""
+	aggregates = [item for item in items if isinstance(item, Aggregate)]
+	factories = [_ACCUMULATORS[agg.func] for agg in aggregates]
+	# count(*) получает саму запись: значение ему не важно
+	getters = [None if agg.column is None else column_getter(agg.column)
+		for agg in aggregates]
+	key_getters = [column_getter(col) for col in group_by]
+
+	groups: dict[tuple, list] = {}
+	for row in rows:
+		key = tuple([get(row) for get in key_getters])
+		accumulators = groups.get(key)
+		if accumulators is None:
+			accumulators = groups[key] = [factory() for factory in factories]
+		for accumulator, get in zip(accumulators, getters):
+			accumulator.add(row if get is None else get(row))
+
+	if not groups and not group_by:
+		# без группировки результат есть всегда: count(*) = 0 и т.д.
+		groups[()] = [factory() for factory in factories]
+
+	result = []
+	for key in sorted(groups):
+		values = dict(zip(group_by, key))
+		accumulators = iter(groups[key])
+		line = {}
+		for item in items:
+			if isinstance(item, Aggregate):
+				line[item.name] = next(accumulators).result()
+			else:
+				line[item] = values[item]
+		result.append(line)
+	return result
@@ -0,0 +1,495 @@
+import threading
+from collections.abc import Callable, Iterable, Iterator, Mapping, Sequence
+from contextlib import ExitStack, contextmanager
+from functools import partial
+from itertools import islice
+from typing import Any
+
+from src.primitive_db.aggregate import aggregate_rows, parse_aggregates
+from src.primitive_db.concurrency import RWLock, SingleWriter
+from src.primitive_db.core import delete_rows, insert_records, update_rows
+from src.primitive_db.errors import (
+	BatchValidationError,
+	QueryError,
+	TableExistsError,
+	ValidationError,
+)
+from src.primitive_db.indexes import INDEX_KINDS
+from src.primitive_db.schema import (
+	build_schema,
+	check_columns,
+	check_storage,
+	convert_changes,
+	convert_record,
+	record_converter,
+	table_schema,
+)
+from src.primitive_db.store import TableStore
+from src.primitive_db.utils import (
+	buffered_table_logs,
+	remove_table_files,
+	split_command,
+)
+from src.primitive_db.where import Condition, iter_rows, parse_condition
+
+
+class Database:
+	"""
+	Подключение к базе данных для использования из Python-кода, без REPL.
+
+	Таблицы держатся в памяти между вызовами (TableStore), изменения сразу
+	попадают в журналы таблиц, а ошибки выбрасываются исключениями из
+	src.primitive_db.errors вместо печати сообщений. Работает с теми же файлами,
+	что и консольное приложение, и может использоваться вместе с ним.
+
+	Подключение можно использовать из нескольких потоков. Чтения (select, count)
+	выполняются параллельно под разделяемой блокировкой таблицы, а все изменения
+	передаются единственному потоку-писателю (SingleWriter). Он выполняет
+	накопившиеся задания пачкой: операции журналов и метаданные пачки пишутся
+	одной записью журнала фиксации (TableStore.atomic), а вызов возвращается
+	после её записи. Несколько изменений, которые должны сохраниться вместе,
+	задаются транзакцией (transaction). Изменённые записи заменяются новыми
+	словарями, поэтому уже выбранные записи не меняются под читателем.
+
+	Пример:
+	>>> with Database() as db:
+	...     db.create_table("users", {"name": "str", "age": "int"})
+	...     db.insert_many("users", [("Alice", 30), {"name": "Bob", "age": 25}])
+	...     list(db.select("users", where="age > 26", columns=["name"]))
+	[1, 2]
+	[{'name': 'Alice'}]
+	"""
+
+	def __init__(self, store: TableStore | None = None) -> None:
+		self.store = store or TableStore()
+		self._table_locks: dict[str, RWLock] = {}
+		self._table_locks_guard = threading.Lock()
+		# загрузка таблиц и индексов в TableStore выполняется по одной
+		self._load_lock = threading.Lock()
+		self._batch_locks: ExitStack | None = None
+		self._batch_logs: dict[str, list[dict]] = {}
+		self._batch_written: set[str] = set()
+		self._writer = SingleWriter(self._write_batch)
+
+	def __enter__(self) -> "Database":
+		return self
+
+	def __exit__(self, *exc_info: Any) -> None:
+		self.close()
+
+	def close(self) -> None:
+		"""
+		Дожидается поставленных изменений, останавливает поток-писатель и
+		сворачивает журналы изменённых таблиц в снимки.
+		"""
+		self._writer.close()
+		self.store.flush()
+
+	def _rwlock(self, table_name: str) -> RWLock:
+		with self._table_locks_guard:
+			return self._table_locks.setdefault(table_name, RWLock())
+
+	@contextmanager
+	def _shared(self, table_name: str) -> Iterator[None]:
+		"""Блокировка таблицы для чтения: от потока-писателя и других процессов."""
+		with self._rwlock(table_name).read(), self.store.lock(table_name):
+			yield
+
+	def _exclusive(self, table_name: str) -> None:
+		"""
+		Захватывает таблицу для изменения до конца текущей пачки заданий
+		(вызывается только в потоке-писателе).
+		"""
+		if table_name in self._batch_written:
+			return
+		self._batch_locks.enter_context(self._rwlock(table_name).write())
+		self._batch_locks.enter_context(self.store.lock(table_name, exclusive=True))
+		self._batch_written.add(table_name)
+
+	@contextmanager
+	def _write_batch(self) -> Iterator[None]:
+		"""
+		Контекст пачки заданий потока-писателя: захваченные таблицы остаются
+		заблокированными, пока их журналы и метаданные не будут сохранены.
+		"""
+		with ExitStack() as locks:
+			self._batch_locks = locks
+			try:
+				with self.store.atomic():
+					with buffered_table_logs() as self._batch_logs:
+						yield
+					for table_name in self._batch_written:
+						if table_name in self.store.metadata:
+							self.store.written(table_name)
+			finally:
+				self._batch_locks = None
+				self._batch_logs = {}
+				self._batch_written = set()
+
+	def _rows(self, table_name: str) -> tuple[Mapping[int, dict], dict]:
+		with self._load_lock:
+			return self.store.rows(table_name), self.store.indexes(table_name)
+
+	def _schema(self, table_name: str) -> dict[str, str]:
+		return table_schema(self.store.metadata, table_name)
+
+	def _condition(self, table_name: str,
+			where: str | Condition | None) -> Condition | None:
+		if where is None or isinstance(where, Condition):
+			return where
+		try:
+			return parse_condition(split_command(where), self._schema(table_name))
+		except ValueError as e:
+			raise QueryError(f"некорректное условие WHERE: {e}") from e
+
+	def tables(self) -> list[str]:
+		"""Возвращает имена всех таблиц."""
+		return list(self.store.metadata)
+
+	def columns(self, table_name: str) -> dict[str, str]:
+		"""
+		Возвращает схему таблицы.
+
+		:param table_name: (str) имя таблицы
+		:return: (dict[str, str]) схема {столбец: тип}, включая ID
+		"""
+		return dict(self._schema(table_name))
+
+	def create_table(self, table_name: str,
+			columns: Mapping[str, str] | Sequence[str],
+			storage: str = "json") -> None:
+		"""
+		Создаёт таблицу. Столбец ID: int добавляется автоматически.
+
+		:param table_name: (str) имя таблицы
+		:param columns: {столбец: тип} или описания вида "столбец:тип"
+		:param storage: (str) формат хранения: "json", "columnar" или "segmented"
+		:raises TableExistsError: если таблица уже существует
+		:raises ValidationError: если тип столбца или формат некорректны
+		"""
+		if isinstance(columns, Mapping):
+			columns = [f"{name}:{type_}" for name, type_ in columns.items()]
+		check_storage(storage)
+		schema = build_schema(list(columns))
+		self._writer.submit(self._create_table, table_name, schema, storage)
+
+	def _create_table(self, table_name: str, schema: dict[str, str],
+			storage: str) -> None:
+		with self.store.metadata_lock():
+			metadata = self.store.metadata
+			if table_name in metadata:
+				raise TableExistsError(f'Таблица "{table_name}" уже существует.')
+			metadata[table_name] = {"columns": schema, "next_id": 1, "storage": storage,
+				"rows": 0}
+			self.store.save_metadata(metadata, table_name)
+			self.store.commit_metadata()
+
+	def drop_table(self, table_name: str) -> None:
+		"""
+		Удаляет таблицу вместе с её файлами и индексами.
+
+		:param table_name: (str) имя таблицы
+		:raises TableNotFoundError: если таблицы нет
+		"""
+		self._writer.submit(self._drop_table, table_name)
+
+	def _drop_table(self, table_name: str) -> None:
+		self._schema(table_name)
+		self._exclusive(table_name)
+		with self.store.metadata_lock():
+			metadata = self.store.metadata
+			del metadata[table_name]
+			# изменения таблицы из этой же пачки в журнал уже не нужны
+			self._batch_logs.pop(table_name, None)
+			remove_table_files(table_name)
+			self.store.save_metadata(metadata, table_name)
+			self.store.commit_metadata()
+			self.store.forget(table_name)
+		index_metadata = self.store.index_metadata
+		if index_metadata.pop(table_name, None) is not None:
+			self.store.save_index_metadata(index_metadata)
+
+	def create_index(self, table_name: str, column: str, kind: str = "hash") -> None:
+		"""
+		Создаёт индекс по столбцу таблицы.
+
+		:param table_name: (str) имя таблицы
+		:param column: (str) индексируемый столбец
+		:param kind: (str) вид индекса: "hash" или "sorted"
+		:raises ColumnNotFoundError: если столбца нет
+		:raises ValidationError: если вид индекса неизвестен
+		"""
+		check_columns(self._schema(table_name), [column])
+		if kind not in INDEX_KINDS:
+			raise ValidationError(f"Некорректный вид индекса: {kind}.")
+		self._writer.submit(self._create_index, table_name, column, kind)
+
+	def _create_index(self, table_name: str, column: str, kind: str) -> None:
+		self._exclusive(table_name)
+		index_metadata = self.store.index_metadata
+		index_metadata.setdefault(table_name, {})[column] = kind
+		self.store.save_index_metadata(index_metadata)
+
+	def insert(self, table_name: str,
+			values: Sequence[Any] | Mapping[str, Any]) -> int:
+		"""
+		Добавляет запись.
+
+		:param table_name: (str) имя таблицы
+		:param values: значения по порядку столбцов (без ID) или {столбец: значение}
+		:return: (int) ID новой записи
+		:raises ValidationError: если запись не подходит под схему
+		"""
+		schema = self._schema(table_name)
+		record = convert_record(schema, values)
+		return self._writer.submit(self._insert_many, table_name, [record])[0]
+
+	def insert_many(self, table_name: str,
+			rows: Iterable[Sequence[Any] | Mapping[str, Any]],
+			skip_invalid: bool = False) -> list[int | None]:
+		"""
+		Добавляет записи одной записью в журнал. Записи проверяются пачкой по
+		столбцам, ID выдаются одним блоком. Если какие-то записи не подходят под
+		схему, по умолчанию не добавляется ни одна, а в исключении перечислены
+		все неподходящие записи; с skip_invalid=True добавляются остальные.
+
+		:param table_name: (str) имя таблицы
+		:param rows: записи: значения по порядку столбцов или словари
+		:param skip_invalid: (bool) добавлять подходящие записи, пропуская остальные
+		:return: (list[int | None]) ID новых записей по порядку rows, None на месте
+			пропущенных
+		:raises TableNotFoundError: если таблицы нет
+		:raises BatchValidationError: если есть неподходящие записи и skip_invalid
+			не задан
+		"""
+		records, errors = record_converter(self._schema(table_name)).convert(rows)
+		if errors and not skip_invalid:
+			raise BatchValidationError(errors)
+		valid = [record for record in records if record is not None]
+		ids = iter(self._writer.submit(self._insert_many, table_name, valid))
+		return [next(ids) if record is not None else None for record in records]
+
+	def _insert_many(self, table_name: str, records: list[dict]) -> list[int]:
+		self._schema(table_name)
+		self._exclusive(table_name)
+		metadata = self.store.metadata
+		table_data, indexes = self._rows(table_name)
+		added = insert_records(metadata, table_name, table_data, records, indexes)
+		self.store.save_metadata(metadata, table_name)
+		return [row["ID"] for row in added]
+
+	def select(self, table_name: str, where: str | Condition | None = None,
+			columns: Sequence[str] | None = None, limit: int | None = None,
+			offset: int = 0) -> Iterator[dict]:
+		"""
+		Возвращает итератор по записям таблицы в порядке ID.
+
+		Подходящие записи определяются сразу, под блокировкой таблицы, а их
+		копии выдаются по мере перебора: изменения, сделанные после вызова,
+		на результат не влияют.
+
+		:param table_name: (str) имя таблицы
+		:param where: условие, например "age > 18 and name != Bob"
+		:param columns: (Sequence[str] | None) выводимые столбцы, None - все
+		:param limit: (int | None) наибольшее число записей
+		:param offset: (int) сколько подходящих записей пропустить
+		:return: (Iterator[dict]) записи
+		:raises TableNotFoundError: если таблицы нет
+		:raises ColumnNotFoundError: если столбца из columns нет
+		:raises QueryError: если условие некорректно
+		"""
+		check_columns(self._schema(table_name), columns or ())
+		condition = self._condition(table_name, where)
+
+		with self._shared(table_name):
+			table_data, indexes = self._rows(table_name)
+			if condition is None:
+				rows = iter(table_data.values())
+			else:
+				rows = iter_rows(table_data, condition, indexes)
+			stop = None if limit is None else offset + limit
+			# записи не меняются на месте (см. update_rows), поэтому список
+			# выбранных записей - снимок на момент вызова
+			selected = list(islice(rows, offset, stop))
+		return self._iter_selected(selected, columns)
+
+	@staticmethod
+	def _iter_selected(rows: list[dict],
+			columns: Sequence[str] | None) -> Iterator[dict]:
+		for row in rows:
+			yield {col: row[col] for col in columns} if columns else dict(row.items())
+
+	def update(self, table_name: str, changes: Mapping[str, Any],
+			where: str | Condition | None = None) -> int:
+		"""
+		Обновляет записи по условию (без условия - все записи).
+
+		:param table_name: (str) имя таблицы
+		:param changes: (Mapping[str, Any]) изменения {столбец: значение}
+		:param where: условие выборки
+		:return: (int) количество обновлённых записей
+		:raises ValidationError: при попытке изменить ID или неподходящем значении
+		"""
+		changes = convert_changes(self._schema(table_name), changes)
+		condition = self._condition(table_name, where)
+		return self._writer.submit(self._update, table_name, changes, condition)
+
+	def _update(self, table_name: str, changes: dict[str, Any],
+			condition: Condition | None) -> int:
+		self._schema(table_name)
+		self._exclusive(table_name)
+		table_data, indexes = self._rows(table_name)
+		rows = list(table_data.values() if condition is None
+			else iter_rows(table_data, condition, indexes))
+		update_rows(table_name, table_data, rows, changes, indexes)
+		return len(rows)
+
+	def delete(self, table_name: str, where: str | Condition | None = None) -> int:
+		"""
+		Удаляет записи по условию (без условия - все записи).
+
+		:param table_name: (str) имя таблицы
+		:param where: условие удаления
+		:return: (int) количество удалённых записей
+		"""
+		self._schema(table_name)
+		condition = self._condition(table_name, where)
+		return self._writer.submit(self._delete, table_name, condition)
+
+	def _delete(self, table_name: str, condition: Condition | None) -> int:
+		self._schema(table_name)
+		self._exclusive(table_name)
+		table_data, indexes = self._rows(table_name)
+		rows = list(table_data.values() if condition is None
+			else iter_rows(table_data, condition, indexes))
+		return len(delete_rows(table_name, table_data, rows, indexes))
+
+	def transaction(self) -> "Transaction":
+		"""
+		Начинает транзакцию: изменения, заданные в блоке with, выполняются
+		вместе при выходе из него и сохраняются одной записью журнала фиксации -
+		после сбоя видны все или ни одного. Транзакции разных потоков,
+		завершившиеся одновременно, попадают в одну пачку потока-писателя и
+		делят одну запись на диск. Если блок прерван исключением, изменения
+		не выполняются.
+
+		Пример:
+		>>> with db.transaction() as tx:
+		...     tx.update("accounts", {"balance": 50}, where="name = Alice")
+		...     tx.insert("accounts", ["Bob", 50])
+		>>> tx.results
+		[1, 2]
+
+		:return: (Transaction) транзакция
+		"""
+		return Transaction(self)
+
+	def _transaction(self, operations: list[tuple[str, Callable[[], Any]]]) -> list:
+		# таблицы проверяются и загружаются до первого изменения: если какой-то
+		# нет, транзакция не меняет ни одной
+		for table_name, _ in operations:
+			self._schema(table_name)
+			self._exclusive(table_name)
+			self._rows(table_name)
+		return [apply() for _, apply in operations]
+
+	def count(self, table_name: str) -> int:
+		"""
+		Возвращает количество записей в таблице.
+
+		:param table_name: (str) имя таблицы
+		:return: (int) количество записей (из метаданных, без просмотра таблицы)
+		"""
+		self._schema(table_name)
+		with self._shared(table_name):
+			return self.store.row_count(table_name)
+
+	def aggregate(self, table_name: str, items: Sequence[str],
+			where: str | Condition | None = None,
+			group_by: Sequence[str] = ()) -> list[dict]:
+		"""
+		Вычисляет агрегаты за один проход по записям.
+
+		:param table_name: (str) имя таблицы
+		:param items: (Sequence[str]) агрегатные функции (count(*), sum(col),
+			min(col), max(col), avg(col)) и столбцы из group_by
+		:param where: условие выборки
+		:param group_by: (Sequence[str]) столбцы группировки
+		:return: (list[dict]) строки результата по возрастанию значений группы
+		:raises QueryError: если функция или столбец некорректны
+		"""
+		group_by = list(group_by)
+		try:
+			parsed = parse_aggregates(list(items), self._schema(table_name), group_by)
+		except ValueError as e:
+			raise QueryError(f"некорректный запрос: {e}") from e
+		condition = self._condition(table_name, where)
+		with self._shared(table_name):
+			table_data, indexes = self._rows(table_name)
+			rows = (table_data.values() if condition is None
+				else iter_rows(table_data, condition, indexes))
+			return aggregate_rows(rows, parsed, group_by)
+
+
+class Transaction:
+	"""
+	Транзакция подключения (см. Database.transaction). Методы проверяют
+	изменения сразу и выбрасывают те же исключения, что одноимённые методы
+	Database, а выполняются изменения потоком-писателем все вместе при выходе
+	из блока with. results - их итоги по порядку: ID новой записи (insert),
+	список ID (insert_many), количество записей (update, delete).
+	"""
+
+	def __init__(self, db: Database) -> None:
+		self._db = db
+		self._operations: list[tuple[str, Callable[[], Any]]] = []
+		self.results: list[Any] = []
+
+	def __enter__(self) -> "Transaction":
+		return self
+
+	def __exit__(self, exc_type: type | None, *exc_info: Any) -> None:
+		operations, self._operations = self._operations, []
+		if exc_type is None and operations:
+			self.results = self._db._writer.submit(self._db._transaction, operations)
+
+	def insert(self, table_name: str,
+			values: Sequence[Any] | Mapping[str, Any]) -> None:
+		"""Добавляет запись (см. Database.insert)."""
+		record = convert_record(self._db._schema(table_name), values)
+		self._operations.append((table_name,
+			lambda: self._db._insert_many(table_name, [record])[0]))
+
+	def insert_many(self, table_name: str,
+			rows: Iterable[Sequence[Any] | Mapping[str, Any]]) -> None:
+		"""Добавляет записи; неподходящих быть не должно (см. Database.insert_many)."""
+		records, errors = record_converter(self._db._schema(table_name)).convert(rows)
+		if errors:
+			raise BatchValidationError(errors)
+		self._operations.append((table_name,
+			partial(self._db._insert_many, table_name, records)))
+
+	def update(self, table_name: str, changes: Mapping[str, Any],
+			where: str | Condition | None = None) -> None:
+		"""Обновляет записи по условию (см. Database.update)."""
+		changes = convert_changes(self._db._schema(table_name), changes)
+		condition = self._db._condition(table_name, where)
+		self._operations.append((table_name,
+			partial(self._db._update, table_name, changes, condition)))
+
+	def delete(self, table_name: str, where: str | Condition | None = None) -> None:
+		"""Удаляет записи по условию (см. Database.delete)."""
+		self._db._schema(table_name)
+		condition = self._db._condition(table_name, where)
+		self._operations.append((table_name,
+			partial(self._db._delete, table_name, condition)))
+
+
+def connect(store: TableStore | None = None) -> Database:
+	"""
+	Открывает подключение к базе данных.
+
+	:param store: (TableStore | None) хранилище таблиц, по умолчанию - файлы проекта
+	:return: (Database) подключение
+	"""
+	return Database(store)
@@ -0,0 +1,15 @@
+from src.primitive_db.benchmarks.suite import (
+	compare_results,
+	load_results,
+	print_results,
+	run_benchmarks,
+	save_results,
+)
+
+__all__ = [
+	"compare_results",
+	"load_results",
+	"print_results",
+	"run_benchmarks",
+	"save_results",
+]
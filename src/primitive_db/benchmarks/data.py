@@ -0,0 +1,34 @@
+import random
+from typing import Any
+
+
+def generate_value(rnd: random.Random, type_: str) -> Any:
+	"""
+	Генерирует случайное значение столбца: int - от 0 до 99, str - одно из
+	тысячи имён, bool - True или False.
+
+	:param rnd: (random.Random) генератор случайных чисел
+	:param type_: (str) тип столбца
+	:return: значение
+	"""
+	if type_ == "int":
+		return rnd.randrange(100)
+	if type_ == "bool":
+		return rnd.random() < 0.5
+	return f"user{rnd.randrange(1000)}"
+
+
+def generate_values(schema: dict[str, str], count: int,
+                    seed: int = 0) -> list[tuple]:
+	"""
+	Генерирует значения записей синтетической таблицы. При одинаковом seed
+	данные одинаковы, поэтому результаты разных запусков сравнимы.
+
+	:param schema: (dict[str, str]) схема {столбец: тип} без ID
+	:param count: (int) число записей
+	:param seed: (int) начальное значение генератора
+	:return: (list[tuple]) значения по порядку столбцов
+	"""
+	rnd = random.Random(seed)
+	types = list(schema.values())
+	return [tuple(generate_value(rnd, type_) for type_ in types) for _ in range(count)]
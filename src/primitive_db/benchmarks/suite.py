@@ -0,0 +1,224 @@
+import json
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+from src.primitive_db.api import Database
+from src.primitive_db.benchmarks.data import generate_value, generate_values
+from src.primitive_db.constants import BENCH_TOLERANCE, ROOT_DIR
+from src.primitive_db.statements import clear_plan_cache, parse_statement
+from src.primitive_db.store import TableStore
+from src.primitive_db.utils import (
+	load_table_data,
+	remove_table_files,
+	save_table_data,
+	table_lock_path,
+)
+
+# Таблицы замеров создаются в каталоге данных под этим префиксом и удаляются
+_TABLE_PREFIX = "__bench_"
+# Сколько поисков по ID выполняется для замера point_select
+_POINT_LOOKUPS = 1000
+# Сколько раз запускается новый процесс для замера cold_start (берётся лучший) и
+# сколько команд разбирается для замеров parse и parse_cached
+_STARTUP_RUNS = 5
+_PARSE_STATEMENTS = 2000
+# Разница меньше этой (в секундах) считается шумом и не считается замедлением
+_NOISE = 0.001
+
+# Замеры в порядке выполнения: все значения - секунды, point_select - на один поиск
+OPERATIONS = ("create_table", "bulk_insert", "save", "load", "point_select",
+              "filtered_select", "update", "delete")
+# Замеры запуска и разбора команд (секунды на запуск и на все команды замера)
+STARTUP_OPERATIONS = ("cold_start", "parse", "parse_cached")
+
+
+def _timed(func: Callable[[], Any]) -> float:
+	start = time.perf_counter()
+	func()
+	return time.perf_counter() - start
+
+
+def bench_table(size: int, schema: dict[str, str], storage: str = "json",
+                seed: int = 0) -> dict[str, float]:
+	"""
+	Замеряет операции над синтетической таблицей из size записей: создание,
+	вставку одной пачкой, сохранение и загрузку снимка через utils, поиск по ID,
+	выборку по условию без индекса, update и delete (по 1% записей).
+
+	Таблица создаётся в каталоге данных с отдельными файлами метаданных и
+	удаляется после замера.
+
+	:param size: (int) число записей
+	:param schema: (dict[str, str]) схема {столбец: тип} без ID
+	:param storage: (str) формат хранения: "json", "columnar" или "segmented"
+	:param seed: (int) начальное значение генератора данных
+	:return: (dict[str, float]) время каждой операции в секундах
+	"""
+	table = f"{_TABLE_PREFIX}{size}"
+	values = generate_values(schema, size, seed)
+	rnd = random.Random(seed)
+	column, type_ = next(iter(schema.items()))
+	results = {}
+
+	with tempfile.TemporaryDirectory() as meta_dir:
+		store = TableStore(Path(meta_dir) / "db_meta.json",
+			Path(meta_dir) / "db_indexes.json")
+		db = Database(store)
+		try:
+			results["create_table"] = _timed(
+				lambda: db.create_table(table, schema, storage))
+			results["bulk_insert"] = _timed(lambda: db.insert_many(table, values))
+
+			rows = list(store.table(table).values())
+			columns = db.columns(table)
+			results["save"] = _timed(
+				lambda: save_table_data(table, rows, storage, columns))
+			results["load"] = _timed(lambda: load_table_data(table, storage, columns))
+			store.forget(table)
+			rows.clear()
+
+			ids = [rnd.randint(1, size) for _ in range(_POINT_LOOKUPS)]
+			results["point_select"] = _timed(
+				lambda: [list(db.select(table, where=f"ID = {row_id}"))
+					for row_id in ids]) / len(ids)
+			results["filtered_select"] = _timed(
+				lambda: list(db.select(table, where=f"{column} = {values[0][0]}")))
+
+			# по 1% записей с конца и с начала таблицы
+			step = max(1, size // 100)
+			change = {column: generate_value(rnd, type_)}
+			results["update"] = _timed(
+				lambda: db.update(table, change, where=f"ID > {size - step}"))
+			results["delete"] = _timed(lambda: db.delete(table, where=f"ID <= {step}"))
+		finally:
+			db.close()
+			remove_table_files(table)
+			table_lock_path(table).unlink(missing_ok=True)
+	return results
+
+
+def bench_startup() -> dict[str, float]:
+	"""
+	Замеряет запуск приложения и разбор команд: cold_start - выполнение
+	скрипта из одной команды exit в новом процессе интерпретатора (от запуска
+	до выхода), parse - разбор команды, плана которой нет в кэше, parse_cached -
+	разбор повторной команды.
+
+	:return: (dict[str, float]) время запуска и разбора _PARSE_STATEMENTS команд
+		в секундах
+	"""
+	command = [sys.executable, "-c", "from src.primitive_db.main import main; main()"]
+	cold_start = min(
+		_timed(lambda: subprocess.run(command, input=b"exit\n", cwd=ROOT_DIR,
+			stdout=subprocess.DEVNULL, check=True))
+		for _ in range(_STARTUP_RUNS))
+
+	statements = [f"select name, age from users where age > {i} and name != x{i} "
+		f"limit 10" for i in range(_PARSE_STATEMENTS)]
+	clear_plan_cache()
+	parse = _timed(lambda: [parse_statement(text) for text in statements])
+	parse_cached = _timed(lambda: [parse_statement(statements[0])
+		for _ in statements])
+	clear_plan_cache()
+	return {"cold_start": cold_start, "parse": parse, "parse_cached": parse_cached}
+
+
+def run_benchmarks(sizes: list[int], schema: dict[str, str],
+                   storage: str = "json") -> dict[str, Any]:
+	"""
+	Выполняет замеры для таблиц каждого размера.
+
+	:param sizes: (list[int]) размеры таблиц
+	:param schema: (dict[str, str]) схема {столбец: тип} без ID
+	:param storage: (str) формат хранения: "json", "columnar" или "segmented"
+	:return: (dict[str, Any]) {"meta": {...}, "results": {размер: {операция: с}},
+		"startup": {операция: с}}
+	"""
+	results = {}
+	for size in sizes:
+		print(f"Замер таблицы из {size} записей...")
+		results[str(size)] = bench_table(size, schema, storage)
+	print("Замер запуска и разбора команд...")
+	startup = bench_startup()
+	return {
+		"meta": {
+			"date": datetime.now().isoformat(timespec="seconds"),
+			"python": platform.python_version(),
+			"platform": platform.platform(),
+			"storage": storage,
+			"schema": schema,
+		},
+		"results": results,
+		"startup": startup,
+	}
+
+
+def _sections(current: dict[str, Any], baseline: dict[str, Any] | None
+              ) -> Iterator[tuple[str, tuple[str, ...], dict, dict]]:
+	"""
+	Части результатов: (подпись, операции по порядку, замеры, базовые замеры той
+	же части).
+	"""
+	baseline = baseline or {}
+	for size, timings in current["results"].items():
+		yield (f"{size} записей", OPERATIONS, timings,
+			baseline.get("results", {}).get(size, {}))
+	if "startup" in current:
+		yield ("запуск", STARTUP_OPERATIONS, current["startup"],
+			baseline.get("startup", {}))
+
+
+def compare_results(current: dict[str, Any], baseline: dict[str, Any],
+                    tolerance: float = BENCH_TOLERANCE) -> list[str]:
+	"""
+	Сравнивает результаты с базовыми и находит замедлившиеся операции.
+	Операции и размеры, которых нет в одном из результатов, пропускаются.
+
+	:param current: (dict[str, Any]) результаты run_benchmarks
+	:param baseline: (dict[str, Any]) базовые результаты того же формата
+	:param tolerance: (float) допустимое замедление, 0.2 - на 20%
+	:return: (list[str]) описания замедлений, пустой список - замедлений нет
+	"""
+	regressions = []
+	for label, _, timings, base in _sections(current, baseline):
+		for operation, seconds in timings.items():
+			if operation not in base:
+				continue
+			before = base[operation]
+			if seconds > before * (1 + tolerance) and seconds - before > _NOISE:
+				regressions.append(f"{operation} ({label}): {before:.4f} с -> "
+					f"{seconds:.4f} с (+{(seconds / before - 1) if before else 1:.0%})")
+	return regressions
+
+
+def print_results(current: dict[str, Any], baseline: dict[str, Any] | None) -> None:
+	"""Печатает результаты и, если есть, изменение относительно базовых."""
+	for label, operations, timings, base in _sections(current, baseline):
+		print(f"\nТаблица из {label}:" if operations is OPERATIONS
+			else "\nЗапуск и разбор команд:")
+		for operation in operations:
+			if operation not in timings:
+				continue
+			line = f"  {operation:<16} {timings[operation]:.6f} с"
+			if base.get(operation):
+				line += f"  ({timings[operation] / base[operation] - 1:+.0%} к базе)"
+			print(line)
+
+
+def save_results(filepath: str | Path, results: dict[str, Any]) -> None:
+	"""Записывает результаты замеров в JSON-файл."""
+	with open(filepath, "w", encoding="utf-8") as f:
+		json.dump(results, f, indent=4, ensure_ascii=False)
+
+
+def load_results(filepath: str | Path) -> dict[str, Any]:
+	"""Читает результаты замеров из JSON-файла."""
+	with open(filepath, encoding="utf-8") as f:
+		return json.load(f)
@@ -0,0 +1,123 @@
+import itertools
+import json
+import queue
+import socket
+import threading
+from typing import BinaryIO
+
+from src.primitive_db.constants import CLIENT_POOL_SIZE, SERVER_HOST, SERVER_PORT
+from src.primitive_db.errors import DatabaseError
+
+
+class ServerError(DatabaseError):
+	"""Сервер не смог разобрать запрос или соединение с ним оборвалось."""
+
+
+class _Connection:
+	"""Соединение с сервером: сокет и файловый поток поверх него."""
+
+	def __init__(self, sock: socket.socket) -> None:
+		self.sock = sock
+		self.stream: BinaryIO = sock.makefile("rwb")
+
+	def request(self, payload: bytes) -> dict:
+		self.stream.write(payload)
+		self.stream.flush()
+		line = self.stream.readline()
+		if not line:
+			raise ServerError("сервер закрыл соединение")
+		return json.loads(line)
+
+	def close(self) -> None:
+		self.stream.close()
+		self.sock.close()
+
+
+class Client:
+	"""
+	Клиент сервера database serve с пулом соединений.
+
+	Соединения открываются по мере надобности (не больше pool_size одновременно)
+	и после запроса возвращаются в пул, поэтому каждый запрос обходится одной
+	передачей строки туда и обратно. Клиент можно использовать из нескольких
+	потоков: каждый поток на время запроса получает своё соединение.
+
+	Пример:
+	>>> with Client(port=7411) as client:
+	...     print(client.execute("select from users where ID = 1"))
+	"""
+
+	def __init__(self, host: str = SERVER_HOST, port: int = SERVER_PORT,
+			socket_path: str | None = None, pool_size: int = CLIENT_POOL_SIZE,
+			timeout: float | None = None) -> None:
+		self.host = host
+		self.port = port
+		self.socket_path = socket_path
+		self.timeout = timeout
+		self._idle: queue.LifoQueue[_Connection] = queue.LifoQueue()
+		self._slots = threading.BoundedSemaphore(pool_size)
+		self._ids = itertools.count(1)
+		self._closed = False
+
+	def _connect(self) -> _Connection:
+		if self.socket_path is not None:
+			sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+			sock.settimeout(self.timeout)
+			sock.connect(self.socket_path)
+		else:
+			sock = socket.create_connection((self.host, self.port), self.timeout)
+			sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		return _Connection(sock)
+
+	def execute(self, command: str) -> str:
+		"""
+		Выполняет команду на сервере.
+
+		:param command: (str) команда, как в консольном приложении
+		:return: (str) вывод команды
+		:raises ServerError: если запрос не разобран или соединение оборвалось
+		"""
+		if self._closed:
+			raise ServerError("клиент закрыт")
+		request_id = next(self._ids)
+		payload = json.dumps({"id": request_id, "command": command},
+			ensure_ascii=False).encode("utf-8") + b"\n"
+		with self._slots:
+			try:
+				connection = self._idle.get_nowait()
+			except queue.Empty:
+				connection = self._connect()
+			try:
+				response = connection.request(payload)
+			except (OSError, ValueError) as e:
+				connection.close()
+				raise ServerError(f"ошибка соединения с сервером: {e}") from e
+			except ServerError:
+				connection.close()
+				raise
+			if command.strip().split(maxsplit=1)[:1] == ["exit"]:
+				# после exit сервер закрывает соединение
+				connection.close()
+			else:
+				self._idle.put(connection)
+
+		if response.get("id") != request_id:
+			raise ServerError("ответ не соответствует запросу")
+		if not response.get("ok"):
+			raise ServerError(response.get("error", "ошибка сервера"))
+		return response["output"]
+
+	def close(self) -> None:
+		"""Закрывает все соединения пула."""
+		self._closed = True
+		while True:
+			try:
+				self._idle.get_nowait().close()
+			except queue.Empty:
+				break
+
+	def __enter__(self) -> "Client":
+		return self
+
+	def __exit__(self, *exc_info) -> None:
+		self.close()
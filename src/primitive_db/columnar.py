@@ -0,0 +1,151 @@
+import json
+import struct
+import sys
+from array import array
+from collections.abc import Sequence
+
+from src.primitive_db.files import atomic_write
+from src.primitive_db.rows import Row, bulk_rows, column_values, row_type
+
+# Файл: MAGIC, длина заголовка (uint32), JSON-заголовок, затем данные столбцов.
+MAGIC = b"PDBCOL1\n"
+_HEADER_LEN = struct.Struct("<I")
+# Значения восьми бит для каждого возможного байта битовой маски
+_BITS = [tuple(bool(byte >> bit & 1) for bit in range(8)) for byte in range(256)]
+
+
+def _encode_column(type_: str, values: Sequence) -> list[bytes]:
+	"""
+	Кодирует значения одного столбца в двоичные части.
+
+	int - массив int64, bool - битовая маска, str - массив смещений int64
+	и общий буфер UTF-8.
+	"""
+	if type_ == "int":
+		return [array("q", values).tobytes()]
+	if type_ == "bool":
+		bitmap = bytearray((len(values) + 7) // 8)
+		for i, value in enumerate(values):
+			if value:
+				bitmap[i >> 3] |= 1 << (i & 7)
+		return [bytes(bitmap)]
+	encoded = [value.encode("utf-8") for value in values]
+	offsets = array("q", [0])
+	total = 0
+	for chunk in encoded:
+		total += len(chunk)
+		offsets.append(total)
+	return [offsets.tobytes(), b"".join(encoded)]
+
+
+def _decode_column(type_: str, parts: list[memoryview], rows: int,
+                   swap: bool) -> list:
+	"""Восстанавливает значения столбца из двоичных частей."""
+	if type_ == "int":
+		values = array("q")
+		values.frombytes(parts[0])
+		if swap:
+			values.byteswap()
+		return values.tolist()
+	if type_ == "bool":
+		values = [bit for byte in parts[0] for bit in _BITS[byte]]
+		return values[:rows]
+	offsets = array("q")
+	offsets.frombytes(parts[0])
+	if swap:
+		offsets.byteswap()
+	bounds = offsets.tolist()
+	blob = bytes(parts[1])
+	if blob.isascii():
+		# для ASCII смещения в байтах совпадают со смещениями в символах
+		text = blob.decode("ascii")
+		return [text[start:end] for start, end in zip(bounds, bounds[1:])]
+	return [blob[start:end].decode("utf-8") for start, end in zip(bounds, bounds[1:])]
+
+
+def encode_columnar(columns: dict[str, str], rows: list[dict]) -> bytes:
+	"""
+	Кодирует таблицу в колоночный двоичный формат.
+
+	:param columns: (dict[str, str]) схема таблицы {столбец: тип} из метаданных
+	:param rows: (list[dict]) записи таблицы (словари или Row)
+	:return: (bytes) содержимое файла
+	"""
+	by_column = dict(zip(columns, column_values(rows, columns)))
+	ids = by_column["ID"]
+	header = {
+		"rows": len(rows),
+		"byteorder": sys.byteorder,
+		"sorted_ids": all(a < b for a, b in zip(ids, ids[1:])),
+		"columns": [],
+	}
+	chunks = []
+	position = 0
+	for name, type_ in columns.items():
+		parts = _encode_column(type_, by_column[name])
+		layout = []
+		for part in parts:
+			layout.append([position, len(part)])
+			position += len(part)
+		chunks.extend(parts)
+		header["columns"].append({"name": name, "type": type_, "parts": layout})
+
+	header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+	return b"".join([MAGIC, _HEADER_LEN.pack(len(header_bytes)), header_bytes,
+		*chunks])
+
+
+def write_columnar(filepath: str, columns: dict[str, str], rows: list[dict]) -> None:
+	"""
+	Записывает таблицу в колоночном двоичном формате.
+
+	:param filepath: (str) путь до файла
+	:param columns: (dict[str, str]) схема таблицы {столбец: тип} из метаданных
+	:param rows: (list[dict]) записи таблицы
+	"""
+	data = encode_columnar(columns, rows)
+	# пишем во временный файл и подменяем: отображённый в память (mmap) старый файл
+	# остаётся целым, пока его не закроют
+	with atomic_write(filepath, "wb") as f:
+		f.write(data)
+
+
+def read_header(buffer: bytes | memoryview) -> tuple[dict, int]:
+	"""
+	Разбирает заголовок колоночного файла.
+
+	:param buffer: содержимое файла
+	:return: (tuple[dict, int]) заголовок и смещение начала данных столбцов
+	:raises ValueError: если файл не в колоночном формате
+	"""
+	if bytes(buffer[:len(MAGIC)]) != MAGIC:
+		raise ValueError("файл не является колоночной таблицей")
+	start = len(MAGIC)
+	(header_len,) = _HEADER_LEN.unpack(buffer[start:start + _HEADER_LEN.size])
+	start += _HEADER_LEN.size
+	header = json.loads(bytes(buffer[start:start + header_len]).decode("utf-8"))
+	return header, start + header_len
+
+
+def read_columnar(filepath: str) -> list[Row]:
+	"""
+	Читает таблицу из колоночного двоичного формата.
+
+	:param filepath: (str) путь до файла
+	:return: (list[Row]) записи таблицы
+	"""
+	with open(filepath, "rb") as f:
+		buffer = memoryview(f.read())
+	header, data_start = read_header(buffer)
+	rows = header["rows"]
+	swap = header["byteorder"] != sys.byteorder
+
+	names = []
+	values = []
+	for column in header["columns"]:
+		parts = [buffer[data_start + offset:data_start + offset + length]
+				for offset, length in column["parts"]]
+		names.append(column["name"])
+		values.append(_decode_column(column["type"], parts, rows, swap))
+	with bulk_rows():
+		return list(map(row_type(tuple(names)), zip(*values)))
@@ -0,0 +1,124 @@
+import queue
+import threading
+from concurrent.futures import Future
+from contextlib import AbstractContextManager, contextmanager
+from typing import Any, Callable, Iterator
+
+from src.primitive_db.constants import WRITE_BATCH_SIZE
+
+
+class RWLock:
+	"""
+	Блокировка читатели-писатель: читатели не ждут друг друга, писатель ждёт
+	выхода читателей. Ожидающий писатель не пропускает новых читателей, чтобы
+	поток чтений не откладывал запись бесконечно. Блокировка не повторно входимая.
+	"""
+
+	def __init__(self) -> None:
+		self._cond = threading.Condition()
+		self._readers = 0
+		self._writer = False
+		self._waiting_writers = 0
+
+	@contextmanager
+	def read(self) -> Iterator[None]:
+		"""Разделяемый захват для чтения."""
+		with self._cond:
+			while self._writer or self._waiting_writers:
+				self._cond.wait()
+			self._readers += 1
+		try:
+			yield
+		finally:
+			with self._cond:
+				self._readers -= 1
+				if not self._readers:
+					self._cond.notify_all()
+
+	@contextmanager
+	def write(self) -> Iterator[None]:
+		"""Эксклюзивный захват для записи."""
+		with self._cond:
+			self._waiting_writers += 1
+			while self._writer or self._readers:
+				self._cond.wait()
+			self._waiting_writers -= 1
+			self._writer = True
+		try:
+			yield
+		finally:
+			with self._cond:
+				self._writer = False
+				self._cond.notify_all()
+
+
+class SingleWriter:
+	"""
+	Поток-писатель: выполняет задания записи строго по одному, забирая из
+	очереди накопившиеся задания пачкой (до batch_size). Пачка выполняется внутри
+	контекста batch() - например, с одной записью журнала на всю пачку, - и только
+	после выхода из него вызывающие получают результаты.
+	"""
+
+	def __init__(self, batch: Callable[[], AbstractContextManager],
+			batch_size: int = WRITE_BATCH_SIZE) -> None:
+		self._batch = batch
+		self._batch_size = batch_size
+		self._queue: queue.Queue = queue.Queue()
+		self._thread = threading.Thread(target=self._run, name="db-writer",
+			daemon=True)
+		self._thread.start()
+
+	def submit(self, func: Callable, *args: Any) -> Any:
+		"""
+		Ставит задание в очередь и ждёт его выполнения.
+
+		:param func: (Callable) задание записи
+		:return: результат задания
+		:raises: исключение, выброшенное заданием или при сохранении пачки
+		"""
+		if threading.current_thread() is self._thread:
+			# задание из задания выполняется сразу, в текущей пачке
+			return func(*args)
+		future = Future()
+		self._queue.put((func, args, future))
+		return future.result()
+
+	def close(self) -> None:
+		"""Дожидается выполнения поставленных заданий и останавливает поток."""
+		self._queue.put(None)
+		self._thread.join()
+
+	def _run(self) -> None:
+		while True:
+			jobs = [self._queue.get()]
+			while jobs[-1] is not None and len(jobs) < self._batch_size:
+				try:
+					jobs.append(self._queue.get_nowait())
+				except queue.Empty:
+					break
+			stop = jobs[-1] is None
+			if stop:
+				jobs.pop()
+			if jobs:
+				self._run_batch(jobs)
+			if stop:
+				return
+
+	def _run_batch(self, jobs: list[tuple]) -> None:
+		results = []
+		try:
+			with self._batch():
+				for func, args, _ in jobs:
+					try:
+						results.append((func(*args), None))
+					except Exception as e:
+						results.append((None, e))
+		except Exception as e:
+			# пачку не удалось сохранить - ни одно задание не подтверждено
+			results = [(None, e)] * len(jobs)
+		for (_, _, future), (result, error) in zip(jobs, results):
+			if error is None:
+				future.set_result(result)
+			else:
+				future.set_exception(error)
@@ -2,6 +2,71 @@ from pathlib import Path
 
 ROOT_DIR = Path(__file__).resolve().parents[2]
 DB_META_FILE = ROOT_DIR / "db_meta.json"
+# Описания индексов: {таблица: {столбец: "hash" | "sorted"}}
+DB_INDEX_FILE = ROOT_DIR / "db_indexes.json"
 DATA_DIR = ROOT_DIR / "data"
 
 VALID_TYPES = {"int", "str", "bool"}
+
+# Форматы хранения снимка таблицы: JSON-список записей, колоночный двоичный файл
+# или каталог колоночных сегментов по диапазонам ID
+STORAGE_FORMATS = {"json", "columnar", "segmented"}
+COLUMNAR_SUFFIX = ".col"
+# Каталог секционированной таблицы data/<таблица>.seg, его манифест и сколько ID
+# покрывает один сегмент новой таблицы
+SEGMENT_SUFFIX = ".seg"
+SEGMENT_MANIFEST = "manifest.json"
+SEGMENT_ROWS = 65_536
+
+# Журнал изменений таблицы: data/<таблица>.log, одна JSON-строка на операцию
+LOG_SUFFIX = ".log"
+# Файл блокировки таблицы data/<таблица>.lock (fcntl.flock)
+LOCK_SUFFIX = ".lock"
+# Журнал фиксации транзакций: запись commit, которая применяется к журналам таблиц
+# и метаданным (см. journal.CommitJournal)
+JOURNAL_FILE = DATA_DIR / "commit.journal"
+# Сбрасывать ли записанные файлы на диск (fsync): медленнее, но переживает сбой питания
+FSYNC_WRITES = True
+# После скольких записей в журнале он сворачивается обратно в снимок таблицы
+LOG_COMPACT_THRESHOLD = 1000
+# Как часто (в секундах) журналы изменённых таблиц сворачиваются в снимки
+FLUSH_INTERVAL = 60
+# Фоновая очистка (vacuum): как часто (в секундах) проверяются журналы таблиц, с
+# какого размера журнала (в байтах) таблица очищается автоматически и во сколько
+# раз пауза после очистки таблицы длиннее самой очистки (0 - без пауз)
+VACUUM_INTERVAL = 30
+VACUUM_LOG_BYTES = 1 << 20
+VACUUM_THROTTLE = 1.0
+# Размер кэша результатов select (число запросов) и время жизни записи в секундах
+CACHE_MAX_SIZE = 128
+CACHE_TTL = 300
+# Сколько разобранных команд хранит кэш планов и команды длиннее скольких символов
+# в него не попадают (например, insert многих записей)
+PLAN_CACHE_SIZE = 256
+PLAN_CACHE_TEXT_LIMIT = 1024
+# Сколько записей import добавляет в таблицу за одну запись в журнал
+IMPORT_BATCH_SIZE = 10_000
+# С какого числа записей просмотр колоночной таблицы без индекса выполняется
+# параллельно в пуле процессов и сколько процессов используется (None - по
+# числу ядер). Запуск пула занимает 0.2-0.5 с (2-8 процессов), просмотр снимка -
+# около 2.5 мкс на запись: с 200 000 записей даже первый просмотр вместе с
+# запуском пула не медленнее последовательного
+PARALLEL_SCAN_THRESHOLD = 200_000
+PARALLEL_SCAN_WORKERS = None
+# Сколько заданий записи поток-писатель Database сохраняет одной пачкой
+WRITE_BATCH_SIZE = 1000
+# Адрес сервера database serve по умолчанию, число потоков, выполняющих его
+# запросы, и сколько соединений держит пул клиента
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 7411
+SERVER_WORKERS = 4
+CLIENT_POOL_SIZE = 4
+# Сколько записей select выводит одной таблицей PrettyTable и поддерживаемые форматы
+SELECT_PAGE_SIZE = 100
+OUTPUT_FORMATS = {"table", "tsv", "jsonl"}
+# Размеры синтетических таблиц database bench и допустимое замедление
+# относительно базовых результатов (0.2 - на 20%)
+BENCH_SIZES = (1_000, 100_000, 1_000_000)
+BENCH_TOLERANCE = 0.2
+# Сколько самых затратных функций выводит profile <команда>
+PROFILE_TOP_N = 20
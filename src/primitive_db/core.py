@@ -1,15 +1,41 @@
-from pathlib import Path
-from typing import Any
-
-from prettytable import PrettyTable
+import json
+import time
+from itertools import chain, islice
+from typing import Any, Iterable, Iterator
 
 from src.decorators import confirm_action, create_cacher, handle_db_errors, log_time
-from src.primitive_db.constants import VALID_TYPES
-from src.primitive_db.utils import load_table_data, save_table_data
-
-cache_result = create_cacher()
-
-def create_table(metadata: dict, table_name: str, columns: list[str]) -> dict:
+from src.primitive_db.aggregate import Aggregate, aggregate_rows
+from src.primitive_db.constants import (
+	CACHE_MAX_SIZE,
+	CACHE_TTL,
+	IMPORT_BATCH_SIZE,
+	OUTPUT_FORMATS,
+	SELECT_PAGE_SIZE,
+)
+from src.primitive_db.errors import ColumnNotFoundError, ValidationError
+from src.primitive_db.indexes import INDEX_KINDS, HashIndex
+from src.primitive_db.metrics import TimedIterator, metrics
+from src.primitive_db.rows import Row, id_of, row_type
+from src.primitive_db.schema import (
+	build_schema,
+	check_storage,
+	convert_changes,
+	record_converter,
+)
+from src.primitive_db.utils import (
+	append_table_log,
+	convert_table_storage,
+	iter_file_records,
+	remove_table_files,
+	write_file_records,
+)
+from src.primitive_db.where import Condition, find_rows, iter_rows
+
+cache_result = create_cacher(CACHE_MAX_SIZE, CACHE_TTL)
+metrics.register_gauge("select_cache", cache_result.stats)
+
+def create_table(metadata: dict, table_name: str, columns: list[str],
+                 storage: str = "json") -> dict:
 	"""
 	Создает таблицу, если другой с таким именем не существует,  добавляя её описание в
 	метаданные. Автоматически добавляет столбце ID: int в начало.
@@ -17,6 +43,7 @@ def create_table(metadata: dict, table_name: str, columns: list[str]) -> dict:
 		metadata: (dict) словарь метаданных для таблицы
 		table_name: (str) имя новой таблицы
 		columns: (list[str]) список столбцов
+		storage: (str) формат хранения: "json", "columnar" или "segmented"
 	:returns:
 		(dict) словарь метаданных таблицы
 	"""
@@ -24,24 +51,22 @@ def create_table(metadata: dict, table_name: str, columns: list[str]) -> dict:
 		print(f'Ошибка: Таблица "{table_name}" уже существует.')
 		return metadata
 
-	# Добавляем ID:int автоматически
-	table_structure = [("ID", "int")]
-
-	# Проверка типов
-	for col in columns:
-		if ":" not in col:
-			print(f"Некорректное значение: {col}. Попробуйте снова.")
-			return metadata
-		name, type_ = col.split(":", 1)
-		if type_ not in VALID_TYPES:
-			print(f"Некорректный тип: {type_}. Поддерживаются только "
-				f"{', '.join(VALID_TYPES)}.")
-			return metadata
-		table_structure.append((name, type_))
-
-	metadata[table_name] = {col: typ for col, typ in table_structure}
+	# Проверка формата и типов, ID:int добавляется автоматически
+	try:
+		check_storage(storage)
+		schema = build_schema(columns)
+	except ValidationError as e:
+		print(e)
+		return metadata
+
+	metadata[table_name] = {
+		"columns": schema,
+		"next_id": 1,
+		"storage": storage,
+		"rows": 0,
+	}
 	print(f'Таблица "{table_name}" успешно создана со столбцами: ' +
-						", ".join(f"{k}:{v}" for k, v in metadata[table_name].items()))
+				", ".join(f"{k}:{v}" for k, v in schema.items()))
 	return metadata
 
 @handle_db_errors
@@ -62,12 +87,10 @@ def drop_table(metadata: dict, table_name: str) -> dict:
 
 	del metadata[table_name]
 
-	data_file = Path(__file__).resolve().parents[2] / "data" / f"{table_name}.json"
-	if data_file.exists():
-		data_file.unlink()
+	remove_table_files(table_name)
 
 	print(f'Таблица "{table_name}" успешно удалена.')
-	cache_result.clear_cache()
+	cache_result.clear_cache(table_name)
 
 	return metadata
 
@@ -86,167 +109,514 @@ def list_tables(metadata: dict) -> None:
 	for table in metadata.keys():
 		print(f"- {table}")
 
+def insert_records(metadata: dict, table_name: str, table_data: dict[int, dict],
+                    records: list[dict],
+                    indexes: dict[str, HashIndex] | None = None) -> list[Row]:
+	"""
+	Выдаёт записям ID из счётчика next_id и добавляет их в таблицу (как Row по
+	схеме таблицы) одной записью в журнал.
+
+	:param metadata: (dict) метаданные, счётчики next_id и rows увеличиваются
+	:param table_name: (str) имя таблицы
+	:param table_data: (dict[int, dict]) записи таблицы по ID
+	:param records: (list[dict]) проверенные записи без ID
+	:param indexes: (dict[str, HashIndex] | None) индексы таблицы
+	:return: (list[Row]) добавленные записи с ID
+	"""
+	next_id = metadata[table_name]["next_id"]
+	ids = range(next_id, next_id + len(records))
+	# в журнал записи пишутся словарями, в таблицу кладутся Row с теми же значениями
+	logged = [{"ID": row_id, **record} for row_id, record in zip(ids, records)]
+	rows = list(map(row_type(tuple(metadata[table_name]["columns"])),
+		map(dict.values, logged)))
+	metadata[table_name]["next_id"] = next_id + len(rows)
+
+	append_table_log(table_name, [{"op": "insert", "row": row} for row in logged])
+	table_data.update(zip(ids, rows))
+	for index in (indexes or {}).values():
+		for row in rows:
+			index.add(row)
+	metadata[table_name]["rows"] = len(table_data)
+	return rows
+
 @handle_db_errors
 @log_time
-def insert(metadata: dict, table_name: str, values: list[str]) -> None:
+def insert(metadata: dict, table_name: str, table_data: dict[int, dict],
+           rows: list[list[str]], indexes: dict[str, HashIndex] | None = None) -> None:
 	"""
-	Если таблица существует и количество переданных значений соответствует числу
-	столбцов - валидирует типы данных как в схеме в метаданных и добавляет запись.
+	Если таблица существует - валидирует типы значений как в схеме в метаданных
+	и добавляет записи. Записи проверяются пачкой по столбцам: о каждой
+	неподходящей записи печатается сообщение с её номером, остальные
+	добавляются. ID новых записей выдаются одним блоком из счётчика next_id в
+	метаданных таблицы, поэтому ID удалённых записей повторно не выдаются.
 
-	:param metadata: (dict) метаданные о таблице
+	:param metadata: (dict) метаданные о таблице, счётчик next_id увеличивается
 	:param table_name: (str) имя таблицы
-	:param values: (list[str]) добавляемые значения
+	:param table_data: (dict[int, dict]) записи таблицы по ID, записи добавляются сюда
+	:param rows: (list[list[str]]) значения добавляемых записей
+	:param indexes: (dict[str, HashIndex] | None) индексы таблицы
 	:return: None
 	"""
 	if table_name not in metadata:
 		print(f'Ошибка: Таблица "{table_name}" не существует.')
 		return
 
-	table_schema = metadata[table_name]
-	columns = list(table_schema.keys())[1:]  # пропускаем ID
-	if len(values) != len(columns):
-		print("Ошибка: количество значений не совпадает с количеством столбцов.")
+	records, errors = record_converter(metadata[table_name]["columns"]).convert(rows)
+	for number, message in errors:
+		print(f"Ошибка: запись {number + 1}: {message}" if len(rows) > 1
+			else f"Ошибка: {message}")
+	records = [record for record in records if record is not None]
+	if not records:
+		return
+
+	added = insert_records(metadata, table_name, table_data, records, indexes)
+	if len(added) == 1:
+		print(f'Запись с ID={added[0]["ID"]} успешно добавлена в таблицу '
+			f'"{table_name}".')
+	else:
+		print(f'Записи с ID={added[0]["ID"]}..{added[-1]["ID"]} успешно добавлены в '
+			f'таблицу "{table_name}".')
+	cache_result.clear_cache(table_name) # очистка кэша таблицы
+
+def _matching_rows(table_name: str, table_data: dict[int, dict],
+                   where_clause: Condition, indexes: dict[str, HashIndex] | None,
+                   version: int) -> Iterator[dict]:
+	"""
+	Перебирает записи по условию, используя кэш списков ID.
+
+	При промахе кэша записи выдаются по мере нахождения, а список их ID попадает
+	в кэш, только если выборка дочитана до конца (LIMIT её не обрывал).
+	"""
+	key = (table_name, where_clause.tree, version)
+	row_ids = cache_result.get(key)
+	if row_ids is not None:
+		yield from (table_data[row_id] for row_id in row_ids)
 		return
 
-	data = load_table_data(table_name)
-	new_id = max((row["ID"] for row in data), default=0) + 1
-
-	record = {"ID": new_id}
-	for col, val in zip(columns, values):
-		expected_type = table_schema[col]
-		try:
-			if expected_type == "int":
-				val = int(val)
-			elif expected_type == "bool":
-				val = val.lower() == "true"
-			elif expected_type == "str":
-				val = str(val).strip('"').strip("'")
-		except Exception:
-			print(f"Ошибка: некорректное значение {val} для {col}:{expected_type}.")
-			return
-		record[col] = val
-
-	data.append(record)
-	save_table_data(table_name, data)
-	print(f'Запись с ID={new_id} успешно добавлена в таблицу "{table_name}".')
-	cache_result.clear_cache() # очистка кэша
+	row_ids = []
+	for row in iter_rows(table_data, where_clause, indexes):
+		row_ids.append(id_of(row))
+		yield row
+	cache_result.put(key, row_ids)
+
+def _print_rows(rows: Iterable[dict], columns: list[str], output: str) -> int:
+	"""
+	Печатает записи по мере получения: страницами PrettyTable по SELECT_PAGE_SIZE
+	записей, либо построчно в TSV (с заголовком) или JSON Lines.
+
+	:param rows: (Iterable[dict]) записи
+	:param columns: (list[str]) выводимые столбцы
+	:param output: (str) формат вывода: "table", "tsv" или "jsonl"
+	:return: (int) количество выведенных записей
+	"""
+	count = 0
+	if output == "jsonl":
+		for row in rows:
+			record = {col: row.get(col) for col in columns}
+			print(json.dumps(record, ensure_ascii=False))
+			count += 1
+		return count
+	if output == "tsv":
+		print("\t".join(columns))
+		for row in rows:
+			print("\t".join(str(row.get(col, "")) for col in columns))
+			count += 1
+		return count
+
+	from prettytable import PrettyTable
+
+	rows = iter(rows)
+	while page := list(islice(rows, SELECT_PAGE_SIZE)):
+		table = PrettyTable()
+		table.field_names = columns
+		for row in page:
+			table.add_row([row.get(col, "") for col in columns])
+		print(table.get_string())
+		count += len(page)
+	return count
 
 @handle_db_errors
 @log_time
-def select(table_data: list[dict], where_clause: dict | None = None) -> str:
+def select(table_name: str, table_data: dict[int, dict],
+           where_clause: Condition | None = None,
+           indexes: dict[str, HashIndex] | None = None, version: int = 0,
+           columns: list[str] | None = None, limit: int | None = None,
+           offset: int = 0, output: str = "table") -> int:
 	"""
-    Возвращает строковое представление таблицы (PrettyTable) по условию.
+    Выводит записи таблицы по условию, не собирая весь результат в памяти.
 
-    Использует кэширование: при повторных одинаковых запросах результат берётся из кэша.
+    Записи печатаются по мере нахождения, поэтому первая страница появляется
+    сразу, независимо от размера таблицы. Для повторных одинаковых запросов
+    список ID подходящих записей берётся из кэша. Ключ кэша - таблица, условие
+    и версия таблицы, поэтому результат другой таблицы или устаревшей версии
+    не может быть возвращён.
     :param
-        table_data: (list[dict]) список всех записей таблицы
-        where_clause: (dict | None) условие выборки, например {"age": 28}
-    :return: (str) строка с отформатированной таблицей (готовая к печати)
+        table_name: (str) имя таблицы
+        table_data: (dict[int, dict]) все записи таблицы по ID
+        where_clause: (Condition | None) условие выборки
+        indexes: (dict[str, HashIndex] | None) индексы таблицы
+        version: (int) версия данных таблицы, меняется при каждом изменении
+        columns: (list[str] | None) выводимые столбцы, None - все
+        limit: (int | None) наибольшее число выводимых записей
+        offset: (int) сколько подходящих записей пропустить
+        output: (str) формат вывода: "table", "tsv" или "jsonl"
+    :return: (int) количество выведенных записей
     """
+	if output not in OUTPUT_FORMATS:
+		print(f"Некорректный формат вывода: {output}. Поддерживаются только "
+			f"{', '.join(sorted(OUTPUT_FORMATS))}.")
+		return 0
 	if not table_data:
 		print("Нет данных для отображения.")
-		return ""
+		return 0
 
-	def _select_logic() -> str:
+	field_names = list(next(iter(table_data.values())).keys())
+	for col in columns or ():
+		if col not in field_names:
+			print(f"Ошибка: столбца '{col}' не существует.")
+			return 0
 
+	if where_clause:
+		rows = _matching_rows(table_name, table_data, where_clause, indexes, version)
+	else:
+		# выборка без условия не кэшируется: список ID совпал бы с самой таблицей
+		rows = iter(table_data.values())
+	if offset or limit is not None:
+		rows = islice(rows, offset, None if limit is None else offset + limit)
 
-		if where_clause:
-			col, val = next(iter(where_clause.items()))
-			filtered = [row for row in table_data if str(row.get(col)) == str(val)]
-		else:
-			filtered = table_data
+	return _print_found(rows, columns or field_names, output)
 
-		if not filtered:
-			print("Нет записей, удовлетворяющих условию.")
-			return ""
+def _print_found(rows: Iterable[dict], columns: list[str], output: str) -> int:
+	"""
+	Выводит найденные записи (см. _print_rows), разделяя в метриках время поиска
+	записей (filter) и время их вывода (render).
+	"""
+	start = time.perf_counter()
+	rows = TimedIterator(rows)
+	first = next(rows, None)
+	if first is None:
+		print("Нет записей, удовлетворяющих условию.")
+		count = 0
+	else:
+		count = _print_rows(chain((first,), rows), columns, output)
+	metrics.observe("filter", rows.elapsed)
+	metrics.observe("render", time.perf_counter() - start - rows.elapsed)
+	metrics.count("rows_returned", count)
+	return count
 
-		table = PrettyTable()
-		table.field_names = table_data[0].keys()
-		for row in filtered:
-			table.add_row([row.get(col, "") for col in table.field_names])
-		table_str = table.get_string()
-		return table_str
+@handle_db_errors
+@log_time
+def aggregate(table_name: str, table_data: dict[int, dict],
+              items: list[Aggregate | str], group_by: list[str] | None = None,
+              where_clause: Condition | None = None,
+              indexes: dict[str, HashIndex] | None = None,
+              row_count: int | None = None, limit: int | None = None,
+              offset: int = 0, output: str = "table") -> int:
+	"""
+	Выводит результат агрегирующего select (count, sum, min, max, avg с group by).
 
-	# ключ для кэша
-	cache_key = str(where_clause) if where_clause else "ALL"
+	Записи перебираются один раз, по мере нахождения, и сразу сворачиваются в
+	накопители групп - выборка в памяти не собирается. count(*) по всей таблице
+	без группировки берётся из счётчика записей в метаданных.
+	:param
+		table_name: (str) имя таблицы
+		table_data: (dict[int, dict]) все записи таблицы по ID
+		items: (list[Aggregate | str]) агрегатные функции и столбцы группировки
+		group_by: (list[str] | None) столбцы группировки
+		where_clause: (Condition | None) условие выборки
+		indexes: (dict[str, HashIndex] | None) индексы таблицы
+		row_count: (int | None) количество записей таблицы из метаданных
+		limit: (int | None) наибольшее число выводимых строк
+		offset: (int) сколько строк результата пропустить
+		output: (str) формат вывода: "table", "tsv" или "jsonl"
+	:return: (int) количество выведенных строк
+	"""
+	if output not in OUTPUT_FORMATS:
+		print(f"Некорректный формат вывода: {output}. Поддерживаются только "
+			f"{', '.join(sorted(OUTPUT_FORMATS))}.")
+		return 0
+	group_by = group_by or []
+
+	only_count = all(isinstance(item, Aggregate) and item.name == "count(*)"
+		for item in items)
+	if only_count and not group_by and where_clause is None and row_count is not None:
+		result = [{item.name: row_count for item in items}]
+	else:
+		rows = table_data.values() if where_clause is None else iter_rows(
+			table_data, where_clause, indexes)
+		with metrics.phase("filter"):
+			result = aggregate_rows(rows, items, group_by)
+	names = [item.name if isinstance(item, Aggregate) else item for item in items]
+	with metrics.phase("render"):
+		stop = None if limit is None else offset + limit
+		count = _print_rows(islice(result, offset, stop), names, output)
+	metrics.count("rows_returned", count)
+	return count
+
+def update_rows(table_name: str, table_data: dict[int, dict], rows: list[dict],
+                changes: dict[str, Any],
+                indexes: dict[str, HashIndex] | None = None) -> None:
+	"""
+	Применяет изменения к записям таблицы и записывает их в журнал таблицы.
+	Записи не меняются на месте (Row неизменяемы): в таблицу кладутся новые
+	записи, поэтому прочитанные ранее остаются прежними (копирование при записи).
+
+	:param table_name: (str) имя таблицы
+	:param table_data: (dict[int, dict]) записи таблицы по ID
+	:param rows: (list[Row]) изменяемые записи
+	:param changes: (dict[str, Any]) изменения уже нужных типов
+	:param indexes: (dict[str, HashIndex] | None) индексы таблицы
+	"""
+	indexes = indexes or {}
+	log_entries = []
+	try:
+		for row in rows:
+			new_row = row.replace(changes)
+			for index in indexes.values():
+				index.remove(row)
+				index.add(new_row)
+			table_data[id_of(row)] = new_row
+			log_entries.append({"op": "update", "id": id_of(row), "set": changes})
+	finally:
+		append_table_log(table_name, log_entries)
+
+def delete_rows(table_name: str, table_data: dict[int, dict], rows: list[dict],
+                indexes: dict[str, HashIndex] | None = None) -> list[int]:
+	"""
+	Удаляет записи из таблицы и записывает удаление в журнал таблицы.
 
-	result = cache_result(cache_key, _select_logic)
-	if result:
-		print(result)
-	return result
+	:param table_name: (str) имя таблицы
+	:param table_data: (dict[int, dict]) записи таблицы по ID
+	:param rows: (list[dict]) удаляемые записи
+	:param indexes: (dict[str, HashIndex] | None) индексы таблицы
+	:return: (list[int]) ID удалённых записей
+	"""
+	deleted_ids = [id_of(row) for row in rows]
+	for row in rows:
+		del table_data[id_of(row)]
+		for index in (indexes or {}).values():
+			index.remove(row)
+	if deleted_ids:
+		append_table_log(table_name, [{"op": "delete", "ids": deleted_ids}])
+	return deleted_ids
 
 @handle_db_errors
-def update(table_data: list[dict], set_clause: dict[str, Any],
-           where_clause: dict[str, Any]) -> list[dict]:
+def update(table_name: str, columns: dict[str, str], table_data: dict[int, dict],
+		set_clause: dict[str, Any], where_clause: Condition,
+		indexes: dict[str, HashIndex] | None = None) -> dict[int, dict]:
 	"""
-	Обновляет записи в таблице по условию.
+	Обновляет записи в таблице по условию и записывает изменения в журнал таблицы.
+	Значения приводятся к типам столбцов схемы, как в insert и Database.update.
 
 	:param
-		table_data: (list[dict]) список записей таблицы
+		table_name: (str) имя таблицы
+		columns: (dict[str, str]) схема таблицы {столбец: тип}
+		table_data: (dict[int, dict]) записи таблицы по ID
 		set_clause: (dict[str, Any]) изменения, например {"age": 29}
-		where_clause: (dict[str, Any]) условие выборки, например {"name": "Sergei"}
-	:return: (list[dict]) обновлённый список записей
-	"""
-	col_where, val_where = next(iter(where_clause.items()))
-	updated = False
-
-	for row in table_data:
-		if str(row.get(col_where)) == str(val_where):
-			for key, new_val in set_clause.items():
-				if key not in row:
-					print(f"Ошибка: столбца '{key}' не существует.")
-					return table_data
-				try:
-					row[key] = type(row[key])(new_val)
-				except Exception:
-					print(f"Ошибка преобразования типа для поля '{key}'.")
-					return table_data
-			print(f'Запись с ID={row["ID"]} успешно обновлена.')
-			updated = True
-
-	if not updated:
+		where_clause: (Condition) условие выборки
+		indexes: (dict[str, HashIndex] | None) индексы таблицы
+	:return: (dict[int, dict]) обновлённые записи
+	"""
+	try:
+		changes = convert_changes(columns, set_clause)
+	except (ColumnNotFoundError, ValidationError) as e:
+		print(f"Ошибка: {e}")
+		return table_data
+
+	matched = find_rows(table_data, where_clause, indexes)
+	if not matched:
 		print("Подходящих записей не найдено.")
+		return table_data
 
-	cache_result.clear_cache()
+	update_rows(table_name, table_data, matched, changes, indexes)
+	for row in matched:
+		print(f'Запись с ID={row["ID"]} успешно обновлена.')
+
+	cache_result.clear_cache(table_name)
 
 	return table_data
 
 @handle_db_errors
 @confirm_action("удалить записи")
-def delete(table_data: list[dict], where_clause: dict[str, Any]) -> list[dict]:
+def delete(table_name: str, table_data: dict[int, dict],
+           where_clause: Condition,
+           indexes: dict[str, HashIndex] | None = None) -> dict[int, dict]:
 	"""
-	Удаляет записи из таблицы по условию.
+	Удаляет записи из таблицы по условию и записывает удаление в журнал таблицы.
 
 	:param
-		table_data: (list[dict]) список записей таблицы
-		where_clause: (dict[str, Any]) условие удаления, например {"ID": 1}
-	:return: (list[dict]) обновлённый список записей
+		table_name: (str) имя таблицы
+		table_data: (dict[int, dict]) записи таблицы по ID
+		where_clause: (Condition) условие удаления
+		indexes: (dict[str, HashIndex] | None) индексы таблицы
+	:return: (dict[int, dict]) обновлённые записи
 	"""
-	col_where, val_where = next(iter(where_clause.items()))
-	new_data = [r for r in table_data if str(r.get(col_where))
-																	!= str(val_where)]
-
-	if len(new_data) == len(table_data):
+	deleted_ids = delete_rows(table_name, table_data,
+		find_rows(table_data, where_clause, indexes), indexes)
+	if not deleted_ids:
 		print("Записей для удаления не найдено.")
 	else:
-		print(f"Удалено {len(table_data) - len(new_data)} записей из таблицы.")
+		print(f"Удалено {len(deleted_ids)} записей из таблицы.")
+
+	cache_result.clear_cache(table_name)
+
+	return table_data
+
+@handle_db_errors
+@log_time
+def import_rows(metadata: dict, table_name: str, table_data: dict[int, dict],
+                filepath: str, indexes: dict[str, HashIndex] | None = None,
+                batch_size: int = IMPORT_BATCH_SIZE) -> int:
+	"""
+	Загружает записи из CSV (с заголовком) или JSON Lines файла. Файл читается
+	потоково, значения приводятся к типам столбцов по правилам insert, а записи
+	проверяются и добавляются пачками по batch_size - одна запись в журнал на
+	пачку.
+	Записи, не подходящие под схему, пропускаются с сообщением.
+
+	:param metadata: (dict) метаданные, счётчик next_id увеличивается
+	:param table_name: (str) имя таблицы
+	:param table_data: (dict[int, dict]) записи таблицы по ID
+	:param filepath: (str) путь до файла .csv или .jsonl
+	:param indexes: (dict[str, HashIndex] | None) индексы таблицы
+	:param batch_size: (int) размер пачки записей
+	:return: (int) количество добавленных записей
+	"""
+	if table_name not in metadata:
+		print(f'Ошибка: Таблица "{table_name}" не существует.')
+		return 0
+
+	converter = record_converter(metadata[table_name]["columns"])
+	imported = skipped = 0
+	batch, numbers = [], []
+	# (номер записи, сообщение) пропущенных записей пачки: печатаются по
+	# порядку записей при сохранении пачки
+	rejected: list[tuple[int, str]] = []
+	message = "Ошибка: запись {} не соответствует схеме и пропущена."
+
+	def flush() -> int:
+		nonlocal skipped
+		records, errors = converter.convert(batch)
+		rejected.extend((numbers[pos], message.format(numbers[pos]))
+			for pos, _ in errors)
+		for _, text in sorted(rejected):
+			print(text)
+		skipped += len(rejected)
+		records = [record for record in records if record is not None]
+		batch.clear()
+		numbers.clear()
+		rejected.clear()
+		return len(insert_records(metadata, table_name, table_data, records, indexes))
+
+	try:
+		for number, source in enumerate(iter_file_records(filepath), start=1):
+			try:
+				# лишние поля файла не мешают импорту
+				batch.append([source[col] for col in converter.columns])
+				numbers.append(number)
+			except (KeyError, TypeError):
+				rejected.append((number, message.format(number)))
+			if len(batch) + len(rejected) >= batch_size:
+				imported += flush()
+		imported += flush()
+	finally:
+		cache_result.clear_cache(table_name)
+
+	print(f'Импортировано {imported} записей в таблицу "{table_name}", '
+													f"пропущено {skipped}.")
+	return imported
 
-	cache_result.clear_cache()
+@handle_db_errors
+@log_time
+def export_rows(metadata: dict, table_name: str, table_data: dict[int, dict],
+                filepath: str) -> int:
+	"""
+	Построчно выгружает записи таблицы в CSV или JSON Lines файл.
 
-	return new_data
+	:param metadata: (dict) метаданные
+	:param table_name: (str) имя таблицы
+	:param table_data: (dict[int, dict]) записи таблицы по ID
+	:param filepath: (str) путь до файла .csv или .jsonl
+	:return: (int) количество выгруженных записей
+	"""
+	if table_name not in metadata:
+		print(f'Ошибка: Таблица "{table_name}" не существует.')
+		return 0
+
+	columns = list(metadata[table_name]["columns"].keys())
+	count = write_file_records(filepath, columns, table_data.values())
+	print(f'Выгружено {count} записей из таблицы "{table_name}" в {filepath}.')
+	return count
+
+def create_index(metadata: dict, index_metadata: dict, table_name: str,
+                 column: str, kind: str = "hash") -> dict:
+	"""
+	Добавляет описание индекса по столбцу таблицы. Сам индекс строится в памяти
+	при загрузке таблицы и поддерживается операциями insert/update/delete.
+
+	:param metadata: (dict) метаданные таблиц
+	:param index_metadata: (dict) описания индексов
+	:param table_name: (str) имя таблицы
+	:param column: (str) индексируемый столбец
+	:param kind: (str) вид индекса: "hash" или "sorted"
+	:return: (dict) обновлённые описания индексов
+	"""
+	if table_name not in metadata:
+		print(f'Ошибка: Таблица "{table_name}" не существует.')
+		return index_metadata
+	if column not in metadata[table_name]["columns"]:
+		print(f"Ошибка: столбца '{column}' не существует.")
+		return index_metadata
+	if kind not in INDEX_KINDS:
+		print(f"Некорректный вид индекса: {kind}. Поддерживаются только "
+			f"{', '.join(sorted(INDEX_KINDS))}.")
+		return index_metadata
+
+	index_metadata.setdefault(table_name, {})[column] = kind
+	print(f'Индекс ({kind}) по столбцу "{column}" таблицы "{table_name}" создан.')
+	return index_metadata
+
+@handle_db_errors
+@log_time
+def convert_table(metadata: dict, table_name: str, storage: str) -> dict:
+	"""
+	Переводит таблицу в другой формат хранения (например, из JSON в колоночный).
+
+	:param metadata: (dict) метаданные таблиц
+	:param table_name: (str) имя таблицы
+	:param storage: (str) новый формат хранения: "json", "columnar" или "segmented"
+	:return: (dict) обновлённые метаданные
+	"""
+	if table_name not in metadata:
+		print(f'Ошибка: Таблица "{table_name}" не существует.')
+		return metadata
+	try:
+		check_storage(storage)
+	except ValidationError as e:
+		print(e)
+		return metadata
+
+	entry = metadata[table_name]
+	count = convert_table_storage(table_name, entry["columns"],
+		entry.get("storage", "json"), storage)
+	entry["storage"] = storage
+	print(f'Таблица "{table_name}" ({count} записей) переведена в формат {storage}.')
+	return metadata
 
-def info(metadata: dict, table_name: str) -> None:
+def info(metadata: dict, table_name: str, row_count: int) -> None:
 	"""
 	Выводит информацию о структуре таблицы и количестве записей.
 
 	:param metadata: словарь метаданных проекта
 	:param table_name: имя таблицы
+	:param row_count: количество записей (из метаданных, без загрузки таблицы)
 	"""
 	if table_name not in metadata:
 		print(f'Ошибка: Таблица "{table_name}" не существует.')
 		return
 
-	data = load_table_data(table_name)
 	print(f"Таблица: {table_name}")
-	print("Столбцы:", ", ".join(f"{k}:{v}" for k, v in metadata[table_name].items()))
-	print(f"Количество записей: {len(data)}")
+	columns = metadata[table_name]["columns"]
+	print("Столбцы:", ", ".join(f"{k}:{v}" for k, v in columns.items()))
+	print(f"Формат хранения: {metadata[table_name].get('storage', 'json')}")
+	print(f"Количество записей: {row_count}")
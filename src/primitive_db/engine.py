@@ -1,203 +1,506 @@
-import shlex
-from typing import Any
-
-import prompt
-
-from src.primitive_db.constants import DB_META_FILE
+import io
+import json
+from functools import partial
+from typing import Callable, TextIO
+
+from src.decorators import confirm_action, set_assume_yes
+from src.primitive_db.aggregate import parse_aggregates
+from src.primitive_db.constants import PROFILE_TOP_N
 from src.primitive_db.core import (
+	aggregate,
+	cache_result,
+	convert_table,
+	create_index,
 	create_table,
 	delete,
 	drop_table,
+	export_rows,
+	import_rows,
 	info,
 	insert,
 	list_tables,
 	select,
 	update,
 )
-from src.primitive_db.utils import (
-	load_metadata,
-	load_table_data,
-	save_metadata,
-	save_table_data,
-)
+from src.primitive_db.errors import TableNotFoundError
+from src.primitive_db.metrics import metrics
+from src.primitive_db.schema import table_schema
+from src.primitive_db.statements import Statement, parse_statement
+from src.primitive_db.store import TableStore
+from src.primitive_db.utils import set_log_deferred
+from src.primitive_db.vacuum import VacuumResult, VacuumWorker, vacuum
+from src.primitive_db.where import Condition
 
+# prompt, prettytable и cProfile импортируются там, где нужны: интерактивный
+# ввод, вывод таблицей и profile, - чтобы не замедлять запуск скриптов
 
-def parse_where(tokens: list[str]) -> dict[str, Any] | None:
-	"""
-	Парсит выражение WHERE в словарь.
 
-	:param tokens: (list[str]) разбитое считанное условие where
+def _where(statement: Statement, columns: dict[str, str]) -> Condition | None:
+	"""
+	Условие WHERE команды, приведённое к типам столбцов таблицы.
 
-	:return: (dict[str, Any] | None) словарь ключ-значение для where, либо None, если
-	where не было
+	:param statement: (Statement) план команды
+	:param columns: (dict[str, str]) схема таблицы {столбец: тип}
+	:return: (Condition | None) условие, либо None, если условие некорректно
 
 	Пример:
-	>>> parse_where(["age", "=", "28"])
-	{'age': '28'}
+	>>> _where(parse_statement("delete from users where age >= 28"), columns)
+	Condition(('cmp', 'age', '>=', 28))
 	"""
-
 	try:
-		if len(tokens) < 3 or tokens[1] != "=":
-			raise ValueError
-		key = tokens[0]
-		val = tokens[2].strip('"').strip("'")
-		return {key: val}
-	except Exception:
-		print("Ошибка: некорректное условие WHERE.")
+		return statement.condition(columns)
+	except ValueError as e:
+		print(f"Ошибка: некорректное условие WHERE: {e}.")
 		return None
 
-
-def parse_set(tokens: list[str]) -> dict[str, Any] | None:
+def _schema(metadata: dict, table_name: str) -> dict[str, str] | None:
 	"""
-	Парсит выражение SET в словарь.
-
-	:param tokens: (list[str]) разбитое считанное условие set
+	Схема таблицы {столбец: тип}. Таблица проверяется той же функцией, что и в
+	Database (schema.table_schema).
 
-	:return: (dict[str, Any] | None) словарь ключ-значение для set, либо None, если
-	set не было
-
-	Пример:
-	>>> parse_set(["age", "=", "30"])
-	{'age': '30'}
+	:return: (dict[str, str] | None) схема, None - таблицы нет (ошибка выведена)
 	"""
 	try:
-		if len(tokens) < 3 or tokens[1] != "=":
-			raise ValueError
-		key = tokens[0]
-		val = tokens[2].strip('"').strip("'")
-		return {key: val}
-	except Exception:
-		print("Ошибка: некорректный SET.")
+		return table_schema(metadata, table_name)
+	except TableNotFoundError as e:
+		print(f"Ошибка: {e}")
 		return None
 
 def print_help() -> None:
 	"""Выводит справочную информацию по командам."""
 	print("\n***Операции с таблицами***")
-	print("create_table <имя_таблицы> <столбец1:тип> <столбец2:тип> ... - создать "
-																			"таблицу")
+	print("create_table <имя_таблицы> <столбец1:тип> <столбец2:тип> ... "
+		"[storage=json|columnar|segmented] - создать таблицу")
 	print("drop_table <имя_таблицы> - удалить таблицу (с подтверждением)")
 	print("list_tables - показать список всех таблиц")
+	print("convert_table <имя_таблицы> <json|columnar|segmented> - сменить формат "
+		"хранения")
+	print("create_index <имя_таблицы> <столбец> [hash|sorted] - создать индекс по "
+																			"столбцу")
+	print("vacuum [<имя_таблицы>] - свернуть журналы и упорядочить файлы таблиц "
+		"(в фоне)")
+	print("vacuum orphans=yes - то же для всех таблиц и удалить из каталога данных "
+		"файлы таблиц, которых нет в метаданных (с подтверждением)")
 
 	print("\n***Операции с данными***")
-	print("insert into <имя_таблицы> values (<значение1>, <значение2>, ...) - "
-																	"добавить запись")
-	print("select from <имя_таблицы> [where <столбец> = <значение>] - показать записи")
-	print("update <имя_таблицы> set <столбец> = <значение> where <столбец> = <значение>"
+	print("insert into <имя_таблицы> values (<значение1>, <значение2>, ...)"
+		"[, (...), ...] - добавить одну или несколько записей")
+	print("select [<столбец1>, <столбец2> | *] from <имя_таблицы> [where <условие>] "
+		"[limit N] [offset M] [format table|tsv|jsonl] - показать записи")
+	print("select count(*), sum(<столбец>), min|max|avg(<столбец>) from <имя_таблицы> "
+		"[where <условие>] [group by <столбец>] - агрегаты")
+	print("update <имя_таблицы> set <столбец> = <значение> where <условие>"
 																" - обновить запись")
-	print("delete from <имя_таблицы> where <столбец> = <значение> - удалить запись"
+	print("delete from <имя_таблицы> where <условие> - удалить запись"
 																" (с подтверждением)")
 	print("info <имя_таблицы> - информация о структуре таблицы")
+	print("<условие>: <столбец> <=|!=|<|<=|>|>=> <значение>, <столбец> in (<a>, <b>), "
+		"<столбец> between <a> and <b>, объединяются через and/or")
+	print("import <имя_таблицы> <файл.csv|файл.jsonl> - загрузить записи из файла")
+	print("export <имя_таблицы> <файл.csv|файл.jsonl> - выгрузить записи в файл")
+	print("cache_stats - статистика кэша select")
+	print("stats [json [<файл>] | reset] - метрики: время фаз, записи, байты, кэш")
+	print("profile <команда> - выполнить команду под cProfile")
+
+	print("\n***Транзакции***")
+	print("begin - начать транзакцию: изменения копятся в памяти до commit")
+	print("commit - зафиксировать транзакцию (или сохранить изменения пакетного "
+		"режима)")
+	print("rollback - отменить изменения транзакции")
 
 	print("\n***Дополнительно***")
 	print("help - показать эту справку")
 	print("exit - выйти из программы")
 
-def run():
-	"""Главный цикл программы."""
-	print("***База данных***")
-	print_help()
+def run(script: TextIO | None = None, assume_yes: bool = False) -> None:
+	"""
+	Главный цикл программы.
+
+	Без script команды читаются интерактивно. Со script команды читаются из файла
+	(или stdin) по одной на строку, а изменения накапливаются в памяти и
+	сохраняются на диск один раз - по команде commit и в конце скрипта.
+
+	:param script: (TextIO | None) поток с командами пакетного режима
+	:param assume_yes: (bool) выполнять опасные операции без подтверждения
+	"""
+	set_assume_yes(assume_yes)
+	if script is None:
+		print("***База данных***")
+		print_help()
+		import prompt
+
+		store = TableStore()
+		store.vacuum_worker = VacuumWorker(store.meta_file, store.index_file)
+		read_command = partial(prompt.string, ">>> Введите команду: ")
+	else:
+		set_log_deferred(True)
+		store = TableStore(batch=True)
+		read_command = partial(_read_script_line, script)
+
+	try:
+		_loop(store, read_command)
+	finally:
+		if store.in_transaction:
+			store.rollback()
+			print("Незавершённая транзакция отменена.")
+		if store.vacuum_worker is not None:
+			store.vacuum_worker.close()
+			store.vacuum_worker = None
+		store.flush()
+		set_log_deferred(False)
+		set_assume_yes(False)
+
+def _read_script_line(script: TextIO) -> str | None:
+	"""
+	Читает очередную команду скрипта. Пустые строки и комментарии (-- или #)
+	пропускаются, завершающая ";" отбрасывается.
 
+	:param script: (TextIO) поток с командами
+	:return: (str | None) команда, либо None в конце скрипта
+	"""
+	while line := script.readline():
+		line = line.strip().removesuffix(";").strip()
+		if line and not line.startswith(("--", "#")):
+			return line
+	return None
+
+def _loop(store: TableStore, read_command: Callable[[], str | None]) -> None:
+	"""
+	Цикл чтения и выполнения команд.
+
+	:param store: (TableStore) хранилище таблиц текущей сессии
+	:param read_command: (Callable[[], str | None]) возвращает очередную команду,
+		None - команды закончились
+	"""
 	while True:
-		user_input = prompt.string(">>> Введите команду: ").strip()
+		store.flush_if_due()
+		report_vacuum(store)
+		user_input = read_command()
+		if user_input is None:
+			break
+		if not run_command(store, user_input):
+			break
+
+
+def report_vacuum(store: TableStore) -> None:
+	"""
+	Передаёт хранилищу итоги фоновой очистки и печатает итоги запрошенной
+	командой vacuum.
 
-		if not user_input:
-			continue
+	:param store: (TableStore) хранилище таблиц текущей сессии
+	"""
+	if store.vacuum_worker is None:
+		return
+	for result in store.vacuum_worker.results():
+		store.vacuumed(result)
+		if result.requested:
+			_print_vacuum(result)
+
+def _print_vacuum(result: VacuumResult) -> None:
+	if result.error is not None:
+		print(f'Ошибка: очистка таблицы "{result.table}" не удалась: {result.error}')
+	elif result.table is None:
+		if result.reclaimed:
+			print(f"Удалены файлы прерванных записей и удалённых таблиц: "
+				f"{result.reclaimed} байт.")
+	elif result.after is None:
+		print(f'Очистка таблицы "{result.table}" отложена: таблицу изменяли во время '
+			"очистки.")
+	else:
+		print(f'Таблица "{result.table}" очищена: записей {result.count}, '
+			f"освобождено {max(result.reclaimed, 0)} байт.")
+
+def run_command(store: TableStore, user_input: str) -> bool:
+	"""
+	Разбирает и выполняет одну введённую команду, в том числе profile <команда>.
 
+	:param store: (TableStore) хранилище таблиц текущей сессии
+	:param user_input: (str) введённая строка
+	:return: (bool) False, если команда завершает работу (exit)
+	"""
+	if not user_input or user_input.isspace():
+		return True
+	return execute(store, parse_statement(user_input))
+
+def profile_command(store: TableStore, statement: Statement) -> bool:
+	"""
+	Выполняет команду под cProfile и выводит PROFILE_TOP_N самых затратных
+	функций по суммарному времени.
+
+	:param store: (TableStore) хранилище таблиц текущей сессии
+	:param statement: (Statement) план команды без слова profile
+	:return: (bool) False, если команда завершает работу (exit)
+	"""
+	import cProfile
+	import pstats
+
+	profiler = cProfile.Profile()
+	proceed = profiler.runcall(execute, store, statement)
+	stream = io.StringIO()
+	pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(
+		PROFILE_TOP_N)
+	print(stream.getvalue())
+	return proceed
+
+def print_stats(args: tuple[str, ...]) -> None:
+	"""
+	Выводит метрики процесса: stats - таблицей, stats json [<файл>] - в JSON
+	(на экран или в файл), stats reset - обнуляет их.
+
+	:param args: (tuple[str, ...]) команда stats с аргументами
+	"""
+	if len(args) > 1 and args[1] == "reset":
+		metrics.reset()
+		print("Метрики обнулены.")
+		return
+	if len(args) > 1 and args[1] == "json":
+		if len(args) > 2:
+			metrics.dump(args[2])
+			print(f"Метрики сохранены в {args[2]}")
+		else:
+			print(json.dumps(metrics.snapshot(), indent=4, ensure_ascii=False))
+		return
+
+	from prettytable import PrettyTable
+
+	snapshot = metrics.snapshot()
+	table = PrettyTable()
+	table.field_names = ["метрика", "вызовов", "среднее, мс", "p50, мс", "p95, мс",
+																	"макс., мс"]
+	for name, timing in snapshot["timings"].items():
+		table.add_row([name, timing["count"],
+			*(f"{timing[key] * 1000:.3f}" for key in ("mean", "p50", "p95", "max"))])
+	print(table.get_string())
+	for name, value in snapshot["counters"].items():
+		print(f"{name}: {value}")
+	for gauge, title in (("select_cache", "Кэш select"), ("plan_cache", "Кэш планов")):
+		cache = snapshot["gauges"].get(gauge)
+		if cache is not None:
+			print(f"{title}: доля попаданий {cache['hit_ratio']:.1%} "
+				f"({cache['hits']} из {cache['hits'] + cache['misses']})")
+
+# Выполнение команд: по одной функции (store, план) на команду, см. _HANDLERS
+
+def _run_create_table(store: TableStore, statement: Statement) -> None:
+	with store.metadata_lock():
+		updated = create_table(store.metadata, statement.table,
+			list(statement.parts["columns"]),
+			statement.parts["storage"])
+		store.save_metadata(updated, statement.table)
+
+def _run_drop_table(store: TableStore, statement: Statement) -> None:
+	table_name = statement.table
+	with store.lock(table_name, exclusive=True):
+		updated = drop_table(store.metadata, table_name)
+		if updated is not None:
+			store.save_metadata(updated, table_name)
+			store.forget(table_name)
+	if updated is not None:
+		index_metadata = store.index_metadata
+		if table_name not in updated and table_name in index_metadata:
+			del index_metadata[table_name]
+			store.save_index_metadata(index_metadata)
+
+def _run_convert_table(store: TableStore, statement: Statement) -> None:
+	table_name = statement.table
+	with store.lock(table_name, exclusive=True):
+		store.flush()
+		updated = convert_table(store.metadata, table_name, statement.parts["storage"])
+		if updated is not None:
+			store.save_metadata(updated, table_name)
+			store.forget(table_name)
+			# файлы таблицы уже переписаны - метаданные должны попасть на диск
+			store.flush()
+
+def _run_create_index(store: TableStore, statement: Statement) -> None:
+	updated = create_index(store.metadata, store.index_metadata, statement.table,
+		statement.parts["column"], statement.parts["kind"])
+	store.save_index_metadata(updated)
+
+def _run_insert(store: TableStore, statement: Statement) -> None:
+	table_name = statement.table
+	with store.lock(table_name, exclusive=True):
+		metadata = store.metadata
+		insert(metadata, table_name, store.rows(table_name),
+			list(statement.parts["rows"]), store.indexes(table_name))
+		store.save_metadata(metadata, table_name)
+		store.written(table_name)
+
+def _run_select(store: TableStore, statement: Statement) -> None:
+	query = statement.parts
+	table_name = statement.table
+	metadata = store.metadata
+
+	schema = _schema(metadata, table_name)
+	if schema is None:
+		return
+	where_clause = None
+	if query["where"] is not None:
+		where_clause = _where(statement, schema)
+		if where_clause is None:
+			return
+
+	if query["aggregate"]:
 		try:
-			args = shlex.split(user_input)
-		except ValueError:
-			print("Некорректный ввод. Попробуйте снова.")
-			continue
-
-		command = args[0]
-		metadata = load_metadata(DB_META_FILE)
-
-		match command:
-			case "create_table":
-				if len(args) < 2:
-					print("Ошибка: Слишком мало аргументов.")
-					continue
-				table_name = args[1]
-				columns = args[2:]
-				updated = create_table(metadata, table_name, columns)
-				save_metadata(DB_META_FILE, updated)
-
-			case "drop_table":
-				if len(args) != 2:
-					print("Ошибка: укажите имя таблицы.")
-					continue
-				table_name = args[1]
-				updated = drop_table(metadata, table_name)
-				save_metadata(DB_META_FILE, updated)
-
-			case "insert":
-				if len(args) < 5 or args[1] != "into" or args[3] != "values":
-					print("Ошибка синтаксиса. Пример: insert into <table> values (...)")
-					continue
-				table_name = args[2]
-				values_str = " ".join(args[4:])
-				values = values_str.strip("()").split(", ")
-				insert(metadata, table_name, values)
-
-			case "select":
-				if len(args) < 3 or args[1] != "from":
-					print("Ошибка синтаксиса. Пример: select from <table>")
-					continue
-				table_name = args[2]
-				table_data = load_table_data(table_name)
-
-				where_clause = None
-				if len(args) > 3 and args[3] == "where":
-					where_clause = parse_where(args[4:])
-
-				select(table_data, where_clause)
-
-			case "update":
-				if "set" not in args or "where" not in args:
-					print("Ошибка синтаксиса. Пример: update <table> set x=1 where y=2")
-					continue
-				table_name = args[1]
-				table_data = load_table_data(table_name)
-
-				set_index = args.index("set")
-				where_index = args.index("where")
-
-				set_clause = parse_set(args[set_index + 1:where_index])
-				where_clause = parse_where(args[where_index + 1:])
-
-				if set_clause and where_clause:
-					updated_data = update(table_data, set_clause, where_clause)
-					save_table_data(table_name, updated_data)
-
-			case "delete":
-				if len(args) < 6 or args[1] != "from" or args[3] != "where":
-					print("Ошибка синтаксиса. Пример: delete from <table> where x=1")
-					continue
-				table_name = args[2]
-				table_data = load_table_data(table_name)
-
-				where_clause = parse_where(args[4:])
-				if where_clause:
-					new_data = delete(table_data, where_clause)
-					save_table_data(table_name, new_data)
-
-
-			case "list_tables":
-				list_tables(metadata)
-
-			case "help":
-				print_help()
-
-			case "info":
-				if len(args) != 2:
-					print("Ошибка: укажите имя таблицы.")
-					continue
-				info(metadata, args[1])
-
-			case "exit":
-				print("Выход из программы...")
-				break
-
-			case _:
-				print(f"Функции {command} нет. Попробуйте снова или вызовите справочник"
-																f"по команде 'help'.")
+			items = parse_aggregates(list(query["columns"] or ()), schema,
+				list(query["group_by"]))
+		except ValueError as e:
+			print(f"Ошибка: {e}.")
+			return
+		with store.lock(table_name):
+			aggregate(table_name, store.rows(table_name), items,
+				list(query["group_by"]), where_clause, store.indexes(table_name),
+				store.row_count(table_name), query["limit"], query["offset"],
+				query["output"])
+		return
+
+	columns = list(query["columns"]) if query["columns"] is not None else None
+	with store.lock(table_name):
+		select(table_name, store.rows(table_name), where_clause,
+			store.indexes(table_name), store.version(table_name), columns,
+			query["limit"], query["offset"], query["output"])
+
+def _run_update(store: TableStore, statement: Statement) -> None:
+	table_name = statement.table
+	columns = _schema(store.metadata, table_name)
+	if columns is None:
+		return
+	where_clause = _where(statement, columns)
+	if where_clause:
+		with store.lock(table_name, exclusive=True):
+			update(table_name, columns, store.rows(table_name),
+				dict(statement.parts["set"]), where_clause, store.indexes(table_name))
+			store.written(table_name)
+
+def _run_delete(store: TableStore, statement: Statement) -> None:
+	table_name = statement.table
+	columns = _schema(store.metadata, table_name)
+	if columns is None:
+		return
+	where_clause = _where(statement, columns)
+	if where_clause:
+		with store.lock(table_name, exclusive=True):
+			delete(table_name, store.rows(table_name), where_clause,
+				store.indexes(table_name))
+			store.written(table_name)
+
+def _run_import(store: TableStore, statement: Statement) -> None:
+	table_name = statement.table
+	with store.lock(table_name, exclusive=True):
+		metadata = store.metadata
+		import_rows(metadata, table_name, store.rows(table_name),
+			statement.parts["path"], store.indexes(table_name))
+		store.save_metadata(metadata, table_name)
+		store.written(table_name)
+
+def _run_export(store: TableStore, statement: Statement) -> None:
+	table_name = statement.table
+	with store.lock(table_name):
+		export_rows(store.metadata, table_name, store.rows(table_name),
+			statement.parts["path"])
+
+def _run_info(store: TableStore, statement: Statement) -> None:
+	with store.lock(statement.table):
+		info(store.metadata, statement.table, store.row_count(statement.table))
+
+def _run_begin(store: TableStore, statement: Statement) -> None:
+	if store.in_transaction:
+		print("Ошибка: транзакция уже начата.")
+		return
+	store.begin()
+	print("Транзакция начата.")
+
+def _run_commit(store: TableStore, statement: Statement) -> None:
+	try:
+		store.commit()
+	except OSError as e:
+		print(f"Ошибка: не удалось зафиксировать транзакцию, изменения отменены: {e}")
+		return
+	print("Изменения сохранены.")
+
+def _run_rollback(store: TableStore, statement: Statement) -> None:
+	if not store.in_transaction and not store.batch:
+		print("Ошибка: транзакция не начата.")
+		return
+	store.rollback()
+	print("Изменения отменены.")
+
+def _run_cache_stats(store: TableStore, statement: Statement) -> None:
+	stats = cache_result.stats()
+	print(f"Кэш select: записей {stats['size']}, попаданий {stats['hits']}, "
+		f"промахов {stats['misses']}, вытеснено {stats['evictions']}, "
+		f"доля попаданий {stats['hit_ratio']:.1%}")
+
+@confirm_action("удалить файлы таблиц, которых нет в метаданных")
+def _confirm_orphans() -> bool:
+	# каталог данных общий: файлы таблиц других файлов метаданных тоже удалятся
+	return True
+
+def _run_vacuum(store: TableStore, statement: Statement) -> None:
+	table_name = statement.table
+	orphans = statement.parts["orphans"]
+	if table_name is not None and table_name not in store.metadata:
+		print(f'Ошибка: Таблица "{table_name}" не существует.')
+		return
+	if orphans and not _confirm_orphans():
+		return
+	if store.vacuum_worker is not None:
+		store.vacuum_worker.request(table_name, orphans)
+		print("Очистка запущена в фоне.")
+		return
+	# без фонового потока (пакетный режим) - сразу, после сохранения изменений
+	store.flush()
+	for result in vacuum(table_name, store.meta_file, store.index_file, orphans):
+		store.vacuumed(result)
+		_print_vacuum(result)
+
+def _run_exit(store: TableStore, statement: Statement) -> bool:
+	print("Выход из программы...")
+	return False
+
+# Команды, меняющие схему или файлы таблиц сразу: в транзакции их не отменить
+_SCHEMA_COMMANDS = {"create_table", "drop_table", "convert_table", "create_index",
+                    "vacuum"}
+
+_HANDLERS: dict[str, Callable[[TableStore, Statement], bool | None]] = {
+	"create_table": _run_create_table,
+	"drop_table": _run_drop_table,
+	"convert_table": _run_convert_table,
+	"create_index": _run_create_index,
+	"insert": _run_insert,
+	"select": _run_select,
+	"update": _run_update,
+	"delete": _run_delete,
+	"import": _run_import,
+	"export": _run_export,
+	"info": _run_info,
+	"begin": _run_begin,
+	"commit": _run_commit,
+	"rollback": _run_rollback,
+	"list_tables": lambda store, statement: list_tables(store.metadata),
+	"stats": lambda store, statement: print_stats(statement.args),
+	"cache_stats": _run_cache_stats,
+	"help": lambda store, statement: print_help(),
+	"vacuum": _run_vacuum,
+	"profile": lambda store, statement: profile_command(
+		store, statement.parts["statement"]),
+	"exit": _run_exit,
+}
+
+def execute(store: TableStore, statement: Statement) -> bool:
+	"""
+	Выполняет одну разобранную команду (см. statements.parse_statement).
+
+	:param store: (TableStore) хранилище таблиц текущей сессии
+	:param statement: (Statement) план команды
+	:return: (bool) False, если команда завершает работу (exit)
+	"""
+	if statement.error is not None:
+		print(statement.error)
+		return True
+	if statement.command in _SCHEMA_COMMANDS and store.in_transaction:
+		print(f"Ошибка: команда {statement.command} недоступна внутри транзакции. "
+			"Завершите её через commit или rollback.")
+		return True
+	handler = _HANDLERS.get(statement.command)
+	return handler is None or handler(store, statement) is not False
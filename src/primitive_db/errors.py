@@ -0,0 +1,34 @@
+class DatabaseError(Exception):
+	"""Базовое исключение базы данных."""
+
+
+class TableExistsError(DatabaseError):
+	"""Таблица с таким именем уже существует."""
+
+
+class TableNotFoundError(DatabaseError):
+	"""Таблицы не существует."""
+
+
+class ColumnNotFoundError(DatabaseError):
+	"""Столбца нет в схеме таблицы."""
+
+
+class ValidationError(DatabaseError, ValueError):
+	"""Значение, тип или формат не подходит под схему."""
+
+
+class BatchValidationError(ValidationError):
+	"""
+	Часть записей пачки не подходит под схему. В errors - все такие записи:
+	[(номер записи с 0, сообщение)].
+	"""
+
+	def __init__(self, errors: list[tuple[int, str]]) -> None:
+		self.errors = errors
+		super().__init__("записи не подходят под схему: " + "; ".join(
+			f"{number}: {message}" for number, message in errors))
+
+
+class QueryError(DatabaseError, ValueError):
+	"""Некорректное условие или запрос."""
@@ -0,0 +1,131 @@
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Iterator
+
+try:
+	import fcntl
+except ImportError:  # Windows: межпроцессные блокировки не поддерживаются
+	fcntl = None
+
+from src.primitive_db.constants import FSYNC_WRITES
+
+# Блокировки, которые удерживает поток: путь -> [файл блокировки, эксклюзивная].
+# flock привязан к открытому файлу, поэтому блокировки разных потоков одного
+# процесса конкурируют так же, как блокировки разных процессов.
+_local = threading.local()
+
+
+def _held() -> dict[str, list]:
+	if not hasattr(_local, "held"):
+		_local.held = {}
+	return _local.held
+
+
+def lock_mode(path: Path | str) -> str | None:
+	"""
+	Возвращает вид блокировки, которую текущий поток удерживает на path.
+
+	:param path: путь до файла блокировки
+	:return: (str | None) "exclusive", "shared" или None, если блокировки нет
+	"""
+	held = _held().get(os.fspath(path))
+	if held is None:
+		return None
+	return "exclusive" if held[1] else "shared"
+
+
+@contextmanager
+def file_lock(path: Path | str, exclusive: bool = False) -> Iterator[None]:
+	"""
+	Межпроцессная блокировка через fcntl.flock: разделяемая для чтения,
+	эксклюзивная для записи.
+
+	Повторный захват уже удерживаемой блокировки внутри потока ничего не делает,
+	поэтому блокируемые функции можно вызывать друг из друга. Повышать
+	разделяемую блокировку до эксклюзивной нельзя: между снятием и захватом
+	данные успел бы изменить другой процесс.
+
+	:param path: путь до файла блокировки (создаётся при необходимости)
+	:param exclusive: (bool) True - эксклюзивная блокировка
+	:raises RuntimeError: при попытке повысить разделяемую блокировку
+	"""
+	key = os.fspath(path)
+	held_locks = _held()
+	held = held_locks.get(key)
+	if held is not None:
+		if exclusive and not held[1]:
+			raise RuntimeError(f"нельзя повысить разделяемую блокировку {key}")
+		yield
+		return
+
+	Path(key).parent.mkdir(parents=True, exist_ok=True)
+	with open(key, "a+b") as f:
+		if fcntl is not None:
+			fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+		held_locks[key] = [f, exclusive]
+		try:
+			yield
+		finally:
+			# закрытие файла снимает flock
+			del held_locks[key]
+
+
+def file_signature(*paths: Path | str) -> tuple:
+	"""
+	Возвращает (mtime, размер) для каждого файла, по которым определяется,
+	менялись ли файлы с момента последнего чтения.
+	"""
+	signature = []
+	for path in paths:
+		try:
+			stat = os.stat(path)
+			signature.append((stat.st_mtime_ns, stat.st_size))
+		except FileNotFoundError:
+			signature.append(None)
+	return tuple(signature)
+
+
+@contextmanager
+def atomic_write(path: Path | str, mode: str = "w",
+                 newline: str | None = None) -> Iterator[IO]:
+	"""
+	Записывает файл атомарно: во временный файл рядом с целевым, который затем
+	подменяет целевой через os.replace. При сбое посреди записи целевой файл
+	остаётся прежним. Если FSYNC_WRITES, данные и каталог сбрасываются на диск.
+
+	:param path: путь до целевого файла
+	:param mode: (str) "w" для текста (UTF-8) или "wb" для двоичных данных
+	:param newline: (str | None) параметр newline для текстового режима
+	:return: (IO) открытый временный файл
+	"""
+	tmp_path = f"{path}.{os.getpid()}.tmp"
+	encoding = None if "b" in mode else "utf-8"
+	try:
+		with open(tmp_path, mode, encoding=encoding, newline=newline) as f:
+			yield f
+			f.flush()
+			if FSYNC_WRITES:
+				os.fsync(f.fileno())
+		os.replace(tmp_path, path)
+	except BaseException:
+		Path(tmp_path).unlink(missing_ok=True)
+		raise
+	if FSYNC_WRITES:
+		fsync_dir(Path(path).parent)
+
+
+def fsync_dir(path: Path) -> None:
+	"""Сбрасывает на диск каталог, чтобы переименование файла пережило сбой."""
+	try:
+		fd = os.open(path, os.O_RDONLY)
+	except OSError:
+		return
+	try:
+		os.fsync(fd)
+	except OSError:
+		# на некоторых системах каталоги не поддерживают fsync
+		pass
+	finally:
+		os.close(fd)
@@ -0,0 +1,123 @@
+from bisect import bisect_left, bisect_right
+from typing import Any, Iterable
+
+from src.primitive_db.rows import column_getter, id_of
+
+INDEX_KINDS = {"hash", "sorted"}
+
+
+class HashIndex:
+	"""
+	Хэш-индекс по столбцу: значение -> записи с этим значением.
+
+	Значения приводятся к строке так же, как при сравнении в WHERE, поэтому поиск
+	по индексу возвращает те же записи, что и полный перебор таблицы.
+	"""
+
+	kind = "hash"
+
+	def __init__(self, column: str, rows: Iterable[dict] = ()) -> None:
+		self.column = column
+		self._value = column_getter(column)
+		# значение -> {id(запись): запись}, чтобы удалять запись за O(1)
+		self._buckets: dict[str, dict[int, dict]] = {}
+		for row in rows:
+			self.add(row)
+
+	def add(self, row: dict) -> None:
+		"""Добавляет запись в индекс."""
+		key = str(self._value(row))
+		self._buckets.setdefault(key, {})[id(row)] = row
+
+	def remove(self, row: dict) -> None:
+		"""Убирает запись из индекса."""
+		key = str(self._value(row))
+		bucket = self._buckets.get(key)
+		if bucket is not None:
+			bucket.pop(id(row), None)
+			if not bucket:
+				del self._buckets[key]
+
+	def lookup(self, value: Any) -> list[dict]:
+		"""
+		Возвращает записи, у которых значение столбца равно value, в порядке ID.
+
+		:param value: искомое значение
+		:return: (list[dict]) найденные записи
+		"""
+		bucket = self._buckets.get(str(value))
+		if not bucket:
+			return []
+		return sorted(bucket.values(), key=id_of)
+
+
+class SortedIndex(HashIndex):
+	"""
+	Упорядоченный индекс: помимо поиска по равенству поддерживает выборку
+	по диапазону значений (bisect по отсортированному списку ключей).
+	"""
+
+	kind = "sorted"
+
+	def __init__(self, column: str, rows: Iterable[dict] = ()) -> None:
+		super().__init__(column)
+		# при построении записи сортируются один раз: вставка по одной через
+		# bisect и list.insert стоила бы O(n^2)
+		rows = list(rows)
+		for row in rows:
+			HashIndex.add(self, row)
+		value = self._value
+		rows.sort(key=lambda row: (value(row), id_of(row)))
+		self._keys: list = [value(row) for row in rows]
+		self._rows: list[dict] = rows
+
+	def add(self, row: dict) -> None:
+		super().add(row)
+		key = self._value(row)
+		pos = bisect_right(self._keys, key)
+		self._keys.insert(pos, key)
+		self._rows.insert(pos, row)
+
+	def remove(self, row: dict) -> None:
+		super().remove(row)
+		key = self._value(row)
+		lo, hi = bisect_left(self._keys, key), bisect_right(self._keys, key)
+		for pos in range(lo, hi):
+			if self._rows[pos] is row:
+				del self._keys[pos]
+				del self._rows[pos]
+				return
+
+	def range(self, low: Any = None, high: Any = None, include_low: bool = True,
+			include_high: bool = True) -> list[dict]:
+		"""
+		Возвращает записи, значение столбца которых лежит в диапазоне [low, high].
+
+		:param low: нижняя граница (None - без границы)
+		:param high: верхняя граница (None - без границы)
+		:param include_low: (bool) включать ли нижнюю границу
+		:param include_high: (bool) включать ли верхнюю границу
+		:return: (list[dict]) найденные записи в порядке значений столбца
+		"""
+		if low is None:
+			lo = 0
+		else:
+			lo = (bisect_left if include_low else bisect_right)(self._keys, low)
+		if high is None:
+			hi = len(self._keys)
+		else:
+			hi = (bisect_right if include_high else bisect_left)(self._keys, high)
+		return self._rows[lo:hi]
+
+
+def build_index(kind: str, column: str, rows: Iterable[dict]) -> HashIndex:
+	"""
+	Строит индекс заданного вида по записям таблицы.
+
+	:param kind: (str) вид индекса: "hash" или "sorted"
+	:param column: (str) индексируемый столбец
+	:param rows: (Iterable[dict]) записи таблицы
+	:return: (HashIndex) построенный индекс
+	"""
+	index_class = SortedIndex if kind == "sorted" else HashIndex
+	return index_class(column, rows)
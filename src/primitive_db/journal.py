@@ -0,0 +1,250 @@
+import json
+import os
+import threading
+from collections import defaultdict
+from pathlib import Path
+
+from src.primitive_db.constants import FSYNC_WRITES, JOURNAL_FILE
+from src.primitive_db.files import file_lock
+from src.primitive_db.metrics import metrics
+from src.primitive_db.utils import (
+	encode_log_entries,
+	load_metadata,
+	metadata_lock_path,
+	save_metadata,
+	table_log_path,
+)
+
+# Запись журнала фиксации - одна JSON-строка с изменениями одной или нескольких
+# транзакций:
+# {"logs": {таблица: {"offset": размер журнала таблицы до записи,
+#                     "entries": [операции]}},
+#  "metadata": {файл метаданных: {таблица: описание или null - таблица удалена}}}
+# Запись применяется к журналам таблиц и метаданным, после чего журнал
+# фиксации очищается. Непустой журнал означает, что применение прервал сбой:
+# запись применяется заново (см. recover), незавершённая строка отбрасывается.
+
+
+def _file_size(path: Path) -> int:
+	try:
+		return os.path.getsize(path)
+	except OSError:
+		return 0
+
+
+def _write_at(path: Path, offset: int, data: bytes) -> int:
+	"""
+	Записывает операции в журнал таблицы с позиции offset. Если они уже
+	записаны (повторное применение при восстановлении), файл не меняется,
+	недописанный при сбое хвост заменяется.
+
+	:return: (int) число записанных байт
+	"""
+	with open(path, "a+b") as f:
+		if f.seek(0, os.SEEK_END) >= offset:
+			f.seek(offset)
+			existing = f.read(len(data))
+			if existing == data:
+				return 0
+			if data.startswith(existing):
+				f.truncate(offset)
+		# иначе журнал за это время свернули или дописали: операции
+		# идемпотентны, поэтому дописываются в конец
+		f.write(data)
+		f.flush()
+		if FSYNC_WRITES:
+			os.fsync(f.fileno())
+	return len(data)
+
+
+def _apply_metadata(meta_file: str, entries: dict[str, dict | None]) -> None:
+	"""Переносит описания таблиц из записи журнала в файл метаданных."""
+	with file_lock(metadata_lock_path(meta_file), exclusive=True):
+		metadata = load_metadata(meta_file)
+		for table_name, entry in entries.items():
+			if entry is None:
+				metadata.pop(table_name, None)
+				continue
+			current = metadata.get(table_name)
+			if (isinstance(current, dict)
+					and current.get("next_id", 0) > entry["next_id"]):
+				# при восстановлении счётчик ID мог уйти дальше
+				entry = {**entry, "next_id": current["next_id"]}
+			metadata[table_name] = entry
+		save_metadata(meta_file, metadata)
+
+
+def _apply(record: dict) -> None:
+	"""Применяет запись журнала фиксации к журналам таблиц и метаданным."""
+	written = 0
+	for table_name, log in record["logs"].items():
+		written += _write_at(table_log_path(table_name), log["offset"],
+			encode_log_entries(log["entries"]))
+	for meta_file, entries in record["metadata"].items():
+		_apply_metadata(meta_file, entries)
+	metrics.count("bytes_written", written)
+
+
+class _Transaction:
+	"""Изменения одной транзакции, ожидающие записи в журнал фиксации."""
+
+	__slots__ = ("logs", "metadata", "done", "error")
+
+	def __init__(self, logs: dict[str, list[dict]],
+			metadata: dict[str, dict[str, dict | None]]) -> None:
+		self.logs = logs
+		self.metadata = metadata
+		self.done = False
+		self.error: BaseException | None = None
+
+
+class CommitJournal:
+	"""
+	Журнал фиксации транзакций (commit) с групповой записью.
+
+	Изменения транзакции - операции журналов нескольких таблиц и описания
+	таблиц в метаданных - пишутся в журнал фиксации одной записью с одним fsync
+	и только потом применяются к файлам таблиц и метаданных, поэтому после сбоя
+	транзакция либо видна целиком, либо не видна совсем.
+
+	Групповая запись: пока один поток пишет журнал (ведущий), транзакции других
+	потоков встают в очередь; следующий ведущий забирает всю очередь и пишет
+	её одной записью. Так одновременные commit делят один сброс на диск.
+	Между процессами запись журнала упорядочивает блокировка <журнал>.lock.
+
+	Журналы таблиц пишутся без блокировок таблиц: их до конца commit держат
+	фиксируемые транзакции (см. TableStore.begin).
+	"""
+
+	def __init__(self, path: Path = JOURNAL_FILE) -> None:
+		self.path = path
+		self._condition = threading.Condition()
+		self._queue: list[_Transaction] = []
+		self._writing = False
+
+	@property
+	def _lock_path(self) -> Path:
+		return Path(f"{self.path}.lock")
+
+	def commit(self, logs: dict[str, list[dict]],
+			metadata: dict[str, dict[str, dict | None]]) -> None:
+		"""
+		Фиксирует транзакцию и возвращается, когда её изменения на диске.
+
+		:param logs: (dict[str, list[dict]]) операции {таблица: операции}
+		:param metadata: (dict[str, dict[str, dict | None]]) изменённые описания
+			таблиц {файл метаданных: {таблица: описание или None}}
+		:raises OSError: если запись не удалась (транзакция не применена)
+		"""
+		transaction = _Transaction(logs, metadata)
+		with self._condition:
+			self._queue.append(transaction)
+			while self._writing and not transaction.done:
+				self._condition.wait()
+			if not transaction.done:
+				self._writing = True
+				group, self._queue = self._queue, []
+		if not transaction.done:
+			error = None
+			try:
+				self._write(group)
+			except BaseException as e:
+				error = e
+			with self._condition:
+				for member in group:
+					member.done = True
+					member.error = error
+				self._writing = False
+				self._condition.notify_all()
+		if transaction.error is not None:
+			raise transaction.error
+
+	def _write(self, group: list[_Transaction]) -> None:
+		"""Записывает транзакции группы одной записью журнала и применяет её."""
+		logs: defaultdict[str, list[dict]] = defaultdict(list)
+		metadata: defaultdict[str, dict[str, dict | None]] = defaultdict(dict)
+		for transaction in group:
+			for table_name, entries in transaction.logs.items():
+				logs[table_name].extend(entries)
+			for meta_file, entries in transaction.metadata.items():
+				metadata[meta_file].update(entries)
+
+		self.path.parent.mkdir(parents=True, exist_ok=True)
+		with file_lock(self._lock_path, exclusive=True), metrics.phase("commit"):
+			self._recover()
+			record = {
+				"logs": {
+					table_name: {"offset": _file_size(table_log_path(table_name)),
+						"entries": entries}
+					for table_name, entries in logs.items()
+				},
+				"metadata": metadata,
+			}
+			data = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+			with open(self.path, "wb") as f:
+				f.write(data)
+				f.flush()
+				if FSYNC_WRITES:
+					os.fsync(f.fileno())
+			metrics.count("bytes_written", len(data))
+			_apply(record)
+			self._clear()
+		metrics.count("journal_flushes")
+		metrics.count("journal_commits", len(group))
+
+	def _clear(self) -> None:
+		with open(self.path, "r+b") as f:
+			f.truncate()
+			if FSYNC_WRITES:
+				os.fsync(f.fileno())
+
+	def _recover(self) -> bool:
+		"""Доприменяет запись, оставшуюся после сбоя (под блокировкой журнала)."""
+		try:
+			with open(self.path, "rb") as f:
+				line = f.readline()
+		except FileNotFoundError:
+			return False
+		if not line:
+			return False
+		try:
+			record = json.loads(line)
+		except ValueError:
+			# запись не дописана - commit не был подтверждён
+			record = None
+		if record is not None:
+			_apply(record)
+			metrics.count("journal_recovered")
+		self._clear()
+		return record is not None
+
+	def recover(self) -> bool:
+		"""
+		Применяет запись, которую не успел применить упавший процесс.
+
+		:return: (bool) True, если транзакция была восстановлена
+		"""
+		if not _file_size(self.path):
+			return False
+		with file_lock(self._lock_path, exclusive=True):
+			return self._recover()
+
+
+_journals: dict[str, CommitJournal] = {}
+_journals_lock = threading.Lock()
+
+
+def commit_journal(path: Path = JOURNAL_FILE) -> CommitJournal:
+	"""
+	Журнал фиксации по пути path, общий для всех потоков процесса (иначе
+	одновременные commit не попадут в одну группу).
+
+	:param path: (Path) путь до журнала
+	:return: (CommitJournal) журнал
+	"""
+	key = os.fspath(path)
+	with _journals_lock:
+		journal = _journals.get(key)
+		if journal is None:
+			journal = _journals[key] = CommitJournal(path)
+		return journal
@@ -0,0 +1,212 @@
+import mmap
+import os
+import sys
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterator, MutableMapping, ValuesView
+from pathlib import Path
+
+from src.primitive_db.columnar import read_header
+from src.primitive_db.rows import Row, as_row, row_type
+
+
+class _LazyValues(ValuesView):
+	"""Представление значений, перебирающее записи по позициям без поиска по ID."""
+
+	def __iter__(self) -> Iterator[dict]:
+		return self._mapping.iter_rows()
+
+
+class LazyTable(MutableMapping):
+	"""
+	Таблица в колоночном формате, открытая через mmap без загрузки в память.
+
+	Ведёт себя как словарь записей по ID (как таблица в TableStore), но
+	декодирует только те записи, к которым обращаются (в Row). Операции из
+	журнала таблицы хранятся поверх снимка: добавленные, изменённые и удалённые
+	записи.
+	"""
+
+	def __init__(self, filepath: Path, log_entries: list[dict]) -> None:
+		self._columns: list[tuple[str, str, list[memoryview]]] = []
+		self._rows = 0
+		self._ids: memoryview | list[int] = []
+		self._positions: dict[int, int] | None = None
+		self._mmap = None
+		# путь и отпечаток открытого снимка: по ним процессы параллельного
+		# просмотра открывают тот же файл (см. parallel.py)
+		self.snapshot_key: tuple[str, int, int, int] | None = None
+		try:
+			with open(filepath, "rb") as f:
+				self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+				self.snapshot_key = snapshot_key(filepath, os.fstat(f.fileno()))
+		except (FileNotFoundError, ValueError):
+			# нет снимка (или он пуст) - таблица состоит только из журнала
+			pass
+		if self._mmap is not None:
+			self._open_snapshot()
+
+		self._inserted: dict[int, dict] = {}
+		self._updated: dict[int, dict] = {}
+		self._deleted: set[int] = set()
+		for entry in log_entries:
+			self._apply(entry)
+
+	def _open_snapshot(self) -> None:
+		"""Разбирает заголовок и готовит представления столбцов поверх mmap."""
+		buffer = memoryview(self._mmap)
+		header, data_start = read_header(buffer)
+		self._rows = header["rows"]
+		native = header["byteorder"] == sys.byteorder
+		for column in header["columns"]:
+			parts = [buffer[data_start + offset:data_start + offset + length]
+					for offset, length in column["parts"]]
+			if column["type"] != "bool":
+				# значения int и смещения str - массивы int64; при чужом порядке байт
+				# массив декодируется целиком один раз
+				parts[0] = parts[0].cast("q") if native else _swapped(parts[0])
+			self._columns.append((column["name"], column["type"], parts))
+			if column["name"] == "ID":
+				self._ids = parts[0]
+		self._row_type = row_type(tuple(name for name, _, _ in self._columns))
+
+		if not header.get("sorted_ids", False):
+			self._positions = {row_id: pos for pos, row_id in enumerate(self._ids)}
+
+	def _apply(self, entry: dict) -> None:
+		"""Применяет операцию журнала к слою изменений поверх снимка."""
+		match entry["op"]:
+			case "insert":
+				self[entry["row"]["ID"]] = as_row(entry["row"])
+			case "update":
+				row = self.get(entry["id"])
+				if row is not None:
+					self[entry["id"]] = row.replace(entry["set"])
+			case "delete":
+				for row_id in entry["ids"]:
+					self.pop(row_id, None)
+
+	def _position(self, row_id: int) -> int | None:
+		"""Позиция записи в снимке по ID или None."""
+		if self._positions is not None:
+			return self._positions.get(row_id)
+		pos = bisect_left(self._ids, row_id)
+		if pos < self._rows and self._ids[pos] == row_id:
+			return pos
+		return None
+
+	def row_at(self, pos: int) -> Row:
+		"""
+		Декодирует запись снимка по позиции, не трогая остальные записи.
+
+		:param pos: (int) позиция записи в снимке
+		:return: (Row) запись
+		"""
+		values = []
+		for _, type_, parts in self._columns:
+			if type_ == "int":
+				values.append(parts[0][pos])
+			elif type_ == "bool":
+				values.append(bool(parts[0][pos >> 3] >> (pos & 7) & 1))
+			else:
+				start, end = parts[0][pos], parts[0][pos + 1]
+				values.append(bytes(parts[1][start:end]).decode("utf-8"))
+		return self._row_type(values)
+
+	@property
+	def snapshot_size(self) -> int:
+		"""Число позиций в снимке, включая записи, удалённые журналом."""
+		return self._rows
+
+	def snapshot_row(self, pos: int) -> dict | None:
+		"""
+		Возвращает запись снимка по позиции с учётом журнала.
+
+		:param pos: (int) позиция записи в снимке
+		:return: (dict | None) запись или None, если она удалена
+		"""
+		row_id = self._ids[pos]
+		if row_id in self._deleted:
+			return None
+		updated = self._updated.get(row_id)
+		return updated if updated is not None else self.row_at(pos)
+
+	def updated_positions(self) -> list[int]:
+		"""Позиции в снимке записей, изменённых журналом, по возрастанию."""
+		return sorted(self._position(row_id) for row_id in self._updated)
+
+	def inserted_rows(self) -> list[dict]:
+		"""Записи, добавленные журналом после снимка, в порядке добавления."""
+		return list(self._inserted.values())
+
+	def iter_rows(self) -> Iterator[dict]:
+		"""Перебирает записи по порядку: сначала снимок, затем добавленные."""
+		for pos in range(self._rows):
+			row_id = self._ids[pos]
+			if row_id in self._deleted:
+				continue
+			updated = self._updated.get(row_id)
+			yield updated if updated is not None else self.row_at(pos)
+		yield from self._inserted.values()
+
+	def values(self) -> ValuesView:
+		return _LazyValues(self)
+
+	def __getitem__(self, row_id: int) -> dict:
+		if row_id in self._inserted:
+			return self._inserted[row_id]
+		if row_id in self._deleted:
+			raise KeyError(row_id)
+		if row_id in self._updated:
+			return self._updated[row_id]
+		pos = self._position(row_id)
+		if pos is None:
+			raise KeyError(row_id)
+		return self.row_at(pos)
+
+	def __setitem__(self, row_id: int, row: dict) -> None:
+		if self._position(row_id) is None:
+			self._inserted[row_id] = row
+		else:
+			self._deleted.discard(row_id)
+			self._updated[row_id] = row
+
+	def __delitem__(self, row_id: int) -> None:
+		if row_id in self._inserted:
+			del self._inserted[row_id]
+		elif row_id not in self._deleted and self._position(row_id) is not None:
+			self._deleted.add(row_id)
+			self._updated.pop(row_id, None)
+		else:
+			raise KeyError(row_id)
+
+	def __iter__(self) -> Iterator[int]:
+		for pos in range(self._rows):
+			row_id = self._ids[pos]
+			if row_id not in self._deleted:
+				yield row_id
+		yield from self._inserted
+
+	def __len__(self) -> int:
+		return self._rows - len(self._deleted) + len(self._inserted)
+
+
+def snapshot_key(filepath: Path | str,
+		stat: os.stat_result) -> tuple[str, int, int, int]:
+	"""
+	Отпечаток файла снимка: путь, inode, размер и время изменения. Снимок
+	заменяется переименованием, поэтому по отпечатку видно, тот ли это файл.
+
+	:param filepath: (Path | str) путь к снимку
+	:param stat: (os.stat_result) результат stat открытого файла
+	:return: (tuple[str, int, int, int]) отпечаток
+	"""
+	return (str(filepath), stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def _swapped(part: memoryview) -> list[int]:
+	"""Декодирует массив int64 с обратным порядком байт."""
+	values = array("q")
+	values.frombytes(part)
+	values.byteswap()
+	return values.tolist()
@@ -1,9 +1,106 @@
 #!/usr/bin/env python3
+import argparse
+import sys
+
+from src.primitive_db.constants import (
+    BENCH_SIZES,
+    BENCH_TOLERANCE,
+    SERVER_HOST,
+    SERVER_PORT,
+    SERVER_WORKERS,
+    STORAGE_FORMATS,
+)
 from src.primitive_db.engine import run
 
 
+def bench(args: argparse.Namespace) -> int:
+    """
+    Выполняет замеры database bench, сохраняет результаты и сравнивает их с
+    базовыми.
+
+    :param args: разобранные аргументы команды bench
+    :return: (int) код завершения: 1, если есть замедления относительно базы
+    """
+    from src.primitive_db.benchmarks import (
+        compare_results,
+        load_results,
+        print_results,
+        run_benchmarks,
+        save_results,
+    )
+    from src.primitive_db.schema import build_schema
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    schema = build_schema(args.schema)
+    del schema["ID"]
+    baseline = load_results(args.baseline) if args.baseline else None
+    if baseline is not None and baseline["meta"]["storage"] != args.storage:
+        print(f"Предупреждение: базовые результаты получены для формата "
+              f"{baseline['meta']['storage']}, а замер - для {args.storage}.")
+
+    results = run_benchmarks(sizes, schema, args.storage)
+    print_results(results, baseline)
+    save_results(args.output, results)
+    print(f"\nРезультаты сохранены в {args.output}")
+
+    if baseline is None:
+        return 0
+    regressions = compare_results(results, baseline, args.tolerance)
+    if regressions:
+        print("Замедления относительно базовых результатов:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print("Замедлений относительно базовых результатов нет.")
+    return 0
+
 def main():
-    run()
+    parser = argparse.ArgumentParser(prog="database",
+                                     description="Консольная база данных")
+    parser.add_argument("--script", help="файл с командами, по одной на строку")
+    parser.add_argument("--yes", action="store_true",
+                        help="выполнять drop_table и delete без подтверждения")
+    commands = parser.add_subparsers(dest="command")
+    bench_parser = commands.add_parser(
+        "bench", help="замерить скорость основных операций на синтетических таблицах")
+    bench_parser.add_argument("--sizes", default=",".join(map(str, BENCH_SIZES)),
+                              help="размеры таблиц через запятую")
+    bench_parser.add_argument("--schema", nargs="+",
+                              default=["name:str", "age:int", "is_active:bool"],
+                              help="столбцы синтетической таблицы вида имя:тип")
+    bench_parser.add_argument("--storage", choices=sorted(STORAGE_FORMATS),
+                              default="json", help="формат хранения таблиц")
+    bench_parser.add_argument("--output", default="bench_results.json",
+                              help="куда записать результаты (JSON)")
+    bench_parser.add_argument("--baseline",
+                              help="базовые результаты (JSON) для сравнения")
+    bench_parser.add_argument("--tolerance", type=float, default=BENCH_TOLERANCE,
+                              help="допустимое замедление, 0.2 - на 20%%")
+    serve_parser = commands.add_parser(
+        "serve", help="запустить сервер запросов, держащий таблицы в памяти")
+    serve_parser.add_argument("--host", default=SERVER_HOST, help="адрес TCP")
+    serve_parser.add_argument("--port", type=int, default=SERVER_PORT,
+                              help="порт TCP")
+    serve_parser.add_argument("--socket", help="путь до Unix-сокета вместо TCP")
+    serve_parser.add_argument("--workers", type=int, default=SERVER_WORKERS,
+                              help="число потоков, выполняющих запросы")
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        sys.exit(bench(args))
+    if args.command == "serve":
+        from src.primitive_db.server import serve
+
+        serve(args.host, args.port, args.socket, args.workers)
+        return
+    if args.script:
+        with open(args.script, encoding="utf-8") as f:
+            run(f, args.yes)
+    elif not sys.stdin.isatty():
+        # команды переданы через конвейер: database < file.sql
+        run(sys.stdin, args.yes)
+    else:
+        run(assume_yes=args.yes)
 
 if __name__ == "__main__":
     main()
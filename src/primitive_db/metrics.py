@@ -0,0 +1,181 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from typing import Any
+
+# Верхние границы корзин гистограмм времени в секундах: от 10 мкс до ~84 с
+_BUCKETS = tuple(10e-6 * 2 ** power for power in range(24))
+
+
+class Histogram:
+	"""
+	Гистограмма длительностей с корзинами по степеням двойки. Хранит число
+	наблюдений, сумму, минимум и максимум; квантили оцениваются по корзинам
+	(с точностью до границы корзины).
+	"""
+
+	def __init__(self) -> None:
+		self.counts = [0] * (len(_BUCKETS) + 1)
+		self.count = 0
+		self.total = 0.0
+		self.min: float | None = None
+		self.max: float | None = None
+
+	def observe(self, value: float) -> None:
+		self.counts[bisect_left(_BUCKETS, value)] += 1
+		self.count += 1
+		self.total += value
+		if self.min is None or value < self.min:
+			self.min = value
+		if self.max is None or value > self.max:
+			self.max = value
+
+	def quantile(self, q: float) -> float | None:
+		"""Оценка квантиля q (0..1): верхняя граница корзины, где он находится."""
+		if not self.count:
+			return None
+		rank = q * self.count
+		seen = 0
+		for pos, count in enumerate(self.counts):
+			seen += count
+			if seen >= rank and count:
+				return min(_BUCKETS[pos], self.max) if pos < len(_BUCKETS) else self.max
+		return self.max
+
+	def snapshot(self) -> dict[str, Any]:
+		return {
+			"count": self.count,
+			"total": self.total,
+			"mean": self.total / self.count if self.count else None,
+			"min": self.min,
+			"p50": self.quantile(0.5),
+			"p95": self.quantile(0.95),
+			"max": self.max,
+		}
+
+
+class Metrics:
+	"""
+	Метрики процесса: гистограммы длительностей (по фазам выполнения команд -
+	load, parse, filter, render, save - и по командам), счётчики (записи,
+	байты) и показатели, которые вычисляются при запросе (например, статистика
+	кэша select).
+
+	Слой подключаемый: register_gauge добавляет показатель, add_listener -
+	получателя каждого наблюдения (name, value), например для отправки во
+	внешнюю систему мониторинга. Методы можно вызывать из нескольких потоков.
+	"""
+
+	def __init__(self) -> None:
+		self._lock = threading.Lock()
+		self.enabled = True
+		self._timings: dict[str, Histogram] = {}
+		self._counters: dict[str, int] = {}
+		self._gauges: dict[str, Callable[[], Any]] = {}
+		self._listeners: list[Callable[[str, float], None]] = []
+
+	def observe(self, name: str, seconds: float) -> None:
+		"""Добавляет длительность в гистограмму name."""
+		if not self.enabled:
+			return
+		with self._lock:
+			histogram = self._timings.get(name)
+			if histogram is None:
+				histogram = self._timings[name] = Histogram()
+			histogram.observe(seconds)
+		for listener in self._listeners:
+			listener(name, seconds)
+
+	def count(self, name: str, value: int = 1) -> None:
+		"""Увеличивает счётчик name на value."""
+		if not self.enabled or not value:
+			return
+		with self._lock:
+			self._counters[name] = self._counters.get(name, 0) + value
+		for listener in self._listeners:
+			listener(name, value)
+
+	@contextmanager
+	def phase(self, name: str) -> Iterator[None]:
+		"""Замеряет длительность блока и добавляет её в гистограмму name."""
+		start = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.observe(name, time.perf_counter() - start)
+
+	def register_gauge(self, name: str, read: Callable[[], Any]) -> None:
+		"""
+		Регистрирует показатель, значение которого вычисляется при запросе метрик.
+
+		:param name: (str) имя показателя
+		:param read: (Callable[[], Any]) возвращает текущее значение
+		"""
+		self._gauges[name] = read
+
+	def add_listener(self, listener: Callable[[str, float], None]) -> None:
+		"""
+		Добавляет получателя наблюдений: он вызывается с (имя, значение) для
+		каждой длительности и каждого увеличения счётчика.
+		"""
+		self._listeners.append(listener)
+
+	def snapshot(self) -> dict[str, Any]:
+		"""
+		Возвращает текущие значения всех метрик.
+
+		:return: (dict[str, Any]) {"timings": {имя: {count, mean, p50, ...}},
+			"counters": {имя: значение}, "gauges": {имя: значение}}
+		"""
+		with self._lock:
+			timings = {name: histogram.snapshot()
+				for name, histogram in sorted(self._timings.items())}
+			counters = dict(sorted(self._counters.items()))
+		return {
+			"timings": timings,
+			"counters": counters,
+			"gauges": {name: read() for name, read in self._gauges.items()},
+		}
+
+	def dump(self, filepath: str) -> None:
+		"""Записывает снимок метрик в JSON-файл."""
+		with open(filepath, "w", encoding="utf-8") as f:
+			json.dump(self.snapshot(), f, indent=4, ensure_ascii=False)
+
+	def reset(self) -> None:
+		"""Обнуляет гистограммы и счётчики."""
+		with self._lock:
+			self._timings.clear()
+			self._counters.clear()
+
+
+class TimedIterator:
+	"""
+	Обёртка над итератором, суммирующая время, проведённое в его next(): так
+	время поиска записей отделяется от времени их вывода, когда записи
+	выводятся по мере нахождения.
+	"""
+
+	def __init__(self, iterable: Iterable) -> None:
+		self._iterator = iter(iterable)
+		self.elapsed = 0.0
+		self.items = 0
+
+	def __iter__(self) -> "TimedIterator":
+		return self
+
+	def __next__(self) -> Any:
+		start = time.perf_counter()
+		try:
+			item = next(self._iterator)
+		finally:
+			self.elapsed += time.perf_counter() - start
+		self.items += 1
+		return item
+
+
+# Метрики процесса, которые пишут все модули
+metrics = Metrics()
@@ -0,0 +1,193 @@
+import os
+import threading
+from bisect import bisect_left
+from collections.abc import Callable, Iterator, Mapping
+from typing import Any
+
+from src.primitive_db.constants import PARALLEL_SCAN_THRESHOLD, PARALLEL_SCAN_WORKERS
+from src.primitive_db.lazy import LazyTable, snapshot_key
+from src.primitive_db.metrics import metrics
+
+# На сколько частей на процесс делится таблица: первые совпадения выдаются
+# раньше, чем досмотрена вся таблица
+_CHUNKS_PER_WORKER = 4
+
+# Пул процессов просмотра: создаётся при первом параллельном просмотре и
+# живёт до выхода из программы; False - пул не запустился, просмотр только
+# последовательный
+_pool = None
+_pool_lock = threading.Lock()
+
+# Снимок, открытый в процессе пула: (отпечаток, таблица)
+_snapshot: tuple[tuple, LazyTable] | None = None
+
+
+def _scan_workers() -> int:
+	"""Число процессов для параллельного просмотра, 1 - только последовательно."""
+	return PARALLEL_SCAN_WORKERS or os.cpu_count() or 1
+
+
+def use_parallel_scan(table_data: Mapping[int, dict]) -> bool:
+	"""
+	Решает, просматривать ли таблицу параллельно: только большие колоночные
+	таблицы со снимком на диске и только если есть несколько ядер. Записи
+	остальных таблиц пришлось бы передавать процессам целиком, что дольше
+	самого просмотра.
+
+	:param table_data: (Mapping[int, dict]) записи таблицы по ID
+	:return: (bool) True - просматривать в пуле процессов
+	"""
+	return (_pool is not False and isinstance(table_data, LazyTable)
+		and table_data.snapshot_key is not None
+		and table_data.snapshot_size >= PARALLEL_SCAN_THRESHOLD
+		and _scan_workers() > 1)
+
+
+def _scan_pool(workers: int):
+	"""
+	Возвращает пул процессов просмотра, создавая его при первом вызове.
+
+	Процессы запускаются через forkserver (или spawn, где его нет), а не fork:
+	копировать через fork процесс с потоками (писатель Database, сервер,
+	vacuum) небезопасно. Поэтому процессы ничего не наследуют, а открывают
+	снимок таблицы сами. Как и при любом запуске через spawn, процессы
+	импортируют главный модуль программы, поэтому в скриптах код, работающий с
+	базой, должен быть под if __name__ == "__main__".
+
+	:param workers: (int) число процессов
+	:return: (ProcessPoolExecutor | bool) пул или False, если он сломан
+	"""
+	global _pool
+	with _pool_lock:
+		if _pool is None:
+			# multiprocessing и concurrent.futures нужны только большим таблицам,
+			# а их импорт заметно замедляет запуск
+			import multiprocessing
+			from concurrent.futures import ProcessPoolExecutor
+
+			method = ("forkserver"
+				if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+			_pool = ProcessPoolExecutor(workers,
+				mp_context=multiprocessing.get_context(method))
+		return _pool
+
+
+def _scan_range(key: tuple, tree: tuple, start: int, stop: int) -> list[int] | None:
+	"""
+	Проверяет записи снимка с позициями [start, stop) и возвращает позиции
+	подходящих (выполняется в процессе пула). Снимок открывается один раз и
+	используется следующими частями; если файл по пути уже другой (таблицу
+	свернули), возвращает None.
+	"""
+	global _snapshot
+	# импорт здесь: where импортирует этот модуль
+	from src.primitive_db.where import Condition
+
+	if _snapshot is None or _snapshot[0] != key:
+		path = key[0]
+		try:
+			if snapshot_key(path, os.stat(path)) != key:
+				return None
+		except FileNotFoundError:
+			return None
+		_snapshot = (key, LazyTable(path, []))
+	table = _snapshot[1]
+	matches = Condition(tree).matches
+	return [pos for pos in range(start, stop) if matches(table.row_at(pos))]
+
+
+def _disable_pool() -> None:
+	"""
+	Останавливает сломанный пул: процесс пула завершился аварийно (например,
+	главный модуль скрипта не защищён от повторного импорта). Дальше таблицы
+	просматриваются последовательно.
+	"""
+	global _pool
+	with _pool_lock:
+		if _pool:
+			_pool.shutdown(wait=False, cancel_futures=True)
+		_pool = False
+
+
+def _submit(workers: int, *args: Any):
+	"""Отдаёт часть просмотра пулу; None - часть нужно просмотреть здесь."""
+	from concurrent.futures.process import BrokenProcessPool
+
+	pool = _scan_pool(workers)
+	if not pool:
+		return None
+	try:
+		return pool.submit(_scan_range, *args)
+	except BrokenProcessPool:
+		_disable_pool()
+		return None
+
+
+def _result(future) -> list[int] | None:
+	"""Позиции, найденные процессом пула; None - часть нужно просмотреть здесь."""
+	from concurrent.futures.process import BrokenProcessPool
+
+	if future is None:
+		return None
+	try:
+		return future.result()
+	except BrokenProcessPool:
+		_disable_pool()
+		return None
+
+
+def parallel_scan(table_data: LazyTable, tree: tuple,
+                  matches: Callable[[Mapping], bool],
+                  workers: int | None = None) -> Iterator[dict]:
+	"""
+	Перебирает записи, удовлетворяющие условию, просматривая снимок таблицы
+	частями в пуле процессов. Процессы получают только отпечаток снимка и
+	дерево условия, открывают снимок через mmap и возвращают позиции
+	подходящих записей. Записи, изменённые или удалённые журналом, и
+	добавленные после снимка проверяются здесь же. Части объединяются по
+	порядку, поэтому записи выдаются в том же порядке, что и при
+	последовательном просмотре.
+
+	:param table_data: (LazyTable) колоночная таблица со снимком на диске
+	:param tree: (tuple) дерево условия (Condition.tree)
+	:param matches: (Callable[[Mapping], bool]) скомпилированное условие
+	:param workers: (int | None) число процессов, None - см. PARALLEL_SCAN_WORKERS
+	:return: (Iterator[dict]) подходящие записи
+	"""
+	size = table_data.snapshot_size
+	key = table_data.snapshot_key
+	updated = table_data.updated_positions()
+	tail = table_data.inserted_rows()
+
+	workers = workers or _scan_workers()
+	chunk = max(1, -(-size // (workers * _CHUNKS_PER_WORKER)))
+	parts = [(start, min(start + chunk, size)) for start in range(0, size, chunk)]
+	futures = [_submit(workers, key, tree, start, stop) for start, stop in parts]
+	scanned = 0
+	try:
+		for (start, stop), future in zip(parts, futures):
+			found = _result(future)
+			scanned = stop
+			if found is None:
+				# снимок на диске заменён или пул сломан - часть просматривается здесь
+				rows = (table_data.snapshot_row(pos) for pos in range(start, stop))
+				yield from (row for row in rows if row is not None and matches(row))
+				continue
+			# изменённые журналом записи процесс проверял в старом виде
+			low, high = bisect_left(updated, start), bisect_left(updated, stop)
+			recheck = set(updated[low:high])
+			for pos in sorted(recheck.union(found)):
+				row = table_data.snapshot_row(pos)
+				if row is not None and (pos not in recheck or matches(row)):
+					yield row
+		for row in tail:
+			scanned += 1
+			if matches(row):
+				yield row
+	finally:
+		# при LIMIT перебор может закончиться раньше - оставшиеся части не нужны,
+		# а в метрики идут части, которые успели просмотреть
+		for future in futures:
+			if future is not None:
+				future.cancel()
+		metrics.count("rows_scanned", scanned)
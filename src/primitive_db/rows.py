@@ -0,0 +1,194 @@
+import gc
+from collections import namedtuple
+from collections.abc import Callable, Iterable, Iterator, Mapping
+from contextlib import contextmanager
+from functools import lru_cache
+from operator import attrgetter, itemgetter
+from typing import Any
+
+# Префикс атрибутов класса записи, читающих значения столбцов (см. column_getter)
+_ATTRIBUTE_PREFIX = "@"
+
+
+class Row(tuple):
+	"""
+	Запись таблицы в памяти: кортеж значений по порядку столбцов схемы.
+
+	Имена столбцов и их позиции хранятся один раз в классе записи (см.
+	row_type), а не в каждой записи, как у словаря, поэтому запись занимает в
+	несколько раз меньше памяти. Для чтения запись ведёт себя как словарь:
+	row["ID"], get, keys, values, items, `in`, dict(row) и {**row}. Запись
+	неизменяема: replace возвращает новую запись (см. update_rows в core).
+
+	Перебор записи, как у кортежа, даёт значения. В JSON запись пишется через
+	as_dict. В циклах по многим записям значения лучше читать через
+	column_getter: row[столбец] вызывает метод на Python.
+	"""
+
+	__slots__ = ()
+	columns: tuple[str, ...] = ()
+	positions: dict[str, int] = {}
+
+	def __getitem__(self, column: str) -> Any:
+		try:
+			return tuple.__getitem__(self, self.positions[column])
+		except (KeyError, TypeError):
+			raise KeyError(column) from None
+
+	def get(self, column: str, default: Any = None) -> Any:
+		pos = self.positions.get(column)
+		return default if pos is None else tuple.__getitem__(self, pos)
+
+	def __contains__(self, column: object) -> bool:
+		return column in self.positions
+
+	def keys(self) -> tuple[str, ...]:
+		return self.columns
+
+	def values(self) -> tuple:
+		return tuple(self)
+
+	def items(self) -> Iterator[tuple[str, Any]]:
+		return zip(self.columns, self)
+
+	def as_dict(self) -> dict[str, Any]:
+		"""Запись в виде словаря {столбец: значение}."""
+		return dict(zip(self.columns, self))
+
+	def replace(self, changes: Mapping[str, Any]) -> "Row":
+		"""
+		Возвращает копию записи с изменёнными значениями столбцов.
+
+		:param changes: (Mapping[str, Any]) {столбец: новое значение}
+		:return: (Row) новая запись
+		:raises KeyError: если столбца нет в записи
+		"""
+		values = list(self)
+		for column, value in changes.items():
+			values[self.positions[column]] = value
+		return type(self)(values)
+
+	def __repr__(self) -> str:
+		return repr(self.as_dict())
+
+	def __reduce__(self) -> tuple:
+		# класс записи создаётся динамически, поэтому передаются столбцы
+		return _restore_row, (self.columns, tuple(self))
+
+
+@lru_cache(maxsize=None)
+def row_type(columns: tuple[str, ...]) -> type[Row]:
+	"""
+	Возвращает класс записей со столбцами columns. Класс создаётся один раз на
+	набор столбцов и общий для всех таблиц с такой схемой.
+
+	:param columns: (tuple[str, ...]) столбцы по порядку, первым - ID
+	:return: (type[Row]) класс записи
+	"""
+	# у namedtuple каждое поле читается дескриптором на C по позиции в кортеже;
+	# те же дескрипторы становятся атрибутами столбцов класса записи
+	fields = namedtuple("Fields", ["_"] * len(columns), rename=True)
+	namespace = {
+		"__slots__": (),
+		"columns": columns,
+		"positions": {column: pos for pos, column in enumerate(columns)},
+	}
+	for pos, column in enumerate(columns):
+		namespace[_ATTRIBUTE_PREFIX + column] = getattr(fields, f"_{pos}")
+	return type("Row", (Row,), namespace)
+
+
+def column_getter(column: str) -> Callable[[Row], Any]:
+	"""
+	Функция, читающая значение столбца из записи Row любого класса, где он есть.
+	Работает без вызова методов на Python, поэтому в несколько раз быстрее
+	row[column] - для фильтров и агрегатов по многим записям.
+
+	:param column: (str) имя столбца
+	:return: (Callable[[Row], Any]) функция row -> значение
+	"""
+	if "." in column:
+		# attrgetter понимает точку как переход к вложенному атрибуту
+		return itemgetter(column)
+	return attrgetter(_ATTRIBUTE_PREFIX + column)
+
+
+def _restore_row(columns: tuple[str, ...], values: tuple) -> Row:
+	return row_type(columns)(values)
+
+
+@contextmanager
+def bulk_rows() -> Iterator[None]:
+	"""
+	Приостанавливает сборщик циклического мусора на время создания множества
+	записей. Словари и кортежи только из чисел и строк сборщик перестаёт
+	отслеживать, а записи Row (подкласс кортежа) - нет, поэтому при загрузке
+	большой таблицы он раз за разом обходил бы уже созданные записи. Циклов
+	записи не образуют, так что пауза ничего не задерживает.
+	"""
+	enabled = gc.isenabled()
+	gc.disable()
+	try:
+		yield
+	finally:
+		if enabled:
+			gc.enable()
+
+
+def as_row(row: Mapping[str, Any]) -> Row:
+	"""
+	Превращает запись-словарь (например, из журнала или JSON-снимка) в Row.
+
+	:param row: (Mapping[str, Any]) запись
+	:return: (Row) запись с теми же столбцами в том же порядке
+	"""
+	if isinstance(row, Row):
+		return row
+	return row_type(tuple(row))(row.values())
+
+
+def as_rows(rows: Iterable[Mapping[str, Any]],
+            columns: Iterable[str] | None = None) -> list[Row]:
+	"""
+	Превращает записи-словари в Row одного класса.
+
+	:param rows: (Iterable[Mapping[str, Any]]) записи
+	:param columns: (Iterable[str] | None) столбцы схемы; None - по первой записи
+	:return: (list[Row]) записи
+	"""
+	rows = list(rows)
+	if not rows:
+		return []
+	columns = tuple(columns if columns is not None else rows[0])
+	values = map(itemgetter(*columns), rows)
+	if len(columns) == 1:
+		# itemgetter одного столбца возвращает значение, а не кортеж
+		values = zip(values)
+	with bulk_rows():
+		return list(map(row_type(columns), values))
+
+
+def column_values(rows: list[Row], columns: Iterable[str]) -> list[list]:
+	"""
+	Раскладывает записи по столбцам (см. column_getter).
+
+	:param rows: (list[Row]) записи
+	:param columns: (Iterable[str]) столбцы по порядку
+	:return: (list[list]) значения каждого столбца по порядку записей
+	"""
+	return [list(map(column_getter(column), rows)) for column in columns]
+
+
+def as_dicts(rows: Iterable[Mapping[str, Any]]) -> list[dict[str, Any]]:
+	"""Записи в виде словарей (например, для записи в JSON)."""
+	return [dict(zip(row.columns, row)) if isinstance(row, Row) else row
+		for row in rows]
+
+
+# ID записи (первичный ключ)
+id_of = column_getter("ID")
+
+
+def by_id(rows: Iterable[Row]) -> dict[int, Row]:
+	"""Словарь записей по ID в порядке rows."""
+	return {id_of(row): row for row in rows}
@@ -0,0 +1,255 @@
+from collections.abc import Callable, Iterable, Mapping, Sequence
+from functools import lru_cache
+from typing import Any
+
+from src.primitive_db.constants import STORAGE_FORMATS, VALID_TYPES
+from src.primitive_db.errors import (
+	ColumnNotFoundError,
+	TableNotFoundError,
+	ValidationError,
+)
+from src.primitive_db.utils import convert_value
+
+
+def build_schema(columns: list[str]) -> dict[str, str]:
+	"""
+	Строит схему таблицы из описаний столбцов вида <имя>:<тип>. Столбец ID: int
+	добавляется в начало автоматически.
+
+	:param columns: (list[str]) описания столбцов
+	:return: (dict[str, str]) схема {столбец: тип}
+	:raises ValidationError: если описание или тип столбца некорректны
+	"""
+	schema = {"ID": "int"}
+	for col in columns:
+		if ":" not in col:
+			raise ValidationError(f"Некорректное значение: {col}. Попробуйте снова.")
+		name, type_ = col.split(":", 1)
+		if type_ not in VALID_TYPES:
+			raise ValidationError(f"Некорректный тип: {type_}. Поддерживаются только "
+				f"{', '.join(VALID_TYPES)}.")
+		schema[name] = type_
+	return schema
+
+def table_schema(metadata: Mapping[str, dict], table_name: str) -> dict[str, str]:
+	"""
+	Схема таблицы из метаданных.
+
+	:param metadata: (Mapping[str, dict]) метаданные
+	:param table_name: (str) имя таблицы
+	:return: (dict[str, str]) схема {столбец: тип}, включая ID
+	:raises TableNotFoundError: если таблицы нет
+	"""
+	entry = metadata.get(table_name)
+	if entry is None:
+		raise TableNotFoundError(f'Таблица "{table_name}" не существует.')
+	return entry["columns"]
+
+def check_columns(schema: Mapping[str, str], columns: Iterable[str]) -> None:
+	"""
+	Проверяет, что столбцы есть в схеме таблицы.
+
+	:param schema: (Mapping[str, str]) схема {столбец: тип}
+	:param columns: (Iterable[str]) имена столбцов
+	:raises ColumnNotFoundError: если какого-то столбца нет
+	"""
+	for col in columns:
+		if col not in schema:
+			raise ColumnNotFoundError(f"столбца '{col}' не существует")
+
+def check_storage(storage: str) -> None:
+	"""
+	Проверяет формат хранения таблицы.
+
+	:param storage: (str) формат хранения
+	:raises ValidationError: если формат не поддерживается
+	"""
+	if storage not in STORAGE_FORMATS:
+		raise ValidationError(f"Некорректный формат хранения: {storage}. "
+			f"Поддерживаются только {', '.join(sorted(STORAGE_FORMATS))}.")
+
+def convert_record(schema: dict[str, str],
+                   values: Sequence[Any] | Mapping[str, Any]) -> dict[str, Any]:
+	"""
+	Приводит значения новой записи к типам столбцов (кроме ID).
+
+	:param schema: (dict[str, str]) схема таблицы {столбец: тип}
+	:param values: значения по порядку столбцов или словарь {столбец: значение}
+	:return: (dict[str, Any]) запись без ID
+	:raises ColumnNotFoundError: если в словаре есть неизвестный столбец
+	:raises ValidationError: если значений не хватает или значение не подходит
+	"""
+	columns = list(schema)[1:]  # пропускаем ID
+	if isinstance(values, Mapping):
+		for col in values:
+			if col not in columns:
+				raise ColumnNotFoundError(f"столбца '{col}' не существует")
+		missing = [col for col in columns if col not in values]
+		if missing:
+			raise ValidationError(f"нет значений для столбцов {', '.join(missing)}.")
+		values = [values[col] for col in columns]
+	elif len(values) != len(columns):
+		raise ValidationError("количество значений не совпадает с количеством "
+																"столбцов.")
+
+	record = {}
+	for col, val in zip(columns, values):
+		try:
+			record[col] = convert_value(val, schema[col])
+		except (TypeError, ValueError):
+			raise ValidationError(f"некорректное значение {val} для "
+																f"{col}:{schema[col]}.")
+	return record
+
+def _int_column(values: list) -> list[int]:
+	if bool in map(type, values):
+		raise ValueError("bool вместо int")
+	return list(map(int, values))
+
+def _bool_column(values: list) -> list[bool]:
+	return [val if val.__class__ is bool else str(val).lower() == "true"
+		for val in values]
+
+def _str_column(values: list) -> list[str]:
+	return [str(val).strip('"').strip("'") for val in values]
+
+# Приведение столбца целиком, по тем же правилам, что и convert_value
+_COLUMN_CONVERTERS: dict[str, Callable[[list], list]] = {
+	"int": _int_column,
+	"bool": _bool_column,
+	"str": _str_column,
+}
+
+
+class RecordConverter:
+	"""
+	Приводит пачки новых записей к схеме таблицы. Записи сначала проверяются
+	по составу столбцов, затем значения приводятся к типам по столбцам - одним
+	проходом на столбец. Если столбец целиком не приводится, его значения
+	проверяются по одному, чтобы найти все неподходящие записи.
+	"""
+
+	def __init__(self, schema: dict[str, str]) -> None:
+		self.schema = schema
+		self.columns = list(schema)[1:]  # пропускаем ID
+		self._converters = [_COLUMN_CONVERTERS[schema[col]] for col in self.columns]
+
+	def _values(self, values: Sequence[Any] | Mapping[str, Any]) -> Sequence[Any]:
+		if isinstance(values, Mapping):
+			for col in values:
+				if col not in self.schema or col == "ID":
+					raise ColumnNotFoundError(f"столбца '{col}' не существует")
+			missing = [col for col in self.columns if col not in values]
+			if missing:
+				raise ValidationError(f"нет значений для столбцов "
+					f"{', '.join(missing)}.")
+			return [values[col] for col in self.columns]
+		if len(values) != len(self.columns):
+			raise ValidationError("количество значений не совпадает с количеством "
+				"столбцов.")
+		return list(values)
+
+	def _check_shapes(self, rows: list, errors: dict[int, str]
+			) -> tuple[list[Sequence[Any]], list[int]]:
+		"""Проверяет состав записей, неподходящие записи попадают в errors."""
+		valid, positions = [], []
+		for pos, values in enumerate(rows):
+			try:
+				valid.append(self._values(values))
+			except (ColumnNotFoundError, ValidationError) as e:
+				errors[pos] = str(e)
+				continue
+			except TypeError:
+				errors[pos] = "запись должна быть списком значений или словарём."
+				continue
+			positions.append(pos)
+		return valid, positions
+
+	def convert(self, rows: Iterable[Sequence[Any] | Mapping[str, Any]]
+			) -> tuple[list[dict | None], list[tuple[int, str]]]:
+		"""
+		Приводит записи к типам столбцов, не останавливаясь на первой ошибке.
+
+		:param rows: записи: значения по порядку столбцов или словари
+		:return: (tuple) записи без ID по порядку (None на месте неподходящих) и
+			ошибки [(номер записи с 0, сообщение)] по возрастанию номеров
+		"""
+		errors: dict[int, str] = {}
+		rows = rows if isinstance(rows, list) else list(rows)
+		total = len(rows)
+		width = len(self.columns)
+		if all(values.__class__ in (tuple, list) and len(values) == width
+				for values in rows):
+			valid, positions = rows, range(total)  # частый случай: все записи - списки
+		else:
+			valid, positions = self._check_shapes(rows, errors)
+
+		converted = []
+		columns = zip(*valid) if valid else [()] * len(self.columns)
+		for col, convert, column in zip(self.columns, self._converters, columns):
+			try:
+				converted.append(convert(column))
+				continue
+			except (TypeError, ValueError):
+				pass
+			# ищем неподходящие значения по одному
+			type_ = self.schema[col]
+			result = []
+			for pos, val in zip(positions, column):
+				try:
+					result.append(convert_value(val, type_))
+				except (TypeError, ValueError):
+					result.append(None)
+					errors.setdefault(pos,
+						f"некорректное значение {val} для {col}:{type_}.")
+			converted.append(result)
+
+		cols = self.columns
+		values = zip(*converted) if converted else [()] * len(positions)
+		if not errors:
+			return [dict(zip(cols, row)) for row in values], []
+		records: list[dict | None] = [None] * total
+		for pos, row in zip(positions, values):
+			if pos not in errors:
+				records[pos] = dict(zip(cols, row))
+		return records, sorted(errors.items())
+
+
+@lru_cache(maxsize=64)
+def _cached_converter(schema: tuple[tuple[str, str], ...]) -> RecordConverter:
+	return RecordConverter(dict(schema))
+
+def record_converter(schema: dict[str, str]) -> RecordConverter:
+	"""
+	Возвращает преобразователь записей для схемы. Он строится один раз на схему
+	и переиспользуется, пока схема таблицы не изменится.
+
+	:param schema: (dict[str, str]) схема таблицы {столбец: тип}
+	:return: (RecordConverter) преобразователь записей
+	"""
+	return _cached_converter(tuple(schema.items()))
+
+def convert_changes(schema: dict[str, str],
+                    changes: Mapping[str, Any]) -> dict[str, Any]:
+	"""
+	Приводит значения SET к типам столбцов.
+
+	:param schema: (dict[str, str]) схема таблицы {столбец: тип}
+	:param changes: (Mapping[str, Any]) изменения {столбец: значение}
+	:return: (dict[str, Any]) изменения нужных типов
+	:raises ColumnNotFoundError: если столбца нет
+	:raises ValidationError: при попытке изменить ID или неподходящем значении
+	"""
+	converted = {}
+	for col, val in changes.items():
+		if col not in schema:
+			raise ColumnNotFoundError(f"столбца '{col}' не существует")
+		if col == "ID":
+			raise ValidationError("столбец ID является первичным ключом и "
+																"не изменяется.")
+		try:
+			converted[col] = convert_value(val, schema[col])
+		except (TypeError, ValueError):
+			raise ValidationError(f"некорректное значение {val} для "
+																f"{col}:{schema[col]}.")
+	return converted
@@ -0,0 +1,371 @@
+import json
+import zlib
+from collections import defaultdict
+from collections.abc import Iterable, Iterator, MutableMapping, ValuesView
+from pathlib import Path
+
+from src.primitive_db.columnar import encode_columnar, read_columnar
+from src.primitive_db.constants import SEGMENT_ROWS
+from src.primitive_db.files import atomic_write
+from src.primitive_db.metrics import metrics
+from src.primitive_db.rows import as_row, by_id, column_values, id_of
+
+# Секционированная таблица - каталог data/<таблица>.seg: сегменты в колоночном
+# формате, каждый хранит записи с ID из (k * size, (k + 1) * size], и манифест
+# manifest.json со статистикой сегментов:
+# {"segment_size": size, "segments": {"k": {"file", "rows", "min_id", "max_id",
+#                                           "zones": {столбец: [min, max]},
+#                                           "checksum"}}}
+# Файл сегмента получает новое имя при каждой перезаписи, поэтому манифест
+# всегда ссылается на целые файлы, а его замена атомарно публикует изменения.
+
+
+def read_manifest(manifest_path: Path) -> dict:
+	"""
+	Читает манифест секционированной таблицы.
+
+	:param manifest_path: (Path) путь до manifest.json
+	:return: (dict) манифест; для новой таблицы - пустой, с размером сегмента
+		SEGMENT_ROWS
+	:raises ValueError: если манифест повреждён
+	"""
+	try:
+		with open(manifest_path, encoding="utf-8") as f:
+			return json.load(f)
+	except FileNotFoundError:
+		return {"segment_size": SEGMENT_ROWS, "segments": {}}
+
+
+def segment_of(row_id: int, segment_size: int) -> int:
+	"""Номер сегмента, в котором хранится запись с ID row_id."""
+	return (row_id - 1) // segment_size
+
+
+def touched_segments(entries: Iterable[dict], segment_size: int) -> set[int]:
+	"""
+	Номера сегментов, которые затрагивают операции журнала.
+
+	:param entries: (Iterable[dict]) операции журнала таблицы
+	:param segment_size: (int) размер сегмента в ID
+	:return: (set[int]) номера сегментов
+	"""
+	touched = set()
+	for entry in entries:
+		match entry["op"]:
+			case "insert":
+				touched.add(segment_of(entry["row"]["ID"], segment_size))
+			case "update":
+				touched.add(segment_of(entry["id"], segment_size))
+			case "delete":
+				touched.update(segment_of(row_id, segment_size)
+					for row_id in entry["ids"])
+	return touched
+
+
+def _zone_map(columns: dict[str, str], rows: list[dict]) -> dict[str, list]:
+	"""Минимум и максимум каждого столбца сегмента."""
+	return {name: [min(values), max(values)]
+		for name, values in zip(columns, column_values(rows, columns))}
+
+
+def read_segments(manifest_path: Path,
+                  segments: Iterable[int] | None = None) -> list[dict]:
+	"""
+	Читает записи сегментов таблицы по порядку номеров.
+
+	:param manifest_path: (Path) путь до manifest.json
+	:param segments: (Iterable[int] | None) номера сегментов, None - все
+	:return: (list[dict]) записи
+	:raises ValueError: если манифест или сегмент повреждён
+	"""
+	manifest = read_manifest(manifest_path)
+	stats = {int(number): entry for number, entry in manifest["segments"].items()}
+	wanted = sorted(stats if segments is None else set(segments) & set(stats))
+	rows = []
+	for number in wanted:
+		path = manifest_path.parent / stats[number]["file"]
+		rows.extend(read_columnar(path))
+		metrics.count("bytes_read", path.stat().st_size)
+	return rows
+
+
+def write_segments(manifest_path: Path, columns: dict[str, str], rows: list[dict],
+                   segments: Iterable[int] | None = None) -> int:
+	"""
+	Записывает сегменты таблицы и обновляет манифест. Сегмент, содержимое
+	которого не изменилось (совпала контрольная сумма), не перезаписывается,
+	опустевший сегмент удаляется.
+
+	Вызывается под эксклюзивной блокировкой таблицы.
+
+	:param manifest_path: (Path) путь до manifest.json
+	:param columns: (dict[str, str]) схема таблицы {столбец: тип}
+	:param rows: (list[dict]) записи перезаписываемых сегментов
+	:param segments: (Iterable[int] | None) перезаписываемые сегменты; None -
+		таблица целиком (rows - все её записи)
+	:return: (int) число записанных байт
+	"""
+	manifest, written = stage_segments(manifest_path, columns, rows, segments)
+	publish_manifest(manifest_path, manifest)
+	return written
+
+
+def stage_segments(manifest_path: Path, columns: dict[str, str], rows: list[dict],
+                   segments: Iterable[int] | None = None) -> tuple[dict, int]:
+	"""
+	Записывает файлы сегментов (как write_segments), но не манифест: пока
+	манифест, который на них ссылается, не опубликован (publish_manifest),
+	таблица читается по-прежнему. Поэтому новые сегменты можно готовить под
+	разделяемой блокировкой таблицы.
+
+	:return: (tuple[dict, int]) новый манифест и число записанных байт
+	"""
+	directory = manifest_path.parent
+	directory.mkdir(parents=True, exist_ok=True)
+	manifest = read_manifest(manifest_path)
+	size = manifest["segment_size"]
+	stats = manifest["segments"]
+
+	groups = defaultdict(list)
+	for row in rows:
+		groups[segment_of(id_of(row), size)].append(row)
+	targets = set(groups) | {int(number) for number in stats}
+	if segments is not None:
+		targets = set(segments)
+
+	written = 0
+	for number in sorted(targets):
+		segment_rows = sorted(groups.get(number, ()), key=id_of)
+		if not segment_rows:
+			stats.pop(str(number), None)
+			continue
+		data = encode_columnar(columns, segment_rows)
+		checksum = zlib.crc32(data)
+		old = stats.get(str(number))
+		if old is not None and old["checksum"] == checksum:
+			continue
+		filename = f"{number:06d}-{checksum:08x}.col"
+		with atomic_write(directory / filename, "wb") as f:
+			f.write(data)
+		written += len(data)
+		stats[str(number)] = {
+			"file": filename,
+			"rows": len(segment_rows),
+			"min_id": segment_rows[0]["ID"],
+			"max_id": segment_rows[-1]["ID"],
+			"zones": _zone_map(columns, segment_rows),
+			"checksum": checksum,
+		}
+
+	manifest["segments"] = dict(sorted(stats.items(), key=lambda item: int(item[0])))
+	return manifest, written
+
+
+def publish_manifest(manifest_path: Path, manifest: dict) -> int:
+	"""
+	Атомарно заменяет манифест таблицы и удаляет файлы сегментов, на которые он
+	больше не ссылается. Вызывается под эксклюзивной блокировкой таблицы.
+
+	:param manifest_path: (Path) путь до manifest.json
+	:param manifest: (dict) новый манифест
+	:return: (int) размер удалённых файлов в байтах
+	"""
+	with atomic_write(manifest_path) as f:
+		json.dump(manifest, f, indent=4, ensure_ascii=False)
+	return remove_stale_segments(manifest_path.parent, manifest)
+
+
+def remove_stale_segments(directory: Path, manifest: dict) -> int:
+	"""
+	Удаляет файлы сегментов, на которые манифест не ссылается (остались от
+	прежних версий сегментов или от прерванной записи).
+
+	:param directory: (Path) каталог таблицы
+	:param manifest: (dict) текущий манифест
+	:return: (int) размер удалённых файлов в байтах
+	"""
+	current = {entry["file"] for entry in manifest["segments"].values()}
+	removed = 0
+	for path in directory.glob("*.col"):
+		if path.name not in current:
+			removed += path.stat().st_size
+			path.unlink(missing_ok=True)
+	return removed
+
+
+def may_match(zones: dict[str, list], tree: tuple) -> bool:
+	"""
+	Проверяет по минимумам и максимумам столбцов сегмента, могут ли в нём быть
+	записи, удовлетворяющие условию (дерево Condition из where).
+
+	:param zones: (dict[str, list]) {столбец: [min, max]} сегмента
+	:param tree: (tuple) дерево условия
+	:return: (bool) False - сегмент можно не просматривать
+	"""
+	kind = tree[0]
+	if kind == "and":
+		return all(may_match(zones, node) for node in tree[1:])
+	if kind == "or":
+		return any(may_match(zones, node) for node in tree[1:])
+
+	zone = zones.get(tree[1])
+	if zone is None:
+		return True
+	low, high = zone
+	if kind == "in":
+		return any(low <= value <= high for value in tree[2])
+	if kind == "between":
+		return tree[2] <= high and low <= tree[3]
+	op, value = tree[2], tree[3]
+	match op:
+		case "=":
+			return low <= value <= high
+		case "!=":
+			return not low == high == value
+		case "<":
+			return low < value
+		case "<=":
+			return low <= value
+		case ">":
+			return high > value
+		case _:
+			return high >= value
+
+
+class _SegmentValues(ValuesView):
+	"""Представление значений, перебирающее записи по сегментам."""
+
+	def __iter__(self) -> Iterator[dict]:
+		return self._mapping.iter_rows()
+
+
+class SegmentedTable(MutableMapping):
+	"""
+	Секционированная таблица, открытая без загрузки в память.
+
+	Ведёт себя как словарь записей по ID (как таблица в TableStore), но читает
+	сегмент с диска только при первом обращении к его записям. Сегмент записи
+	определяется по её ID, поэтому поиск по ID читает не больше одного сегмента,
+	а scan пропускает сегменты, которые по статистике манифеста не могут
+	содержать подходящих записей. Операции журнала применяются к сегментам,
+	которые они затрагивают; статистика таких сегментов больше не используется.
+	"""
+
+	def __init__(self, manifest_path: Path, log_entries: list[dict]) -> None:
+		self._manifest_path = manifest_path
+		self._dir = manifest_path.parent
+		manifest = read_manifest(manifest_path)
+		self._size = manifest["segment_size"]
+		self._stats = {int(number): entry
+			for number, entry in manifest["segments"].items()}
+		self._loaded: dict[int, dict[int, dict]] = {}
+		# сегменты, изменённые после записи манифеста
+		self._changed: set[int] = set()
+		self._count = sum(entry["rows"] for entry in self._stats.values())
+		for entry in log_entries:
+			self._apply(entry)
+
+	def _apply(self, entry: dict) -> None:
+		"""Применяет операцию журнала к затронутому сегменту."""
+		match entry["op"]:
+			case "insert":
+				self[entry["row"]["ID"]] = as_row(entry["row"])
+			case "update":
+				row = self.get(entry["id"])
+				if row is not None:
+					self[entry["id"]] = row.replace(entry["set"])
+			case "delete":
+				for row_id in entry["ids"]:
+					self.pop(row_id, None)
+
+	def _segment(self, number: int, create: bool = False) -> dict[int, dict] | None:
+		"""Записи сегмента по ID, сегмент читается с диска при первом обращении."""
+		rows = self._loaded.get(number)
+		if rows is not None:
+			return rows
+		entry = self._stats.get(number)
+		if entry is None:
+			if not create:
+				return None
+			rows = {}
+		else:
+			path = self._dir / entry["file"]
+			rows = by_id(read_columnar(path))
+			metrics.count("bytes_read", path.stat().st_size)
+		self._loaded[number] = rows
+		return rows
+
+	def save(self, columns: dict[str, str]) -> None:
+		"""
+		Записывает сегменты, изменённые после открытия таблицы (вызывается под
+		эксклюзивной блокировкой таблицы).
+
+		:param columns: (dict[str, str]) схема таблицы {столбец: тип}
+		"""
+		rows = [row for number in self._changed
+			for row in self._loaded[number].values()]
+		metrics.count("bytes_written",
+			write_segments(self._manifest_path, columns, rows, self._changed))
+		self._changed = set()
+
+	def segments(self) -> list[int]:
+		"""Номера сегментов таблицы по возрастанию."""
+		return sorted(self._stats.keys() | self._loaded.keys())
+
+	def scan(self, tree: tuple) -> Iterator[dict]:
+		"""
+		Перебирает записи сегментов, которые могут содержать записи,
+		удовлетворяющие условию; сами записи условием не проверяются.
+
+		:param tree: (tuple) дерево условия
+		:return: (Iterator[dict]) записи в порядке ID
+		"""
+		skipped = 0
+		try:
+			for number in self.segments():
+				entry = self._stats.get(number)
+				if (entry is not None and number not in self._changed
+						and not may_match(entry["zones"], tree)):
+					skipped += 1
+					continue
+				yield from self._segment(number).values()
+		finally:
+			metrics.count("segments_skipped", skipped)
+
+	def iter_rows(self) -> Iterator[dict]:
+		"""Перебирает все записи в порядке ID."""
+		for number in self.segments():
+			yield from self._segment(number).values()
+
+	def values(self) -> ValuesView:
+		return _SegmentValues(self)
+
+	def __getitem__(self, row_id: int) -> dict:
+		rows = self._segment(segment_of(row_id, self._size))
+		if rows is None:
+			raise KeyError(row_id)
+		return rows[row_id]
+
+	def __setitem__(self, row_id: int, row: dict) -> None:
+		number = segment_of(row_id, self._size)
+		rows = self._segment(number, create=True)
+		if row_id not in rows:
+			self._count += 1
+		rows[row_id] = row
+		self._changed.add(number)
+
+	def __delitem__(self, row_id: int) -> None:
+		number = segment_of(row_id, self._size)
+		rows = self._segment(number)
+		if rows is None:
+			raise KeyError(row_id)
+		del rows[row_id]
+		self._count -= 1
+		self._changed.add(number)
+
+	def __iter__(self) -> Iterator[int]:
+		for number in self.segments():
+			yield from self._segment(number)
+
+	def __len__(self) -> int:
+		return self._count
@@ -0,0 +1,242 @@
+import asyncio
+import io
+import json
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Iterator, TextIO
+
+from src.decorators import set_assume_yes
+from src.primitive_db.concurrency import RWLock
+from src.primitive_db.constants import SERVER_HOST, SERVER_PORT, SERVER_WORKERS
+from src.primitive_db.engine import execute
+from src.primitive_db.statements import parse_statement
+from src.primitive_db.store import TableStore
+from src.primitive_db.vacuum import VacuumWorker
+
+# Команды, которые только читают данные и выполняются параллельно
+_READ_COMMANDS = {"select", "info", "list_tables", "stats", "cache_stats", "help"}
+# Транзакции держат изменения в памяти хранилища, а оно общее для всех соединений
+_TRANSACTION_COMMANDS = {"begin", "rollback"}
+# Наибольшая длина строки запроса (insert со многими записями бывает длинным)
+_LINE_LIMIT = 2 ** 24
+
+
+class _ThreadOutput(io.TextIOBase):
+	"""
+	Подменяет sys.stdout: то, что печатает поток внутри capture(), попадает в его
+	буфер, остальной вывод - в исходный поток. Так команды, выполняющиеся
+	параллельно в разных потоках, не перемешивают ответы.
+	"""
+
+	def __init__(self, default: TextIO) -> None:
+		self.default = default
+		self._local = threading.local()
+
+	def write(self, text: str) -> int:
+		buffer = getattr(self._local, "buffer", None)
+		return (buffer if buffer is not None else self.default).write(text)
+
+	def flush(self) -> None:
+		if getattr(self._local, "buffer", None) is None:
+			self.default.flush()
+
+	@contextmanager
+	def capture(self) -> Iterator[io.StringIO]:
+		"""Перехватывает вывод текущего потока."""
+		self._local.buffer = io.StringIO()
+		try:
+			yield self._local.buffer
+		finally:
+			del self._local.buffer
+
+
+def _parse_request(line: bytes) -> tuple[Any, str]:
+	"""
+	Разбирает строку запроса: JSON-объект {"id": ..., "command": "..."} или
+	просто команду.
+
+	:param line: (bytes) строка запроса
+	:return: (tuple[Any, str]) идентификатор запроса (None, если не задан) и команда
+	:raises ValueError: если JSON некорректен или в нём нет команды
+	"""
+	text = line.decode("utf-8").strip()
+	if not text.startswith("{"):
+		return None, text
+	request = json.loads(text)
+	command = request.get("command") if isinstance(request, dict) else None
+	if not isinstance(command, str):
+		raise ValueError("в запросе нет команды")
+	return request.get("id"), command
+
+
+class QueryServer:
+	"""
+	Сервер запросов: держит таблицы в памяти (TableStore) и выполняет команды
+	той же грамматики, что и консольное приложение.
+
+	Протокол построчный. Клиент отправляет команду одной строкой - текстом или
+	JSON-объектом {"id": ..., "command": "..."}; на каждую строку сервер отвечает
+	одной JSON-строкой {"id": ..., "ok": true, "output": "<вывод команды>"} или
+	{"id": ..., "ok": false, "error": "..."}, если запрос не разобран. Команда
+	exit закрывает соединение.
+
+	Соединения обслуживает цикл asyncio, а команды выполняются в пуле потоков:
+	читающие команды - параллельно, изменяющие - по одной (RWLock). Опасные
+	команды выполняются без подтверждения, транзакции (begin/rollback) не
+	поддерживаются: хранилище общее для всех соединений. Журналы изменённых таблиц
+	сворачиваются в снимки в фоновом потоке очистки (vacuum.VacuumWorker) раз в
+	flush_interval хранилища, не останавливая чтение, и при остановке.
+	"""
+
+	def __init__(self, store: TableStore | None = None,
+			workers: int = SERVER_WORKERS) -> None:
+		self.store = store if store is not None else TableStore()
+		self._lock = RWLock()
+		self._pool = ThreadPoolExecutor(workers, thread_name_prefix="db-query")
+		self._output: _ThreadOutput | None = None
+		self._server: asyncio.AbstractServer | None = None
+
+	def execute(self, command: str) -> tuple[bool, str]:
+		"""
+		Выполняет команду и возвращает её вывод (вызывается в потоке пула).
+
+		:param command: (str) команда
+		:return: (tuple[bool, str]) False, если команда - exit; вывод команды
+		"""
+		statement = parse_statement(command)
+		target = statement
+		if statement.command == "profile" and statement.error is None:
+			target = statement.parts["statement"]
+		if target.command in _TRANSACTION_COMMANDS:
+			return True, f"Ошибка: команда {target.command} недоступна на сервере.\n"
+		read_only = target.command in _READ_COMMANDS or target.error is not None
+		with (self._lock.read() if read_only else self._lock.write()):
+			if not read_only:
+				self._adopt_vacuumed()
+			with self._output.capture() as output:
+				proceed = execute(self.store, statement)
+		return proceed, output.getvalue()
+
+	def _adopt_vacuumed(self) -> None:
+		"""Передаёт хранилищу итоги фоновой очистки (под блокировкой записи)."""
+		if self.store.vacuum_worker is not None:
+			for result in self.store.vacuum_worker.results():
+				self.store.vacuumed(result)
+
+	def _flush(self) -> None:
+		with self._lock.write():
+			self.store.flush()
+
+	def _maintain(self) -> None:
+		with self._lock.write():
+			self._adopt_vacuumed()
+			self.store.flush_if_due()
+
+	async def _flush_periodically(self) -> None:
+		loop = asyncio.get_running_loop()
+		while True:
+			await asyncio.sleep(self.store.flush_interval)
+			await loop.run_in_executor(self._pool, self._maintain)
+
+	async def _handle(self, reader: asyncio.StreamReader,
+			writer: asyncio.StreamWriter) -> None:
+		"""Обслуживает одно соединение: запросы выполняются по порядку."""
+		loop = asyncio.get_running_loop()
+		try:
+			while line := await reader.readline():
+				try:
+					request_id, command = _parse_request(line)
+				except (UnicodeDecodeError, ValueError) as e:
+					response = {"id": None, "ok": False, "error": str(e)}
+					proceed = True
+				else:
+					proceed, output = await loop.run_in_executor(
+						self._pool, self.execute, command)
+					response = {"id": request_id, "ok": True, "output": output}
+				writer.write(json.dumps(response, ensure_ascii=False).encode("utf-8")
+					+ b"\n")
+				await writer.drain()
+				if not proceed:
+					break
+		except (ConnectionError, ValueError):
+			# клиент отключился или прислал строку длиннее _LINE_LIMIT
+			pass
+		finally:
+			writer.close()
+
+	async def start(self, host: str = SERVER_HOST, port: int = SERVER_PORT,
+			socket_path: str | None = None) -> None:
+		"""
+		Начинает принимать соединения: по TCP или, если задан socket_path, через
+		Unix-сокет.
+
+		:param host: (str) адрес TCP
+		:param port: (int) порт TCP, 0 - выбрать свободный
+		:param socket_path: (str | None) путь до Unix-сокета
+		"""
+		set_assume_yes(True)
+		if self.store.vacuum_worker is None:
+			self.store.vacuum_worker = VacuumWorker(self.store.meta_file,
+				self.store.index_file)
+		self._output = _ThreadOutput(sys.stdout)
+		sys.stdout = self._output
+		if socket_path is not None:
+			self._server = await asyncio.start_unix_server(self._handle, socket_path,
+				limit=_LINE_LIMIT)
+		else:
+			self._server = await asyncio.start_server(self._handle, host, port,
+				limit=_LINE_LIMIT)
+
+	@property
+	def addresses(self) -> list:
+		"""Адреса, на которых сервер принимает соединения."""
+		return [sock.getsockname() for sock in self._server.sockets]
+
+	async def serve_forever(self) -> None:
+		"""Обслуживает соединения до отмены; при выходе сохраняет изменения."""
+		flusher = asyncio.create_task(self._flush_periodically())
+		try:
+			async with self._server:
+				await self._server.serve_forever()
+		finally:
+			flusher.cancel()
+			await self.close()
+
+	async def close(self) -> None:
+		"""Останавливает сервер, сворачивает журналы и возвращает sys.stdout."""
+		if self._server is not None:
+			self._server.close()
+		loop = asyncio.get_running_loop()
+		if self.store.vacuum_worker is not None:
+			await loop.run_in_executor(self._pool, self.store.vacuum_worker.close)
+			self.store.vacuum_worker = None
+		await loop.run_in_executor(self._pool, self._flush)
+		self._pool.shutdown()
+		if self._output is not None and sys.stdout is self._output:
+			sys.stdout = self._output.default
+		set_assume_yes(False)
+
+
+def serve(host: str = SERVER_HOST, port: int = SERVER_PORT,
+          socket_path: str | None = None, workers: int = SERVER_WORKERS) -> None:
+	"""
+	Запускает сервер запросов (database serve) до прерывания (Ctrl+C).
+
+	:param host: (str) адрес TCP
+	:param port: (int) порт TCP
+	:param socket_path: (str | None) путь до Unix-сокета вместо TCP
+	:param workers: (int) число потоков, выполняющих команды
+	"""
+	async def main() -> None:
+		server = QueryServer(workers=workers)
+		await server.start(host, port, socket_path)
+		where = socket_path if socket_path is not None else f"{host}:{port}"
+		print(f"Сервер базы данных принимает соединения на {where}")
+		await server.serve_forever()
+
+	try:
+		asyncio.run(main())
+	except KeyboardInterrupt:
+		print("Сервер остановлен.")
@@ -0,0 +1,361 @@
+import re
+from collections.abc import Callable, Mapping
+from functools import lru_cache
+from typing import Any
+
+from src.primitive_db.aggregate import is_aggregate
+from src.primitive_db.constants import PLAN_CACHE_SIZE, PLAN_CACHE_TEXT_LIMIT
+from src.primitive_db.metrics import metrics
+from src.primitive_db.utils import split_command
+from src.primitive_db.where import Condition, parse_condition
+
+# Части команды select после имени таблицы
+_SELECT_CLAUSES = ("where", "group", "limit", "offset", "format")
+# Начало команды insert до списка значений
+_INSERT_HEAD = re.compile(r"""\s*insert\s+into\s+(?:"[^"]*"|'[^']*'|\S+)\s+values\s""")
+# Значение списка values: строка в двойных или одинарных кавычках или слова без
+# кавычек, запятых и скобок
+_VALUE = r"""(?:"(?:[^"\\]|\\.)*"|'[^']*'|[^\s(),"']+(?:\s+[^\s(),"']+)*)"""
+_VALUES = re.compile(_VALUE)
+# Экранированный символ в строке в двойных кавычках
+_ESCAPED = re.compile(r"\\(.)")
+# Запись списка values в скобках и весь список: записи через запятую
+_VALUES_ROW = rf"\(\s*{_VALUE}(?:\s*,\s*{_VALUE})*\s*\)"
+_VALUES_ROWS = re.compile(rf"\(\s*({_VALUE}(?:\s*,\s*{_VALUE})*)\s*\)")
+_VALUES_LIST = re.compile(rf"\s*{_VALUES_ROW}(?:\s*,\s*{_VALUES_ROW})*\s*")
+# Сообщение о некорректном списке values
+_VALUES_SYNTAX = ("Ошибка синтаксиса. Пример: insert into <table> values "
+                  "(<значение1>, <значение2>), (...)")
+# Список values без кавычек (частый случай) разбирается целиком регулярными
+# выражениями, без перебора слов
+_PLAIN_VALUES = re.compile(r"""\s*\([^()"']*\)(?:\s*,\s*\([^()"']*\))*\s*""")
+_PLAIN_ROW = re.compile(r"\(([^()]*)\)")
+
+
+class Statement:
+	"""
+	План команды: введённая строка, один раз разобранная грамматикой.
+
+	command - первое слово команды, args - все её слова, table - таблица, если
+	команда с ней работает, parts - разобранные части (свои у каждой команды,
+	см. _GRAMMAR), error - сообщение о синтаксической ошибке, которое печатается
+	вместо выполнения. План не меняется после разбора и кэшируется по тексту
+	команды (см. parse_statement).
+
+	Условие WHERE зависит от типов столбцов, поэтому приводится и компилируется
+	при выполнении (см. condition), а результат запоминается в плане для схемы
+	таблицы.
+	"""
+
+	__slots__ = ("command", "args", "table", "parts", "error", "_conditions")
+
+	def __init__(self, command: str, args: tuple[str, ...], table: str | None = None,
+			parts: dict[str, Any] | None = None, error: str | None = None) -> None:
+		self.command = command
+		self.args = args
+		self.table = table
+		self.parts = parts or {}
+		self.error = error
+		self._conditions: dict[tuple, Condition] = {}
+
+	def condition(self, columns: Mapping[str, str]) -> Condition | None:
+		"""
+		Условие WHERE команды, приведённое к типам столбцов.
+
+		:param columns: (Mapping[str, str]) схема таблицы {столбец: тип}
+		:return: (Condition | None) условие, None - в команде нет where
+		:raises ValueError: если условие некорректно
+		"""
+		tokens = self.parts.get("where")
+		if tokens is None:
+			return None
+		key = tuple(columns.items())
+		condition = self._conditions.get(key)
+		if condition is None:
+			condition = parse_condition(list(tokens), dict(columns))
+			self._conditions[key] = condition
+		return condition
+
+	def __repr__(self) -> str:
+		if self.error is not None:
+			return f"Statement({self.command!r}, error={self.error!r})"
+		return f"Statement({self.command!r}, table={self.table!r}, {self.parts!r})"
+
+
+def _unquote(value: str) -> str:
+	"""Значение списка values без кавычек."""
+	quote = value[0]
+	if quote == '"':
+		value = value[1:-1]
+		return _ESCAPED.sub(r"\1", value) if "\\" in value else value
+	return value[1:-1] if quote == "'" else value
+
+
+def parse_values(text: str) -> tuple[tuple[str, ...], ...]:
+	"""
+	Разбирает список VALUES: одну или несколько записей в скобках через запятую.
+	Значения в кавычках могут содержать запятые, скобки и пробелы.
+
+	:param text: (str) текст команды после слова values
+	:return: (tuple[tuple[str, ...], ...]) значения каждой записи
+	:raises ValueError: если список некорректен
+
+	Пример:
+	>>> parse_values('(Alice, 30), ("Smith, Bob", 25)')
+	(('Alice', '30'), ('Smith, Bob', '25'))
+	"""
+	if _PLAIN_VALUES.fullmatch(text):
+		rows = tuple(tuple(value.strip() for value in row.split(","))
+			for row in _PLAIN_ROW.findall(text))
+		if not any("" in row for row in rows):
+			return rows
+		raise ValueError(_VALUES_SYNTAX)
+
+	if not _VALUES_LIST.fullmatch(text):
+		raise ValueError(_VALUES_SYNTAX)
+	return tuple(tuple(map(_unquote, _VALUES.findall(row)))
+		for row in _VALUES_ROWS.findall(text))
+
+
+def _parse_select(args: tuple[str, ...]) -> dict[str, Any]:
+	"""
+	Разбирает команду
+	select [<столбец1>, <столбец2> | *] from <таблица> [where <условие>]
+	[group by <столбец>, ...] [limit N] [offset M] [format table|tsv|jsonl].
+	Вместо столбцов могут быть агрегатные функции: count(*), sum(<столбец>) и т.д.
+
+	:param args: (tuple[str, ...]) слова команды
+	:return: (dict[str, Any]) части команды: table, columns, where (слова
+		условия), group_by, limit, offset, output, aggregate
+	:raises ValueError: если команда некорректна
+	"""
+	if "from" not in args or args.index("from") + 1 >= len(args):
+		raise ValueError("Ошибка синтаксиса. Пример: select [<столбцы>] from <table> "
+			"[where ...] [limit N] [offset M]")
+	from_index = args.index("from")
+	projection = [col.strip() for col in " ".join(args[1:from_index]).split(",")]
+	projection = tuple(col for col in projection if col)
+	query = {
+		"table": args[from_index + 1],
+		"columns": None if projection in ((), ("*",)) else projection,
+		"where": None,
+		"group_by": (),
+		"limit": None,
+		"offset": 0,
+		"output": "table",
+	}
+
+	clauses: dict[str, list[str]] = {}
+	clause = None
+	for token in args[from_index + 2:]:
+		if token.lower() in _SELECT_CLAUSES and token.lower() not in clauses:
+			clause = token.lower()
+			clauses[clause] = []
+		elif clause is None:
+			raise ValueError(f"Ошибка синтаксиса: неожиданное слово {token}.")
+		else:
+			clauses[clause].append(token)
+
+	if "where" in clauses:
+		query["where"] = tuple(clauses["where"])
+	group = clauses.get("group")
+	if group is not None:
+		if len(group) < 2 or group[0].lower() != "by":
+			raise ValueError("Ошибка синтаксиса. Пример: group by <столбец>")
+		query["group_by"] = tuple(col.strip() for col in " ".join(group[1:]).split(",")
+			if col.strip())
+	for clause in ("limit", "offset", "format"):
+		words = clauses.get(clause)
+		if words is None:
+			continue
+		if len(words) != 1:
+			raise ValueError(f"Ошибка синтаксиса: после {clause} ожидается одно "
+				f"значение.")
+		if clause == "format":
+			query["output"] = words[0].lower()
+		elif words[0].isdigit():
+			query[clause] = int(words[0])
+		else:
+			raise ValueError(f"Ошибка: {clause} должен быть неотрицательным целым "
+				f"числом.")
+	query["aggregate"] = is_aggregate(query["columns"] or ()) or bool(query["group_by"])
+	return query
+
+
+def _parse_set(tokens: tuple[str, ...]) -> dict[str, str]:
+	"""
+	Разбирает выражение SET <столбец> = <значение>.
+
+	Пример:
+	>>> _parse_set(("age", "=", "30"))
+	{'age': '30'}
+	"""
+	if len(tokens) < 3 or tokens[1] != "=":
+		raise ValueError("Ошибка: некорректный SET.")
+	return {tokens[0]: tokens[2].strip('"').strip("'")}
+
+
+# Грамматика: команда -> функция (слова, текст команды) -> (таблица, части);
+# синтаксическая ошибка - ValueError с текстом сообщения
+
+def _create_table(args: tuple[str, ...], text: str) -> tuple[str, dict]:
+	if len(args) < 2:
+		raise ValueError("Ошибка: Слишком мало аргументов.")
+	columns = tuple(arg for arg in args[2:] if not arg.startswith("storage="))
+	storage = next((arg.split("=", 1)[1] for arg in args[2:]
+		if arg.startswith("storage=")), "json")
+	return args[1], {"columns": columns, "storage": storage}
+
+def _table_only(args: tuple[str, ...], text: str) -> tuple[str, dict]:
+	if len(args) != 2:
+		raise ValueError("Ошибка: укажите имя таблицы.")
+	return args[1], {}
+
+def _convert_table(args: tuple[str, ...], text: str) -> tuple[str, dict]:
+	if len(args) != 3:
+		raise ValueError("Ошибка синтаксиса. Пример: convert_table <table> "
+			"<json|columnar|segmented>")
+	return args[1], {"storage": args[2]}
+
+def _create_index(args: tuple[str, ...], text: str) -> tuple[str, dict]:
+	if len(args) not in (3, 4):
+		raise ValueError("Ошибка синтаксиса. Пример: create_index <table> <column> "
+			"[hash|sorted]")
+	return args[1], {"column": args[2], "kind": args[3] if len(args) == 4 else "hash"}
+
+def _insert(args: tuple[str, ...], text: str) -> tuple[str, dict]:
+	head = _INSERT_HEAD.match(text)
+	if head is None:
+		raise ValueError("Ошибка синтаксиса. Пример: insert into <table> values (...)")
+	return args[2], {"rows": parse_values(text[head.end():])}
+
+def _select(args: tuple[str, ...], text: str) -> tuple[str, dict]:
+	query = _parse_select(args)
+	return query.pop("table"), query
+
+def _update(args: tuple[str, ...], text: str) -> tuple[str, dict]:
+	if "set" not in args or "where" not in args:
+		raise ValueError("Ошибка синтаксиса. Пример: update <table> set x=1 where y=2")
+	set_index = args.index("set")
+	where_index = args.index("where")
+	return args[1], {"set": _parse_set(args[set_index + 1:where_index]),
+		"where": args[where_index + 1:]}
+
+def _delete(args: tuple[str, ...], text: str) -> tuple[str, dict]:
+	if len(args) < 6 or args[1] != "from" or args[3] != "where":
+		raise ValueError("Ошибка синтаксиса. Пример: delete from <table> where x=1")
+	return args[2], {"where": args[4:]}
+
+def _file_command(args: tuple[str, ...], text: str) -> tuple[str, dict]:
+	if len(args) != 3:
+		raise ValueError(f"Ошибка синтаксиса. Пример: {args[0]} <table> "
+			f"<file.csv|file.jsonl>")
+	return args[1], {"path": args[2]}
+
+def _profile(args: tuple[str, ...], text: str) -> tuple[None, dict]:
+	if len(args) < 2:
+		raise ValueError("Ошибка синтаксиса. Пример: profile select from <table>")
+	return None, {"statement": _compile(text.split(maxsplit=1)[1])}
+
+def _vacuum(args: tuple[str, ...], text: str) -> tuple[str | None, dict]:
+	if len(args) > 2:
+		raise ValueError("Ошибка синтаксиса. Пример: vacuum [<table> | orphans=yes]")
+	if args[1:] == ("orphans=yes",):
+		return None, {"orphans": True}
+	return (args[1] if len(args) == 2 else None), {"orphans": False}
+
+def _no_table(args: tuple[str, ...], text: str) -> tuple[None, dict]:
+	return None, {}
+
+_GRAMMAR: dict[str, Callable[[tuple[str, ...], str], tuple[str | None, dict]]] = {
+	"create_table": _create_table,
+	"drop_table": _table_only,
+	"convert_table": _convert_table,
+	"create_index": _create_index,
+	"insert": _insert,
+	"select": _select,
+	"update": _update,
+	"delete": _delete,
+	"import": _file_command,
+	"export": _file_command,
+	"info": _table_only,
+	"profile": _profile,
+	"vacuum": _vacuum,
+	"begin": _no_table,
+	"commit": _no_table,
+	"rollback": _no_table,
+	"list_tables": _no_table,
+	"stats": _no_table,
+	"cache_stats": _no_table,
+	"help": _no_table,
+	"exit": _no_table,
+}
+
+
+def _build(text: str) -> Statement:
+	"""Разбирает команду в план (без кэша)."""
+	# у insert на слова разбивается только начало: список values разбирает
+	# parse_values
+	head = _INSERT_HEAD.match(text)
+	try:
+		args = tuple(split_command(text if head is None else text[:head.end()]))
+	except ValueError:
+		return Statement("", (), error="Некорректный ввод. Попробуйте снова.")
+	if not args:
+		return Statement("", ())
+
+	command = args[0]
+	grammar = _GRAMMAR.get(command)
+	if grammar is None:
+		return Statement(command, args, error=f"Функции {command} нет. Попробуйте "
+			f"снова или вызовите справочник по команде 'help'.")
+	try:
+		table, parts = grammar(args, text)
+	except ValueError as e:
+		return Statement(command, args, error=str(e))
+	return Statement(command, args, table, parts)
+
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def _cached(text: str) -> Statement:
+	return _build(text)
+
+
+def _compile(text: str) -> Statement:
+	text = text.strip()
+	# длинные команды (insert многих записей) почти не повторяются и заняли бы
+	# кэш целиком
+	return _cached(text) if len(text) <= PLAN_CACHE_TEXT_LIMIT else _build(text)
+
+
+def parse_statement(text: str) -> Statement:
+	"""
+	Разбирает введённую команду в план. Планы команд не длиннее
+	PLAN_CACHE_TEXT_LIMIT символов кэшируются (LRU на PLAN_CACHE_SIZE
+	команд), поэтому повторная команда не разбирается заново.
+
+	:param text: (str) введённая строка
+	:return: (Statement) план; при синтаксической ошибке её текст в error
+	"""
+	with metrics.phase("parse"):
+		return _compile(text)
+
+
+def plan_cache_stats() -> dict[str, Any]:
+	"""Возвращает статистику кэша планов."""
+	info = _cached.cache_info()
+	total = info.hits + info.misses
+	return {
+		"hits": info.hits,
+		"misses": info.misses,
+		"size": info.currsize,
+		"hit_ratio": info.hits / total if total else 0.0,
+	}
+
+
+def clear_plan_cache() -> None:
+	"""Очищает кэш планов."""
+	_cached.cache_clear()
+
+
+metrics.register_gauge("plan_cache", plan_cache_stats)
@@ -0,0 +1,639 @@
+import os
+import threading
+import time
+from collections.abc import Iterator, MutableMapping
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+
+from src.primitive_db.constants import DB_INDEX_FILE, DB_META_FILE, FLUSH_INTERVAL
+from src.primitive_db.files import file_lock, file_signature
+from src.primitive_db.indexes import HashIndex, build_index
+from src.primitive_db.journal import commit_journal
+from src.primitive_db.lazy import LazyTable
+from src.primitive_db.metrics import metrics
+from src.primitive_db.rows import Row, by_id
+from src.primitive_db.segments import SegmentedTable
+from src.primitive_db.utils import (
+	compact_table,
+	hold_table_logs,
+	load_metadata,
+	load_table_data,
+	metadata_lock_path,
+	read_table_log,
+	release_table_logs,
+	save_metadata,
+	save_table_data,
+	table_data_path,
+	table_lock_path,
+	table_log_path,
+)
+from src.primitive_db.vacuum import VacuumResult, VacuumWorker
+
+
+def _upgrade_metadata(metadata: dict) -> dict:
+	"""
+	Приводит описания таблиц старого формата ({столбец: тип}) к текущему
+	({"columns": {столбец: тип}, "next_id": N}). Счётчик next_id для таких таблиц
+	уточняется при первой загрузке их данных.
+	"""
+	for table_name, entry in metadata.items():
+		if not isinstance(entry.get("columns"), dict):
+			metadata[table_name] = {"columns": entry, "next_id": 1}
+	return metadata
+
+
+class TableStore:
+	"""
+	Хранит метаданные и записи таблиц в памяти на протяжении сессии.
+
+	Изменения сразу попадают в журнал таблицы на диске, а свёртка журнала в снимок
+	выполняется лениво: раз в FLUSH_INTERVAL секунд и при выходе. Если файлы
+	изменились извне (другой mtime или размер), данные перечитываются с диска.
+
+	Индексы таблиц строятся в памяти при загрузке таблицы по описаниям из
+	DB_INDEX_FILE и дальше поддерживаются операциями insert/update/delete.
+
+	В пакетном режиме (batch=True) метаданные и таблицы загружаются один раз и
+	больше не сверяются с диском, изменения не пишутся в журнал (см.
+	set_log_deferred), а flush сохраняет метаданные и каждую изменённую таблицу
+	один раз - снимком целиком (у секционированной таблицы - только изменённые
+	сегменты).
+
+	Несколько процессов могут работать с одной базой: команды выполняются под
+	блокировками таблиц (lock) и метаданных (metadata_lock), а прочитанное с диска
+	сверяется с файлами уже под блокировкой. В пакетном режиме блокировки
+	затронутых таблиц удерживаются до commit.
+
+	Транзакция (begin, затем commit или rollback) копит изменения в памяти:
+	операции журналов затронутых таблиц и их описания в метаданных. commit
+	пишет их одной записью журнала фиксации (см. journal.CommitJournal),
+	rollback отбрасывает и перечитывает затронутые таблицы с диска. Блокировки
+	таблиц, к которым обращалась транзакция, удерживаются до её завершения.
+	"""
+
+	def __init__(self, meta_file: Path = DB_META_FILE,
+			index_file: Path = DB_INDEX_FILE,
+			flush_interval: float = FLUSH_INTERVAL, batch: bool = False) -> None:
+		self.meta_file = meta_file
+		self.index_file = index_file
+		self.flush_interval = flush_interval
+		self.batch = batch
+		# таблицы, чьи описания изменены в пакетном режиме и ещё не сохранены
+		self._meta_changed: set[str | None] = set()
+		self._defer_metadata = False
+		self._metadata: dict | None = None
+		self._meta_signature: tuple | None = None
+		self._index_metadata: dict | None = None
+		self._index_meta_signature: tuple | None = None
+		self._tables: dict[str, dict[int, Row]] = {}
+		self._indexes: dict[str, dict[str, HashIndex]] = {}
+		self._signatures: dict[str, tuple] = {}
+		self._lazy: dict[str, LazyTable | SegmentedTable] = {}
+		self._lazy_signatures: dict[str, tuple] = {}
+		self._versions: dict[str, int] = {}
+		self._version_signatures: dict[str, tuple] = {}
+		self._dirty: set[str] = set()
+		# загрузка таблиц и построение индексов: сервер выполняет чтения
+		# параллельно, и первая загрузка таблицы не должна выполняться дважды
+		self._load_lock = threading.RLock()
+		self._last_flush = time.monotonic()
+		self._batch_locks = ExitStack()
+		self._batch_locked: set[str] = set()
+		# таблицы, сверенные с диском в текущей транзакции пакетного режима
+		self._verified: set[str] = set()
+		# таблицы открытой транзакции (begin), None - транзакции нет; таблицы с
+		# несвёрнутыми журналами на момент begin
+		self._transaction: set[str] | None = None
+		self._dirty_before: set[str] = set()
+		# фоновая очистка: если задана, журналы сворачиваются в её потоке
+		self.vacuum_worker: VacuumWorker | None = None
+		# транзакция, которую не успел применить упавший процесс
+		commit_journal().recover()
+
+	def _hold_until_commit(self, path: Path) -> None:
+		"""Захватывает эксклюзивную блокировку до commit (или rollback)."""
+		key = os.fspath(path)
+		if key not in self._batch_locked:
+			self._batch_locks.enter_context(file_lock(path, exclusive=True))
+			self._batch_locked.add(key)
+
+	@contextmanager
+	def lock(self, table_name: str, exclusive: bool = False) -> Iterator[None]:
+		"""
+		Блокировка таблицы на время команды: разделяемая для чтения, эксклюзивная
+		для изменения. Команды над разными таблицами друг друга не ждут. В
+		пакетном режиме и в транзакции - эксклюзивная до commit или rollback.
+
+		:param table_name: (str) имя таблицы
+		:param exclusive: (bool) True - таблица будет изменяться
+		"""
+		if self._transaction is not None:
+			self._transaction.add(table_name)
+		if self.batch or self._transaction is not None:
+			self._hold_until_commit(table_lock_path(table_name))
+			yield
+			return
+		with file_lock(table_lock_path(table_name), exclusive):
+			yield
+
+	@contextmanager
+	def metadata_lock(self) -> Iterator[None]:
+		"""
+		Эксклюзивная блокировка метаданных на время команды, меняющей схему
+		(create_table, drop_table и т.п.): метаданные, прочитанные под блокировкой,
+		не изменит другой процесс до их сохранения.
+		"""
+		with file_lock(metadata_lock_path(self.meta_file), exclusive=True):
+			yield
+
+	@property
+	def metadata(self) -> dict:
+		"""
+		Метаданные БД, перечитываются только при изменении файла. Ещё не
+		сохранённые описания таблиц пакетного режима при этом сохраняются.
+		"""
+		signature = file_signature(self.meta_file)
+		if self._metadata is None or signature != self._meta_signature:
+			self._metadata = self._merged_metadata(self._meta_changed)
+			self._meta_signature = signature
+		return self._metadata
+
+	def _merged_metadata(self, changed: set[str | None]) -> dict:
+		"""
+		Читает метаданные с диска, подставляя описания изменённых таблиц из памяти.
+
+		:param changed: (set[str | None]) изменённые таблицы, None - все
+		:return: (dict) метаданные
+		"""
+		if None in changed:
+			return self._metadata
+		current = _upgrade_metadata(load_metadata(self.meta_file))
+		for table_name in changed:
+			if table_name in self._metadata:
+				current[table_name] = self._metadata[table_name]
+			else:
+				current.pop(table_name, None)
+		return current
+
+	def save_metadata(self, metadata: dict, table_name: str | None = None) -> None:
+		"""
+		Сохраняет метаданные на диск и в память. В пакетном режиме метаданные
+		пишутся на диск при flush.
+
+		Если указана таблица, на диск переносится только её описание (например,
+		счётчик next_id после insert под блокировкой таблицы), а описания остальных
+		таблиц перечитываются с диска: их мог изменить другой процесс.
+
+		:param metadata: (dict) обновлённые метаданные
+		:param table_name: (str | None) таблица, описание которой изменилось,
+			None - сохранить метаданные целиком
+		"""
+		self._metadata = metadata
+		if self.batch or self._defer_metadata:
+			self._meta_changed.add(table_name)
+			return
+		self._write_metadata({table_name})
+
+	def commit_metadata(self) -> None:
+		"""Записывает на диск отложенные изменения метаданных."""
+		if self._meta_changed:
+			self._write_metadata(self._meta_changed)
+			self._meta_changed = set()
+
+	def _write_metadata(self, changed: set[str | None]) -> None:
+		"""
+		Записывает метаданные из памяти на диск под эксклюзивной блокировкой,
+		объединяя описания изменённых таблиц с текущим содержимым файла.
+
+		:param changed: (set[str | None]) изменённые таблицы, None - все
+		"""
+		with file_lock(metadata_lock_path(self.meta_file), exclusive=True):
+			metadata = self._merged_metadata(changed)
+			save_metadata(self.meta_file, metadata)
+			self._metadata = metadata
+			self._meta_signature = file_signature(self.meta_file)
+
+	@property
+	def index_metadata(self) -> dict:
+		"""Описания индексов, перечитываются только при изменении файла."""
+		signature = file_signature(self.index_file)
+		if self._index_metadata is None or signature != self._index_meta_signature:
+			self._index_metadata = load_metadata(self.index_file)
+			self._index_meta_signature = signature
+		return self._index_metadata
+
+	def save_index_metadata(self, index_metadata: dict) -> None:
+		"""
+		Сохраняет описания индексов на диск и в память.
+
+		:param index_metadata: (dict) обновлённые описания индексов
+		"""
+		save_metadata(self.index_file, index_metadata)
+		self._index_metadata = index_metadata
+		self._index_meta_signature = file_signature(self.index_file)
+
+	def indexes(self, table_name: str) -> dict[str, HashIndex]:
+		"""
+		Возвращает индексы таблицы, достраивая недостающие по описаниям.
+
+		:param table_name: (str) имя таблицы
+		:return: (dict[str, HashIndex]) индексы по именам столбцов
+		"""
+		with self._load_lock:
+			definitions = self.index_metadata.get(table_name, {})
+			if not definitions:
+				self._indexes.pop(table_name, None)
+				return {}
+			rows = self.table(table_name)
+			built = self._indexes.setdefault(table_name, {})
+			for column in list(built):
+				if built[column].kind != definitions.get(column):
+					del built[column]
+			for column, kind in definitions.items():
+				if column not in built:
+					built[column] = build_index(kind, column, rows.values())
+			return built
+
+	def storage(self, table_name: str) -> tuple[str, dict[str, str] | None]:
+		"""
+		Возвращает формат хранения и схему таблицы из метаданных.
+
+		:param table_name: (str) имя таблицы
+		:return: (tuple[str, dict[str, str] | None]) формат и схема {столбец: тип}
+		"""
+		entry = self.metadata.get(table_name)
+		if entry is None:
+			return "json", None
+		return entry.get("storage", "json"), entry["columns"]
+
+	def _table_signature(self, table_name: str) -> tuple:
+		storage, _ = self.storage(table_name)
+		return file_signature(table_data_path(table_name, storage),
+			table_log_path(table_name))
+
+	def table(self, table_name: str) -> dict[int, Row]:
+		"""
+		Возвращает записи таблицы из памяти, при необходимости загружая их с диска.
+
+		Записи хранятся в словаре по ID (первичный ключ) в порядке добавления, поэтому
+		поиск, изменение и удаление записи по ID выполняются за O(1). Сами записи -
+		кортежи Row с общим для таблицы отображением столбцов в позиции (см. rows).
+
+		:param table_name: (str) имя таблицы
+		:return: (dict[int, Row]) записи таблицы по ID
+		"""
+		with self._load_lock:
+			if table_name in self._verified:
+				return self._tables[table_name]
+			signature = self._table_signature(table_name)
+			if self.batch:
+				# под блокировкой пакета файлы таблицы до commit меняет только этот
+				# процесс
+				self._verified.add(table_name)
+			if (table_name not in self._tables
+					or signature != self._signatures[table_name]):
+				with file_lock(table_lock_path(table_name)):
+					rows = by_id(load_table_data(table_name, *self.storage(table_name)))
+					self._tables[table_name] = rows
+					self._signatures[table_name] = self._table_signature(table_name)
+				self._indexes.pop(table_name, None)
+				self._lazy.pop(table_name, None)
+				self._versions[table_name] = self._versions.get(table_name, 0) + 1
+
+				entry = self.metadata.get(table_name)
+				if entry is not None:
+					if rows and entry["next_id"] <= max(rows):
+						entry["next_id"] = max(rows) + 1
+					entry["rows"] = len(rows)
+			return self._tables[table_name]
+
+	def written(self, table_name: str) -> None:
+		"""
+		Отмечает, что таблица изменена текущей сессией (изменения уже в журнале).
+		Если изменилось число записей, оно сохраняется в метаданных таблицы.
+
+		:param table_name: (str) имя таблицы
+		"""
+		self._dirty.add(table_name)
+		rows = self._tables.get(table_name, self._lazy.get(table_name))
+		entry = self.metadata.get(table_name)
+		if rows is not None and entry is not None and entry.get("rows") != len(rows):
+			entry["rows"] = len(rows)
+			self.save_metadata(self.metadata, table_name)
+		if self.batch or self._transaction is not None:
+			# файлы таблицы не меняются до commit, поэтому версию для кэша select
+			# меняет сама запись
+			self._versions[table_name] = self._versions.get(table_name, 0) + 1
+		if self.batch:
+			return
+		signature = self._table_signature(table_name)
+		self._signatures[table_name] = signature
+		if table_name in self._lazy:
+			self._lazy_signatures[table_name] = signature
+
+	def rows(self, table_name: str) -> MutableMapping[int, dict]:
+		"""
+		Возвращает записи таблицы для выполнения команды, не загружая таблицу в
+		память, если это не нужно.
+
+		Колоночная таблица без индексов, ещё не загруженная в память, открывается
+		через mmap (LazyTable): записи декодируются только при обращении к ним.
+		Секционированная таблица так же открывается без загрузки (SegmentedTable),
+		в том числе в пакетном режиме: сегменты читаются при обращении к их
+		записям, а при commit записываются только изменённые. Иначе, как и для
+		колоночной таблицы в пакетном режиме, возвращается таблица из памяти
+		(см. table).
+
+		:param table_name: (str) имя таблицы
+		:return: (MutableMapping[int, dict]) записи таблицы по ID
+		"""
+		with self._load_lock:
+			storage, _ = self.storage(table_name)
+			if (table_name in self._tables or storage == "json"
+					or (self.batch and storage == "columnar")
+					or self.index_metadata.get(table_name)):
+				return self.table(table_name)
+
+			signature = self._table_signature(table_name)
+			if (table_name not in self._lazy
+					or signature != self._lazy_signatures[table_name]):
+				with file_lock(table_lock_path(table_name)), metrics.phase("load"):
+					view = LazyTable if storage == "columnar" else SegmentedTable
+					self._lazy[table_name] = view(table_data_path(table_name, storage),
+						read_table_log(table_name))
+					self._lazy_signatures[table_name] = self._table_signature(
+						table_name)
+				entry = self.metadata.get(table_name)
+				if entry is not None:
+					entry["rows"] = len(self._lazy[table_name])
+			return self._lazy[table_name]
+
+	def row_count(self, table_name: str) -> int:
+		"""
+		Возвращает количество записей таблицы из метаданных, не загружая её.
+		Для таблиц, созданных до появления счётчика, записи считаются один раз.
+
+		:param table_name: (str) имя таблицы
+		:return: (int) количество записей
+		"""
+		count = self.metadata.get(table_name, {}).get("rows")
+		if count is None:
+			count = len(self.rows(table_name))
+		return count
+
+	def version(self, table_name: str) -> int:
+		"""
+		Возвращает версию данных таблицы. Версия меняется при каждом изменении
+		файлов таблицы - и текущей сессией, и извне.
+
+		:param table_name: (str) имя таблицы
+		:return: (int) номер версии
+		"""
+		with self._load_lock:
+			if self.batch:
+				return self._versions.setdefault(table_name, 0)
+			signature = self._table_signature(table_name)
+			if signature != self._version_signatures.get(table_name):
+				self._versions[table_name] = self._versions.get(table_name, 0) + 1
+				self._version_signatures[table_name] = signature
+			return self._versions[table_name]
+
+	def forget(self, table_name: str) -> None:
+		"""
+		Убирает таблицу из памяти (например, после удаления таблицы).
+
+		:param table_name: (str) имя таблицы
+		"""
+		self._tables.pop(table_name, None)
+		self._signatures.pop(table_name, None)
+		self._lazy.pop(table_name, None)
+		self._indexes.pop(table_name, None)
+		self._dirty.discard(table_name)
+		self._verified.discard(table_name)
+
+	def flush(self) -> None:
+		"""
+		Сворачивает журналы изменённых таблиц в снимки. Во время транзакции
+		ничего не делает: в памяти таблиц есть не зафиксированные изменения.
+		"""
+		if self.batch:
+			self._commit()
+			return
+		if self._transaction is not None:
+			return
+		for table_name in self._dirty:
+			with file_lock(table_lock_path(table_name), exclusive=True):
+				if not table_log_path(table_name).exists():
+					continue
+				storage, columns = self.storage(table_name)
+				if table_name in self._tables:
+					# table() перечитает таблицу, если журнал дописал другой процесс
+					rows = self.table(table_name)
+					if storage == "segmented":
+						# переписываются только сегменты, затронутые журналом
+						compact_table(table_name, storage, columns)
+					else:
+						save_table_data(table_name, list(rows.values()), storage,
+							columns)
+					self._signatures[table_name] = self._table_signature(table_name)
+				else:
+					# таблица менялась через LazyTable или SegmentedTable и целиком в
+					# памяти не нужна
+					compact_table(table_name, storage, columns)
+		self._dirty.clear()
+		self._last_flush = time.monotonic()
+
+	def _commit(self) -> None:
+		"""Сохраняет метаданные и изменённые таблицы пакетного режима на диск."""
+		self.commit_metadata()
+		for table_name in self._dirty:
+			if table_name not in self.metadata:
+				continue
+			if table_name in self._tables:
+				save_table_data(table_name, list(self._tables[table_name].values()),
+					*self.storage(table_name))
+				self._signatures[table_name] = self._table_signature(table_name)
+			elif isinstance(self._lazy.get(table_name), SegmentedTable):
+				with metrics.phase("save"):
+					self._lazy[table_name].save(self.storage(table_name)[1])
+				table_log_path(table_name).unlink(missing_ok=True)
+		# до следующего commit файлы таблиц может изменить другой процесс
+		for table_name, view in list(self._lazy.items()):
+			if isinstance(view, SegmentedTable):
+				del self._lazy[table_name]
+		self._dirty.clear()
+		self._verified.clear()
+		self._batch_locks.close()
+		self._batch_locked.clear()
+		self._last_flush = time.monotonic()
+
+	def flush_if_due(self) -> None:
+		"""
+		Выполняет flush, если с прошлого прошло больше flush_interval секунд.
+		При фоновой очистке (vacuum_worker) журналы сворачивает её поток, и
+		команды записи снимков не ждут.
+		"""
+		if self.batch or self._transaction is not None:
+			return
+		if self._dirty and time.monotonic() - self._last_flush >= self.flush_interval:
+			if self.vacuum_worker is None:
+				self.flush()
+				return
+			self.vacuum_worker.schedule(self._dirty)
+			self._last_flush = time.monotonic()
+
+	def vacuumed(self, result: VacuumResult) -> None:
+		"""
+		Принимает итог очистки таблицы (см. vacuum.vacuum_table). Если таблица в
+		памяти прочитана из тех же файлов, что и очищенная, очищенные файлы
+		считаются прочитанными: таблица не перечитывается, а её записи и индексы
+		заменяются упорядоченными по ID и построенными заново в потоке очистки.
+
+		:param result: (VacuumResult) итог очистки
+		"""
+		table_name = result.table
+		if (result.after is None or self.batch
+				or table_name in (self._transaction or ())):
+			return
+		if table_name in self._tables and self._signatures[table_name] == result.before:
+			if result.rows is not None:
+				self._tables[table_name] = result.rows
+				self._indexes[table_name] = result.indexes
+			self._signatures[table_name] = result.after
+		if (table_name in self._lazy
+				and self._lazy_signatures[table_name] == result.before):
+			if isinstance(self._lazy[table_name], LazyTable):
+				self._lazy_signatures[table_name] = result.after
+			else:
+				# сегменты переписаны, а SegmentedTable читает их по требованию
+				del self._lazy[table_name]
+		if self._version_signatures.get(table_name) == result.before:
+			self._version_signatures[table_name] = result.after
+		if (table_name in self._dirty
+				and self._table_signature(table_name) == result.after):
+			self._dirty.discard(table_name)
+
+	@property
+	def in_transaction(self) -> bool:
+		"""Открыта ли транзакция (begin)."""
+		return self._transaction is not None
+
+	def begin(self) -> None:
+		"""
+		Начинает транзакцию: изменения до commit остаются в памяти, а таблицы, к
+		которым обращаются команды, блокируются эксклюзивно до её завершения. В
+		пакетном режиме накопленные до begin изменения сначала сохраняются.
+		"""
+		if self.batch:
+			self._commit()
+		else:
+			self._defer_metadata = True
+			hold_table_logs()
+		self._transaction = set()
+		self._dirty_before = set(self._dirty)
+
+	def commit(self) -> None:
+		"""
+		Фиксирует транзакцию: операции журналов затронутых таблиц и их описания
+		в метаданных пишутся одной записью журнала фиксации. Если запись не
+		удалась, изменения транзакции отбрасываются. В пакетном режиме и без
+		транзакции - то же, что flush.
+
+		:raises OSError: если журнал фиксации не записан
+		"""
+		if self.batch or self._transaction is None:
+			self._transaction = None
+			self.flush()
+			return
+		tables = self._transaction
+		try:
+			self._commit_changes(release_table_logs())
+		except BaseException:
+			self._discard(tables)
+			raise
+		finally:
+			self._end_transaction()
+
+	@contextmanager
+	def atomic(self) -> Iterator[None]:
+		"""
+		Фиксирует изменения, сделанные текущим потоком внутри блока, как commit:
+		операции журналов таблиц и отложенные описания таблиц в метаданных
+		пишутся при выходе одной записью журнала фиксации. Так Database сохраняет
+		пачку заданий потока-писателя; пачки разных подключений, завершившиеся
+		одновременно, делят одну запись на диск (см. journal.CommitJournal).
+		Если блок прерван исключением или запись не удалась, изменения
+		отбрасываются, а таблицы перечитываются с диска.
+
+		:raises OSError: если журнал фиксации не записан
+		"""
+		self._defer_metadata = True
+		hold_table_logs()
+		try:
+			yield
+		except BaseException:
+			self._discard(set(release_table_logs()))
+			raise
+		logs = release_table_logs()
+		try:
+			self._commit_changes(logs)
+		except BaseException:
+			self._discard(set(logs))
+			raise
+
+	def _commit_changes(self, logs: dict[str, list[dict]]) -> None:
+		"""
+		Пишет операции журналов и отложенные описания таблиц одной записью
+		журнала фиксации.
+
+		:param logs: (dict[str, list[dict]]) операции {таблица: операции}
+		"""
+		changed = self._meta_changed
+		self._defer_metadata = False
+		self._meta_changed = set()
+		names = set(self._metadata) if None in changed else changed
+		entries = {name: self._metadata.get(name) for name in names}
+		metadata = {os.fspath(self.meta_file): entries} if entries else {}
+		if logs or metadata:
+			commit_journal().commit(logs, metadata)
+		# таблицы в памяти совпадают с записанными файлами
+		self._metadata = None
+		for table_name in logs:
+			self._dirty.add(table_name)
+			signature = self._table_signature(table_name)
+			if table_name in self._tables:
+				self._signatures[table_name] = signature
+			if table_name in self._lazy:
+				self._lazy_signatures[table_name] = signature
+
+	def rollback(self) -> None:
+		"""
+		Отменяет транзакцию: её изменения отбрасываются, затронутые таблицы и
+		метаданные перечитываются с диска при следующем обращении. В пакетном
+		режиме отменяются все изменения после последнего commit.
+		"""
+		tables = set(self._transaction or ())
+		if self.batch:
+			tables |= self._dirty
+		else:
+			release_table_logs()
+		self._discard(tables)
+		self._end_transaction()
+
+	def _discard(self, tables: set[str]) -> None:
+		"""Убирает из памяти не зафиксированные изменения таблиц и метаданных."""
+		self._defer_metadata = False
+		self._meta_changed = set()
+		self._metadata = None
+		for table_name in tables:
+			self.forget(table_name)
+			# данные на диске не менялись, а в кэше select - результаты транзакции
+			self._versions[table_name] = self._versions.get(table_name, 0) + 1
+		self._dirty |= self._dirty_before
+
+	def _end_transaction(self) -> None:
+		self._transaction = None
+		self._dirty_before = set()
+		self._verified.clear()
+		self._batch_locks.close()
+		self._batch_locked.clear()
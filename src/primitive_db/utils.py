@@ -1,11 +1,73 @@
+import csv
 import json
+import os
+import re
+import shlex
+import shutil
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterable, Iterator
 
-from src.primitive_db.constants import DATA_DIR
+from src.primitive_db.columnar import read_columnar, write_columnar
+from src.primitive_db.constants import (
+	COLUMNAR_SUFFIX,
+	DATA_DIR,
+	FSYNC_WRITES,
+	LOCK_SUFFIX,
+	LOG_COMPACT_THRESHOLD,
+	LOG_SUFFIX,
+	SEGMENT_MANIFEST,
+	SEGMENT_SUFFIX,
+	STORAGE_FORMATS,
+)
+from src.primitive_db.files import atomic_write, file_lock, lock_mode
+from src.primitive_db.metrics import metrics
+from src.primitive_db.rows import Row, as_dicts, as_row, as_rows, by_id
+from src.primitive_db.segments import (
+	publish_manifest,
+	read_manifest,
+	read_segments,
+	stage_segments,
+	touched_segments,
+	write_segments,
+)
 
+# Слово команды: части без пробелов и кавычек и строки в кавычках, идущие подряд
+_WORD = r"""(?:[^ \t\r\n"'\\]+|"[^"]*"|'[^']*')+"""
+_COMMAND = re.compile(rf"[ \t\r\n]*(?:{_WORD}[ \t\r\n]*)*")
+_WORDS = re.compile(_WORD)
+_QUOTED = re.compile(r""""([^"]*)"|'([^']*)'""")
+
+# Если True, операции не пишутся в журнал: в пакетном режиме TableStore сохраняет
+# изменённые таблицы снимками целиком при commit и по завершении скрипта
+_log_settings = {"deferred": False}
+
+
+# Буфер операций журнала текущего потока (см. buffered_table_logs)
+_log_buffer = threading.local()
+
+
+def set_log_deferred(deferred: bool) -> None:
+	"""
+	Включает или выключает отложенную запись журнала таблиц.
+
+	:param deferred: (bool) True - не писать операции в журнал
+	"""
+	_log_settings["deferred"] = deferred
+
+def _set_aside(filepath: str | Path) -> None:
+	"""Переименовывает повреждённый файл в <файл>.corrupt, чтобы не затереть его."""
+	corrupt_path = f"{filepath}.corrupt"
+	os.replace(filepath, corrupt_path)
+	print(f"Ошибка: поврежден файл {filepath}, он сохранён как {corrupt_path}. "
+																"Создаю новый.")
 
 def load_metadata(filepath: str) -> dict:
 	"""
-	Загружает метаданные из JSON. Если файл не найден - возвращает пустой словарь
+	Загружает метаданные из JSON. Если файл не найден - возвращает пустой словарь.
+	Повреждённый файл откладывается в сторону (см. _set_aside).
 
 	:param
 		filepath: (str) путь до целевого JSON-файла
@@ -18,52 +80,484 @@ def load_metadata(filepath: str) -> dict:
 	except FileNotFoundError:
 		return {}
 	except json.JSONDecodeError:
-		print("Ошибка: поврежден файл метаданных. Создаю новый.")
+		_set_aside(filepath)
 		return {}
 
 def save_metadata(filepath: str, data: dict) -> None:
 	"""
-	Сохраняет метаданные в JSON.
+	Сохраняет метаданные в JSON атомарно, под эксклюзивной блокировкой файла.
 
 	:param
 		filepath: (str) путь до json файла для записи
 		data: (dict) словарь с данными для записи
 
 	"""
-	with open(filepath, "w", encoding="utf-8") as f:
-		json.dump(data, f, indent=4, ensure_ascii=False)
+	with file_lock(metadata_lock_path(filepath), exclusive=True):
+		with atomic_write(filepath) as f:
+			json.dump(data, f, indent=4, ensure_ascii=False)
+
+def metadata_lock_path(filepath: str | Path) -> Path:
+	"""Путь до файла блокировки файла метаданных."""
+	return Path(f"{filepath}.lock")
+
+def table_data_path(table_name: str, storage: str = "json") -> Path:
+	"""
+	Путь до файла-снимка таблицы в формате хранения storage. Для секционированной
+	таблицы - путь до манифеста в её каталоге.
+	"""
+	if storage == "segmented":
+		return DATA_DIR / f"{table_name}{SEGMENT_SUFFIX}" / SEGMENT_MANIFEST
+	suffix = COLUMNAR_SUFFIX if storage == "columnar" else ".json"
+	return DATA_DIR / f"{table_name}{suffix}"
+
+def table_log_path(table_name: str) -> Path:
+	"""Путь до журнала изменений таблицы."""
+	return DATA_DIR / f"{table_name}{LOG_SUFFIX}"
+
+def table_lock_path(table_name: str) -> Path:
+	"""
+	Путь до файла блокировки таблицы. Чтение снимка и журнала выполняется под
+	разделяемой блокировкой, любая запись - под эксклюзивной.
+	"""
+	return DATA_DIR / f"{table_name}{LOCK_SUFFIX}"
+
+@contextmanager
+def buffered_table_logs() -> Iterator[dict[str, list[dict]]]:
+	"""
+	Накапливает операции журнала, записанные текущим потоком, и при выходе
+	дописывает их в журнал каждой таблицы одной записью (один fsync на таблицу).
+	Если внутри произошло исключение, накопленные операции всё равно пишутся:
+	они уже применены к таблицам в памяти.
+
+	:return: (dict[str, list[dict]]) буфер {таблица: операции}; операции
+		удалённой внутри блока таблицы из него нужно убрать
+	"""
+	outer = getattr(_log_buffer, "entries", None)
+	if outer is not None:
+		# внутри транзакции (hold_table_logs) операции ждут её commit
+		yield outer
+		return
+	buffer: defaultdict[str, list[dict]] = defaultdict(list)
+	_log_buffer.entries = buffer
+	try:
+		yield buffer
+	finally:
+		del _log_buffer.entries
+		for table_name, entries in buffer.items():
+			append_table_log(table_name, entries)
+
+def hold_table_logs() -> None:
+	"""
+	Начинает транзакцию журнала текущего потока: операции накапливаются в
+	памяти и не пишутся на диск, пока их не заберёт release_table_logs.
+	"""
+	_log_buffer.entries = defaultdict(list)
+
+def release_table_logs() -> dict[str, list[dict]]:
+	"""
+	Завершает накопление, начатое hold_table_logs.
+
+	:return: (dict[str, list[dict]]) накопленные операции {таблица: операции}
+	"""
+	return dict(_log_buffer.__dict__.pop("entries", {}))
+
+def encode_log_entries(entries: list[dict]) -> bytes:
+	"""Операции журнала в виде байтов файла: по одной JSON-строке на операцию."""
+	lines = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries)
+	return lines.encode("utf-8")
+
+def append_table_log(table_name: str, entries: list[dict]) -> None:
+	"""
+	Дописывает операции в конец журнала таблицы, по одной JSON-строке на операцию.
 
-def load_table_data(table_name: str) -> list[dict]:
+	Запись в журнал не зависит от размера таблицы. После записи файл сбрасывается
+	на диск (fsync, если FSYNC_WRITES), поэтому подтверждённая операция переживает
+	падение процесса.
+	При отложенной записи (set_log_deferred) операции не пишутся, внутри
+	buffered_table_logs - накапливаются до выхода из него.
+
+	:param:
+		table_name: (str) имя таблицы
+		entries: (list[dict]) операции, например {"op": "insert", "row": {...}}
+	:return:
+		None
 	"""
-	Загружает данные таблицы из JSON. Если файл отсутствует, возвращает пустой список.
+	if not entries or _log_settings["deferred"]:
+		return
+	buffer = getattr(_log_buffer, "entries", None)
+	if buffer is not None:
+		buffer[table_name].extend(entries)
+		return
+	DATA_DIR.mkdir(exist_ok=True)
+	data = encode_log_entries(entries)
+	with file_lock(table_lock_path(table_name), exclusive=True):
+		with open(table_log_path(table_name), "ab") as f:
+			f.write(data)
+			f.flush()
+			if FSYNC_WRITES:
+				os.fsync(f.fileno())
+	metrics.count("bytes_written", len(data))
+
+def read_table_log(table_name: str) -> list[dict]:
+	"""
+	Читает операции из журнала таблицы. Недописанная из-за сбоя последняя строка
+	журнала отбрасывается.
 
 	:param:
-		table_name: (str) имя таблицы для загрузки
+		table_name: (str) имя таблицы
 	:return:
-		(list[dict]) словарь с данными из целевой таблицы
+		(list[dict]) операции в порядке записи
 	"""
-	filepath = DATA_DIR / f"{table_name}.json"
 	try:
-		with open(filepath, "r", encoding="utf-8") as f:
-			return json.load(f)
+		with open(table_log_path(table_name), "r", encoding="utf-8") as f:
+			lines = f.readlines()
 	except FileNotFoundError:
 		return []
-	except json.JSONDecodeError:
-		print(f"Ошибка: поврежден файл данных {filepath}. Создаю новый.")
-		return []
 
-def save_table_data(table_name: str, data: list[dict]) -> None:
+	entries = []
+	for line in lines:
+		try:
+			entries.append(json.loads(line))
+		except json.JSONDecodeError:
+			print(f"Ошибка: поврежден журнал таблицы {table_name}, "
+															"хвост журнала пропущен.")
+			break
+	return entries
+
+def _replay_log(table_name: str, data: list[Row]) -> tuple[list[Row], int]:
+	"""
+	Применяет журнал таблицы к загруженному снимку.
+
+	Операции идемпотентны (строки адресуются по ID), поэтому повторное применение
+	журнала к уже свёрнутому снимку не меняет результат.
+
+	:param:
+		table_name: (str) имя таблицы
+		data: (list[Row]) записи из снимка
+	:return:
+		(tuple[list[Row], int]) итоговые записи и число применённых операций
+	"""
+	entries = read_table_log(table_name)
+	if not entries:
+		return data, 0
+
+	rows = by_id(data)
+	_apply_log(rows, entries)
+	return list(rows.values()), len(entries)
+
+def _apply_log(rows: dict[int, Row], entries: list[dict]) -> None:
+	"""Применяет операции журнала к записям (Row) по ID."""
+	for entry in entries:
+		match entry["op"]:
+			case "insert":
+				rows[entry["row"]["ID"]] = as_row(entry["row"])
+			case "update":
+				if entry["id"] in rows:
+					rows[entry["id"]] = rows[entry["id"]].replace(entry["set"])
+			case "delete":
+				for row_id in entry["ids"]:
+					rows.pop(row_id, None)
+
+def _read_table(table_name: str, storage: str) -> tuple[list[Row], int]:
+	"""
+	Читает снимок таблицы и применяет к нему журнал под разделяемой блокировкой.
+	Повреждённый снимок откладывается в сторону (см. _set_aside).
+
+	:return: (tuple[list[Row], int]) записи и число применённых операций журнала
+	"""
+	filepath = table_data_path(table_name, storage)
+	with file_lock(table_lock_path(table_name)):
+		metrics.count("bytes_read", _file_size(filepath)
+			+ _file_size(table_log_path(table_name)))
+		try:
+			if storage == "columnar":
+				data = read_columnar(filepath)
+			elif storage == "segmented":
+				data = read_segments(filepath)
+			else:
+				with open(filepath, "r", encoding="utf-8") as f:
+					data = as_rows(json.load(f))
+		except FileNotFoundError:
+			data = []
+		except ValueError:
+			_set_aside(filepath)
+			data = []
+		return _replay_log(table_name, data)
+
+def load_table_data(table_name: str, storage: str = "json",
+                    columns: dict[str, str] | None = None) -> list[Row]:
+	"""
+	Загружает данные таблицы: снимок (JSON или колоночный) плюс операции из журнала.
+	Если файл отсутствует, возвращает пустой список. Слишком длинный журнал
+	сворачивается в новый снимок, если вызывающий код не держит разделяемую
+	блокировку таблицы (иначе свёртка выполнится позже).
+
+	:param:
+		table_name: (str) имя таблицы для загрузки
+		storage: (str) формат хранения снимка: "json", "columnar" или "segmented"
+		columns: (dict[str, str] | None) схема таблицы, нужна для записи
+			колоночного снимка при свёртке журнала
+	:return:
+		(list[Row]) записи таблицы (см. rows.Row)
+	"""
+	with metrics.phase("load"):
+		data, applied = _read_table(table_name, storage)
+	if applied >= LOG_COMPACT_THRESHOLD:
+		mode = lock_mode(table_lock_path(table_name))
+		if mode == "exclusive" and storage != "segmented":
+			save_table_data(table_name, data, storage, columns)
+		elif mode != "shared":
+			# блокировка уже снята: журнал перечитывается под эксклюзивной
+			# (секционированная таблица всегда сворачивается по журналу, чтобы
+			# переписать только затронутые им сегменты)
+			compact_table(table_name, storage, columns)
+	return data
+
+def save_table_data(table_name: str, data: list[dict], storage: str = "json",
+                    columns: dict[str, str] | None = None) -> None:
 	"""
-	Сохраняет данные таблицы в JSON.
+	Сохраняет данные таблицы в JSON, в колоночном двоичном формате или в
+	сегментах (переписываются только сегменты, содержимое которых изменилось).
+	Снимок записывается атомарно под эксклюзивной блокировкой таблицы и содержит
+	полное состояние таблицы, поэтому журнал после записи снимка удаляется.
 
 	:param:
 		table_name: (str) имя таблицы для сохранения
 		data: (list[dict]) данные таблицы
+		storage: (str) формат хранения снимка: "json", "columnar" или "segmented"
+		columns: (dict[str, str] | None) схема таблицы {столбец: тип}; для
+			колоночных форматов без схемы типы определяются по значениям
 	:return:
 		None
 	"""
 	DATA_DIR.mkdir(exist_ok=True)
-	filepath = DATA_DIR / f"{table_name}.json"
+	filepath = table_data_path(table_name, storage)
+
+	with file_lock(table_lock_path(table_name), exclusive=True), metrics.phase("save"):
+		if storage == "segmented":
+			written = write_segments(filepath, columns or _infer_columns(data), data)
+		else:
+			written = write_snapshot(filepath, data, storage, columns)
+		table_log_path(table_name).unlink(missing_ok=True)
+	metrics.count("bytes_written", written)
+
+def write_snapshot(filepath: Path, data: list[dict], storage: str = "json",
+                   columns: dict[str, str] | None = None) -> int:
+	"""
+	Атомарно записывает снимок таблицы в JSON или в колоночном формате в файл
+	filepath (блокировки и журнал - забота вызывающего, см. save_table_data).
+
+	:return: (int) размер записанного файла в байтах
+	"""
+	if storage == "columnar":
+		write_columnar(filepath, columns or _infer_columns(data), data)
+	else:
+		with atomic_write(filepath) as f:
+			json.dump(as_dicts(data), f, indent=4, ensure_ascii=False)
+	return _file_size(filepath)
+
+def _file_size(filepath: Path) -> int:
+	"""Размер файла в байтах, 0 - если файла нет."""
+	try:
+		return os.path.getsize(filepath)
+	except OSError:
+		return 0
+
+def _infer_columns(data: list[dict]) -> dict[str, str]:
+	"""Определяет схему таблицы по значениям первой записи."""
+	if not data:
+		return {"ID": "int"}
+	names = {bool: "bool", int: "int"}
+	return {col: names.get(type(val), "str") for col, val in data[0].items()}
+
+def compact_table(table_name: str, storage: str = "json",
+                  columns: dict[str, str] | None = None) -> None:
+	"""
+	Сворачивает журнал таблицы в снимок. У секционированной таблицы читаются и
+	переписываются только сегменты, которые затрагивает журнал.
+
+	:param:
+		table_name: (str) имя таблицы
+		storage: (str) формат хранения снимка
+		columns: (dict[str, str] | None) схема таблицы
+	:return:
+		None
+	"""
+	with file_lock(table_lock_path(table_name), exclusive=True):
+		if storage == "segmented":
+			_compact_segments(table_name, columns)
+			return
+		data, _ = _read_table(table_name, storage)
+		save_table_data(table_name, data, storage, columns)
+
+def _compact_segments(table_name: str, columns: dict[str, str] | None) -> None:
+	"""Применяет журнал к затронутым им сегментам и удаляет журнал."""
+	with metrics.phase("save"):
+		manifest, written = stage_segment_compaction(table_name, columns)
+		if manifest is not None:
+			publish_manifest(table_data_path(table_name, "segmented"), manifest)
+	metrics.count("bytes_written", written)
+	table_log_path(table_name).unlink(missing_ok=True)
+
+def stage_segment_compaction(table_name: str,
+                             columns: dict[str, str] | None) -> tuple[dict | None, int]:
+	"""
+	Готовит свёртку журнала секционированной таблицы: записывает новые файлы
+	сегментов, которые затрагивает журнал, не публикуя манифест (см.
+	segments.stage_segments).
+
+	:param:
+		table_name: (str) имя таблицы
+		columns: (dict[str, str] | None) схема таблицы
+	:return:
+		(tuple[dict | None, int]) новый манифест (None - журнал пуст) и число
+		записанных байт
+	"""
+	manifest_path = table_data_path(table_name, "segmented")
+	entries = read_table_log(table_name)
+	if not entries:
+		return None, 0
+	segments = touched_segments(entries, read_manifest(manifest_path)["segment_size"])
+	rows = by_id(read_segments(manifest_path, segments))
+	_apply_log(rows, entries)
+	data = list(rows.values())
+	return stage_segments(manifest_path, columns or _infer_columns(data), data,
+		segments)
+
+def convert_table_storage(table_name: str, columns: dict[str, str], source: str,
+                          target: str) -> int:
+	"""
+	Переводит снимок таблицы из одного формата хранения в другой.
+
+	:param:
+		table_name: (str) имя таблицы
+		columns: (dict[str, str]) схема таблицы
+		source: (str) текущий формат хранения
+		target: (str) новый формат хранения
+	:return:
+		(int) количество записей в таблице
+	"""
+	with file_lock(table_lock_path(table_name), exclusive=True):
+		data, _ = _read_table(table_name, source)
+		save_table_data(table_name, data, target, columns)
+		if source != target:
+			_remove_snapshot(table_name, source)
+	return len(data)
+
+def _remove_snapshot(table_name: str, storage: str) -> None:
+	"""Удаляет снимок таблицы в формате storage (файл или каталог сегментов)."""
+	filepath = table_data_path(table_name, storage)
+	if storage == "segmented":
+		shutil.rmtree(filepath.parent, ignore_errors=True)
+	else:
+		filepath.unlink(missing_ok=True)
+
+def remove_table_files(table_name: str) -> None:
+	"""
+	Удаляет снимки и журнал таблицы с диска. Файл блокировки остаётся: другие
+	процессы могут ждать на нём.
+
+	:param:
+		table_name: (str) имя таблицы
+	:return:
+		None
+	"""
+	with file_lock(table_lock_path(table_name), exclusive=True):
+		for storage in STORAGE_FORMATS:
+			_remove_snapshot(table_name, storage)
+		table_log_path(table_name).unlink(missing_ok=True)
+
+def _file_format(filepath: str) -> str:
+	"""Определяет формат файла обмена данными по расширению."""
+	suffix = Path(filepath).suffix.lower()
+	if suffix not in (".csv", ".jsonl"):
+		raise ValueError(f"неподдерживаемый формат файла {filepath}, "
+															"ожидается .csv или .jsonl")
+	return suffix
+
+def iter_file_records(filepath: str) -> Iterator[dict]:
+	"""
+	Построчно читает записи из CSV (первая строка - заголовок) или JSON Lines,
+	не загружая файл целиком.
+
+	:param:
+		filepath: (str) путь до файла .csv или .jsonl
+	:return:
+		(Iterator[dict]) записи файла
+	"""
+	file_format = _file_format(filepath)
+	with open(filepath, "r", encoding="utf-8", newline="") as f:
+		if file_format == ".csv":
+			yield from csv.DictReader(f)
+			return
+		for number, line in enumerate(f, start=1):
+			if not line.strip():
+				continue
+			try:
+				yield json.loads(line)
+			except json.JSONDecodeError:
+				raise ValueError(f"строка {number} файла {filepath} не является JSON")
+
+def write_file_records(filepath: str, columns: list[str],
+                       rows: Iterable[dict]) -> int:
+	"""
+	Построчно записывает записи в CSV (с заголовком) или JSON Lines. Файл
+	появляется целиком после окончания записи (см. atomic_write).
+
+	:param:
+		filepath: (str) путь до файла .csv или .jsonl
+		columns: (list[str]) столбцы в порядке вывода
+		rows: (Iterable[dict]) записи
+	:return:
+		(int) количество записанных записей
+	"""
+	file_format = _file_format(filepath)
+	count = 0
+	with atomic_write(filepath, newline="") as f:
+		if file_format == ".csv":
+			writer = csv.writer(f)
+			writer.writerow(columns)
+			for row in rows:
+				writer.writerow([row.get(col) for col in columns])
+				count += 1
+		else:
+			for row in rows:
+				record = {col: row.get(col) for col in columns}
+				f.write(json.dumps(record, ensure_ascii=False) + "\n")
+				count += 1
+	return count
 
-	with open(filepath, "w", encoding="utf-8") as f:
-		json.dump(data, f, indent=4, ensure_ascii=False)
\ No newline at end of file
+def convert_value(val: Any, expected_type: str) -> Any:
+	"""
+	Приводит значение к типу столбца по правилам insert.
+
+	:param val: значение из команды или из импортируемого файла
+	:param expected_type: (str) тип столбца: "int", "str" или "bool"
+	:return: значение нужного типа
+	:raises ValueError: если значение нельзя привести к типу
+	"""
+	if expected_type == "int":
+		if isinstance(val, bool):
+			raise ValueError(f"некорректное значение {val} для типа int")
+		return int(val)
+	if expected_type == "bool":
+		if isinstance(val, bool):
+			return val
+		return str(val).lower() == "true"
+	return str(val).strip('"').strip("'")
+
+def split_command(user_input: str) -> list[str]:
+	"""
+	Разбивает команду на слова по правилам shlex.split. Команды без обратной
+	косой черты разбираются регулярным выражением, что заметно быстрее shlex
+	при выполнении длинных скриптов.
+
+	:param user_input: (str) введённая команда
+	:return: (list[str]) слова команды без кавычек
+	:raises ValueError: если кавычки не закрыты
+	"""
+	if "\\" in user_input or not _COMMAND.fullmatch(user_input):
+		return shlex.split(user_input)
+	return [_QUOTED.sub(lambda m: m.group(1) or m.group(2) or "", word)
+		if '"' in word or "'" in word else word
+		for word in _WORDS.findall(user_input)]
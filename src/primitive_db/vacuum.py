@@ -0,0 +1,433 @@
+import os
+import queue
+import threading
+import time
+from collections.abc import Iterator
+from pathlib import Path
+
+from src.primitive_db.constants import (
+	COLUMNAR_SUFFIX,
+	DATA_DIR,
+	DB_INDEX_FILE,
+	DB_META_FILE,
+	FSYNC_WRITES,
+	LOG_SUFFIX,
+	SEGMENT_SUFFIX,
+	VACUUM_INTERVAL,
+	VACUUM_LOG_BYTES,
+	VACUUM_THROTTLE,
+)
+from src.primitive_db.files import file_lock, file_signature, fsync_dir
+from src.primitive_db.indexes import HashIndex, build_index
+from src.primitive_db.metrics import metrics
+from src.primitive_db.rows import Row, by_id, id_of
+from src.primitive_db.segments import (
+	publish_manifest,
+	read_manifest,
+	remove_stale_segments,
+)
+from src.primitive_db.utils import (
+	load_metadata,
+	load_table_data,
+	metadata_lock_path,
+	save_metadata,
+	stage_segment_compaction,
+	table_data_path,
+	table_lock_path,
+	table_log_path,
+	write_snapshot,
+)
+
+# Суффикс снимка, который очистка готовит рядом с текущим: <файл>.<pid>.vacuum
+_STAGED_SUFFIX = ".vacuum"
+# Суффиксы файлов таблиц в DATA_DIR (см. remove_orphans)
+_TABLE_SUFFIXES = (".json", COLUMNAR_SUFFIX, LOG_SUFFIX, SEGMENT_SUFFIX)
+# Сколько раз очистка повторяется, если таблицу меняют во время неё
+_ATTEMPTS = 3
+
+
+class VacuumResult:
+	"""
+	Итог очистки таблицы (см. vacuum_table).
+
+	before и after - подписи файлов таблицы (как TableStore._table_signature) до
+	и после очистки, after = None - таблицу меняли во время очистки и она
+	отложена. rows и indexes - записи по ID в порядке ID и построенные по ним
+	индексы (у секционированной таблицы - None). Для table = None - итог уборки
+	файлов удалённых таблиц.
+	"""
+
+	__slots__ = ("table", "before", "after", "rows", "indexes", "count",
+		"reclaimed", "requested", "error")
+
+	def __init__(self, table: str | None, before: tuple | None = None,
+			after: tuple | None = None, rows: dict[int, Row] | None = None,
+			indexes: dict[str, HashIndex] | None = None, count: int = 0,
+			reclaimed: int = 0, error: str | None = None) -> None:
+		self.table = table
+		self.before = before
+		self.after = after
+		self.rows = rows
+		self.indexes = indexes
+		self.count = count
+		self.reclaimed = reclaimed
+		self.requested = False
+		self.error = error
+
+
+def _storage_size(table_name: str, storage: str) -> int:
+	"""Размер файлов таблицы на диске: снимок (или сегменты) и журнал."""
+	paths = [table_log_path(table_name)]
+	if storage == "segmented":
+		paths.extend(table_data_path(table_name, storage).parent.glob("*"))
+	else:
+		paths.append(table_data_path(table_name, storage))
+	size = 0
+	for path in paths:
+		try:
+			size += os.path.getsize(path)
+		except OSError:
+			pass
+	return size
+
+
+def _schema(entry: dict) -> tuple[str, dict[str, str]]:
+	"""Формат хранения и схема таблицы по её описанию в метаданных."""
+	if not isinstance(entry.get("columns"), dict):
+		# описание старого формата: {столбец: тип}
+		return "json", entry
+	return entry.get("storage", "json"), entry["columns"]
+
+
+def _refresh_metadata(meta_file: Path, table_name: str, storage: str, count: int,
+		last_id: int) -> None:
+	"""Записывает в метаданные число записей таблицы и уточняет счётчик next_id."""
+	with file_lock(metadata_lock_path(meta_file), exclusive=True):
+		metadata = load_metadata(meta_file)
+		entry = metadata.get(table_name)
+		if (not isinstance(entry, dict) or not isinstance(entry.get("columns"), dict)
+				or entry.get("storage", "json") != storage):
+			return
+		next_id = max(entry.get("next_id", 1), last_id + 1)
+		if entry.get("rows") != count or entry.get("next_id") != next_id:
+			entry["rows"] = count
+			entry["next_id"] = next_id
+			save_metadata(meta_file, metadata)
+
+
+def _vacuum_once(table_name: str, storage: str, columns: dict[str, str],
+		definitions: dict[str, str], meta_file: Path) -> VacuumResult:
+	"""Одна попытка очистки таблицы (см. vacuum_table)."""
+	data_path = table_data_path(table_name, storage)
+	log_path = table_log_path(table_name)
+	lock_path = table_lock_path(table_name)
+	staged = None
+	rows = None
+	# новый снимок готовится под разделяемой блокировкой: select не ждут
+	with file_lock(lock_path):
+		before = file_signature(data_path, log_path)
+		size = _storage_size(table_name, storage)
+		if storage == "segmented":
+			staged, _ = stage_segment_compaction(table_name, columns)
+		else:
+			loaded = load_table_data(table_name, storage, columns)
+			rows = sorted(loaded, key=id_of)
+			if log_path.exists() or rows != loaded:
+				staged = Path(f"{data_path}.{os.getpid()}{_STAGED_SUFFIX}")
+				write_snapshot(staged, rows, storage, columns)
+
+	# под эксклюзивной - только подмена файлов, если таблицу не успели изменить
+	with file_lock(lock_path, exclusive=True):
+		if file_signature(data_path, log_path) != before:
+			if isinstance(staged, Path):
+				staged.unlink(missing_ok=True)
+			return VacuumResult(table_name, before)
+		if storage == "segmented":
+			manifest = staged
+			if manifest is not None:
+				publish_manifest(data_path, manifest)
+			elif data_path.exists():
+				manifest = read_manifest(data_path)
+				remove_stale_segments(data_path.parent, manifest)
+			stats = manifest["segments"].values() if manifest is not None else ()
+			count = sum(segment["rows"] for segment in stats)
+			last_id = max((segment["max_id"] for segment in stats), default=0)
+		else:
+			if staged is not None:
+				os.replace(staged, data_path)
+				if FSYNC_WRITES:
+					fsync_dir(data_path.parent)
+			count = len(rows)
+			last_id = id_of(rows[-1]) if rows else 0
+		log_path.unlink(missing_ok=True)
+		after = file_signature(data_path, log_path)
+		reclaimed = size - _storage_size(table_name, storage)
+
+	_refresh_metadata(meta_file, table_name, storage, count, last_id)
+	indexes = None
+	if rows is not None:
+		rows = by_id(rows)
+		indexes = {column: build_index(kind, column, rows.values())
+			for column, kind in definitions.items()}
+	return VacuumResult(table_name, before, after, rows, indexes, count, reclaimed)
+
+
+def vacuum_table(table_name: str, meta_file: Path = DB_META_FILE,
+		index_file: Path = DB_INDEX_FILE) -> VacuumResult | None:
+	"""
+	Очищает таблицу: сворачивает журнал в снимок, упорядочивает записи по ID,
+	у секционированной таблицы удаляет файлы прежних версий сегментов, строит
+	индексы по описаниям и обновляет число записей и next_id в метаданных.
+
+	Новый снимок готовится под разделяемой блокировкой таблицы, поэтому чтение
+	таблицы очистка не останавливает, а эксклюзивная блокировка нужна только на
+	подмену файлов. Если таблицу за это время изменили, подготовленное
+	отбрасывается и очистка повторяется (до _ATTEMPTS раз).
+
+	:param table_name: (str) имя таблицы
+	:param meta_file: (Path) файл метаданных
+	:param index_file: (Path) файл описаний индексов
+	:return: (VacuumResult | None) итог, None - таблицы нет
+	"""
+	entry = load_metadata(meta_file).get(table_name)
+	if not isinstance(entry, dict):
+		return None
+	storage, columns = _schema(entry)
+	definitions = load_metadata(index_file).get(table_name, {})
+	with metrics.phase("vacuum"):
+		try:
+			for _ in range(_ATTEMPTS):
+				result = _vacuum_once(table_name, storage, columns, definitions,
+					meta_file)
+				if result.after is not None:
+					break
+		except (OSError, ValueError) as e:
+			metrics.count("vacuum_errors")
+			return VacuumResult(table_name, error=str(e))
+	if result.after is not None:
+		metrics.count("vacuum_tables")
+		metrics.count("vacuum_bytes_reclaimed", max(result.reclaimed, 0))
+	return result
+
+
+def _table_of(name: str) -> str | None:
+	"""Имя таблицы по имени её файла в DATA_DIR, None - это не файл таблицы."""
+	for suffix in _TABLE_SUFFIXES:
+		if name.endswith(suffix):
+			return name[:-len(suffix)]
+	return None
+
+
+def _process_alive(pid: int) -> bool:
+	try:
+		os.kill(pid, 0)
+	except ProcessLookupError:
+		return False
+	except (PermissionError, OSError):
+		pass
+	return True
+
+
+def _remove(path: Path) -> int:
+	"""Удаляет файл или каталог (сегменты) и возвращает освобождённые байты."""
+	if path.is_dir():
+		removed = sum(_remove(child) for child in path.iterdir())
+		path.rmdir()
+		return removed
+	size = path.stat().st_size
+	path.unlink(missing_ok=True)
+	return size
+
+
+def remove_leftovers() -> int:
+	"""
+	Удаляет файлы, которые не дописали завершившиеся процессы: временные файлы
+	атомарной записи (<файл>.<pid>.tmp, см. files.atomic_write) и снимки
+	прерванной очистки (<файл>.<pid>.vacuum). По pid в имени видно, что файл
+	ничей, поэтому так можно убирать и файлы таблиц других баз в DATA_DIR.
+
+	:return: (int) размер удалённых файлов в байтах
+	"""
+	if not DATA_DIR.exists():
+		return 0
+	removed = 0
+	for path in [*DATA_DIR.glob("*.tmp"), *DATA_DIR.glob(f"*{_STAGED_SUFFIX}"),
+			*DATA_DIR.glob(f"*{SEGMENT_SUFFIX}/*.tmp")]:
+		pid = path.suffixes[-2].lstrip(".") if len(path.suffixes) > 1 else ""
+		if pid.isdigit() and not _process_alive(int(pid)):
+			removed += _remove(path)
+	metrics.count("vacuum_bytes_reclaimed", removed)
+	return removed
+
+
+def remove_orphans(meta_file: Path = DB_META_FILE,
+		index_file: Path = DB_INDEX_FILE) -> int:
+	"""
+	Удаляет файлы таблиц, которых нет в метаданных meta_file (их подхватила бы
+	новая таблица с тем же именем), и описания индексов таких таблиц в
+	index_file. Файлы таблицы удаляются под её эксклюзивной блокировкой.
+
+	DATA_DIR общий для всех файлов метаданных, а чьи в нём файлы, нигде не
+	записано: таблицы базы с другим meta_file (например, TableStore с
+	собственными метаданными) для этой базы тоже «лишние». Поэтому очистка
+	вызывает функцию только по явному запросу (vacuum orphans=yes).
+
+	:return: (int) размер удалённых файлов в байтах
+	"""
+	if not DATA_DIR.exists():
+		return 0
+	removed = 0
+	for path in sorted(DATA_DIR.iterdir()):
+		table_name = _table_of(path.name)
+		if table_name is None:
+			continue
+		with file_lock(table_lock_path(table_name), exclusive=True):
+			if path.exists() and table_name not in load_metadata(meta_file):
+				removed += _remove(path)
+
+	metadata = load_metadata(meta_file)
+	index_metadata = load_metadata(index_file)
+	stale = [table_name for table_name in index_metadata
+		if table_name not in metadata]
+	if stale:
+		for table_name in stale:
+			del index_metadata[table_name]
+		save_metadata(index_file, index_metadata)
+	metrics.count("vacuum_bytes_reclaimed", removed)
+	return removed
+
+
+def vacuum(table_name: str | None = None, meta_file: Path = DB_META_FILE,
+		index_file: Path = DB_INDEX_FILE, orphans: bool = False
+		) -> Iterator[VacuumResult]:
+	"""
+	Очищает таблицу или, без имени, все таблицы и недописанные файлы
+	завершившихся процессов (см. remove_leftovers).
+
+	:param table_name: (str | None) имя таблицы, None - вся база
+	:param orphans: (bool) удалить и файлы таблиц, которых нет в метаданных
+		(см. remove_orphans), только для всей базы
+	:return: (Iterator[VacuumResult]) итоги по таблицам по мере очистки
+	"""
+	names = [table_name] if table_name is not None else list(load_metadata(meta_file))
+	for name in names:
+		result = vacuum_table(name, meta_file, index_file)
+		if result is not None:
+			yield result
+	if table_name is None:
+		reclaimed = remove_leftovers()
+		if orphans:
+			reclaimed += remove_orphans(meta_file, index_file)
+		yield VacuumResult(None, reclaimed=reclaimed)
+
+
+class VacuumWorker:
+	"""
+	Фоновый поток очистки таблиц (см. vacuum_table).
+
+	Таблицы очищаются по запросу (request - команда vacuum, schedule - свёртка
+	журналов, которую TableStore откладывает из потока команд) и сами: раз в
+	interval секунд - те, чей журнал вырос до log_bytes байт. После каждой
+	таблицы поток ждёт throttle × длительность её очистки, поэтому занимает
+	не больше 1 / (1 + throttle) времени.
+
+	Поток не трогает TableStore: итоги забирает поток команд (results) и
+	передаёт хранилищу (TableStore.vacuumed), которое по ним понимает, что
+	таблицу в памяти перечитывать не нужно.
+	"""
+
+	def __init__(self, meta_file: Path = DB_META_FILE,
+			index_file: Path = DB_INDEX_FILE, interval: float = VACUUM_INTERVAL,
+			log_bytes: int = VACUUM_LOG_BYTES,
+			throttle: float = VACUUM_THROTTLE) -> None:
+		self.meta_file = meta_file
+		self.index_file = index_file
+		self.interval = interval
+		self.log_bytes = log_bytes
+		self.throttle = throttle
+		self._requests: queue.Queue = queue.Queue()
+		self._results: queue.Queue = queue.Queue()
+		self._stopping = threading.Event()
+		self._thread = threading.Thread(target=self._run, name="db-vacuum",
+			daemon=True)
+		self._thread.start()
+
+	def request(self, table_name: str | None = None, orphans: bool = False) -> None:
+		"""
+		Ставит в очередь очистку таблицы (None - всей базы, orphans - см.
+		vacuum); её итог попадёт в results с requested = True.
+		"""
+		self._requests.put(((table_name, orphans), True))
+
+	def schedule(self, table_names: set[str]) -> None:
+		"""Ставит в очередь свёртку журналов таблиц без отчёта о ней."""
+		for table_name in table_names:
+			self._requests.put(((table_name, False), False))
+
+	def results(self) -> list[VacuumResult]:
+		"""Забирает итоги очистки, накопленные с прошлого вызова."""
+		results = []
+		while True:
+			try:
+				results.append(self._results.get_nowait())
+			except queue.Empty:
+				return results
+
+	def close(self) -> None:
+		"""Останавливает поток, дождавшись очистки текущей таблицы."""
+		self._stopping.set()
+		self._requests.put(None)
+		self._thread.join()
+
+	def _due(self) -> list[str]:
+		"""Таблицы, журнал которых дорос до log_bytes."""
+		due = []
+		for table_name in load_metadata(self.meta_file):
+			try:
+				if os.path.getsize(table_log_path(table_name)) >= self.log_bytes:
+					due.append(table_name)
+			except OSError:
+				pass
+		return due
+
+	def _pending(self) -> dict[tuple[str | None, bool], bool] | None:
+		"""
+		Ждёт запросов до interval секунд и забирает все накопившиеся (повторные
+		запросы одной таблицы объединяются). None - поток останавливают.
+
+		:return: {(таблица, orphans): requested} или None
+		"""
+		try:
+			item = self._requests.get(timeout=self.interval)
+		except queue.Empty:
+			return {(table_name, False): False for table_name in self._due()}
+		pending: dict[tuple[str | None, bool], bool] = {}
+		while item is not None:
+			target, requested = item
+			pending[target] = pending.get(target, False) or requested
+			try:
+				item = self._requests.get_nowait()
+			except queue.Empty:
+				return pending
+		return None
+
+	def _run(self) -> None:
+		while not self._stopping.is_set():
+			pending = self._pending()
+			if pending is None:
+				return
+			for (table_name, orphans), requested in pending.items():
+				if self._stopping.is_set():
+					return
+				start = time.monotonic()
+				try:
+					for result in vacuum(table_name, self.meta_file, self.index_file,
+							orphans):
+						result.requested = requested
+						self._results.put(result)
+				except (OSError, ValueError) as e:
+					# поток очистки не должен падать: таблица очистится в другой раз
+					result = VacuumResult(table_name, error=str(e))
+					result.requested = requested
+					self._results.put(result)
+				self._stopping.wait((time.monotonic() - start) * self.throttle)
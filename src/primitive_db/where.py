@@ -0,0 +1,283 @@
+import operator
+from collections.abc import Iterable, Iterator, Mapping
+from typing import Any, Callable
+
+from src.primitive_db.indexes import HashIndex, SortedIndex
+from src.primitive_db.metrics import metrics
+from src.primitive_db.parallel import parallel_scan, use_parallel_scan
+from src.primitive_db.rows import column_getter, id_of
+from src.primitive_db.segments import SegmentedTable
+from src.primitive_db.utils import convert_value
+
+_OPERATORS = {
+	"=": operator.eq,
+	"!=": operator.ne,
+	"<": operator.lt,
+	"<=": operator.le,
+	">": operator.gt,
+	">=": operator.ge,
+}
+
+
+class Condition:
+	"""
+	Разобранное условие WHERE.
+
+	Значения в условии уже приведены к типам столбцов, а само условие один раз
+	скомпилировано в функцию matches(row) -> bool, поэтому при проверке записей
+	ничего не преобразуется в строки, а значения читаются из записей Row без
+	обращения по имени (см. rows.column_getter). Дерево условия (кортежи) служит
+	ключом кэша.
+
+	Узлы дерева:
+		("cmp", столбец, оператор, значение)
+		("in", столбец, (значение, ...))
+		("between", столбец, от, до)
+		("and", узел, узел, ...) / ("or", узел, узел, ...)
+	"""
+
+	def __init__(self, tree: tuple) -> None:
+		self.tree = tree
+		self.matches = _compile(tree)
+
+	def __repr__(self) -> str:
+		return f"Condition({self.tree!r})"
+
+
+def parse_condition(tokens: list[str], columns: dict[str, str]) -> Condition:
+	"""
+	Разбирает условие WHERE вида
+	<столбец> <оп> <значение> [and|or ...], где <оп> - один из =, !=, <, <=, >, >=,
+	а также <столбец> in (<значение>, ...) и <столбец> between <от> and <до>.
+	AND связывает сильнее OR.
+
+	:param tokens: (list[str]) условие, разбитое на слова
+	:param columns: (dict[str, str]) схема таблицы {столбец: тип}
+	:return: (Condition) скомпилированное условие
+	:raises ValueError: если условие некорректно
+	"""
+	with metrics.phase("parse"):
+		parser = _Parser(tokens, columns)
+		tree = parser.parse_or()
+		if parser.pos != len(tokens):
+			raise ValueError(f"лишние слова в условии: {' '.join(tokens[parser.pos:])}")
+		return Condition(tree)
+
+
+class _Parser:
+	"""Рекурсивный разбор условия по словам."""
+
+	def __init__(self, tokens: list[str], columns: dict[str, str]) -> None:
+		self.tokens = tokens
+		self.columns = columns
+		self.pos = 0
+
+	def _peek(self) -> str | None:
+		return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+	def _next(self) -> str:
+		token = self._peek()
+		if token is None:
+			raise ValueError("условие оборвано")
+		self.pos += 1
+		return token
+
+	def _keyword(self, word: str) -> bool:
+		token = self._peek()
+		if token is not None and token.lower() == word:
+			self.pos += 1
+			return True
+		return False
+
+	def _value(self, column: str, raw: str) -> Any:
+		try:
+			return convert_value(raw, self.columns[column])
+		except ValueError:
+			raise ValueError(f"значение {raw} не подходит для "
+													f"{column}:{self.columns[column]}")
+
+	def parse_or(self) -> tuple:
+		nodes = [self.parse_and()]
+		while self._keyword("or"):
+			nodes.append(self.parse_and())
+		return nodes[0] if len(nodes) == 1 else ("or", *nodes)
+
+	def parse_and(self) -> tuple:
+		nodes = [self.parse_predicate()]
+		while self._keyword("and"):
+			nodes.append(self.parse_predicate())
+		return nodes[0] if len(nodes) == 1 else ("and", *nodes)
+
+	def parse_predicate(self) -> tuple:
+		column = self._next()
+		if column not in self.columns:
+			raise ValueError(f"столбца '{column}' не существует")
+
+		if self._keyword("in"):
+			return ("in", column, tuple(self._value(column, raw)
+												for raw in self._in_list()))
+		if self._keyword("between"):
+			low = self._value(column, self._next())
+			if not self._keyword("and"):
+				raise ValueError("ожидается and в between")
+			return ("between", column, low, self._value(column, self._next()))
+
+		op = self._next()
+		if op not in _OPERATORS:
+			raise ValueError(f"неизвестный оператор {op}")
+		return ("cmp", column, op, self._value(column, self._next()))
+
+	def _in_list(self) -> list[str]:
+		"""Собирает значения списка (a, b, c), записанного в одно или несколько слов."""
+		parts = []
+		while True:
+			token = self._next()
+			parts.append(token)
+			if token.endswith(")"):
+				break
+		text = " ".join(parts)
+		if not text.startswith("("):
+			raise ValueError("список in должен быть в скобках")
+		values = [value.strip() for value in text[1:-1].split(",")]
+		if not all(values):
+			raise ValueError("пустое значение в списке in")
+		return values
+
+
+def _compile(tree: tuple) -> Callable[[Mapping], bool]:
+	"""Превращает дерево условия в функцию проверки записи (Row)."""
+	kind = tree[0]
+	if kind == "cmp":
+		_, column, op, value = tree
+		compare = _OPERATORS[op]
+		get = column_getter(column)
+		return lambda row: compare(get(row), value)
+	if kind == "in":
+		values = frozenset(tree[2])
+		get = column_getter(tree[1])
+		return lambda row: get(row) in values
+	if kind == "between":
+		_, column, low, high = tree
+		get = column_getter(column)
+		return lambda row: low <= get(row) <= high
+
+	children = [_compile(node) for node in tree[1:]]
+	if kind == "and":
+		def match_all(row: Mapping) -> bool:
+			for child in children:
+				if not child(row):
+					return False
+			return True
+		return match_all
+
+	def match_any(row: Mapping) -> bool:
+		for child in children:
+			if child(row):
+				return True
+		return False
+	return match_any
+
+
+def _candidates(tree: tuple, table_data: Mapping[int, dict],
+                indexes: dict[str, HashIndex]) -> list[dict] | None:
+	"""
+	Подбирает записи-кандидаты по первичному ключу и индексам.
+	Возвращает None, если без полного просмотра таблицы не обойтись.
+	"""
+	kind = tree[0]
+	if kind in ("and", "or"):
+		found = [_candidates(node, table_data, indexes) for node in tree[1:]]
+		if kind == "and":
+			# достаточно одного условия, которое можно выполнить по индексу
+			return min((rows for rows in found if rows is not None), key=len,
+																	default=None)
+		if any(rows is None for rows in found):
+			return None
+		merged = {}
+		for rows in found:
+			for row in rows:
+				merged[id_of(row)] = row
+		return list(merged.values())
+
+	column = tree[1]
+	if kind == "cmp" and tree[2] == "=":
+		values = (tree[3],)
+	elif kind == "in":
+		values = tree[2]
+	else:
+		values = None
+
+	if values is not None and column == "ID":
+		return [table_data[value] for value in values if value in table_data]
+
+	index = indexes.get(column)
+	if index is None:
+		return None
+	if values is not None:
+		return [row for value in values for row in index.lookup(value)]
+	if not isinstance(index, SortedIndex):
+		return None
+	if kind == "between":
+		return index.range(tree[2], tree[3])
+	op, value = tree[2], tree[3]
+	if op in ("<", "<="):
+		return index.range(high=value, include_high=op == "<=")
+	if op in (">", ">="):
+		return index.range(low=value, include_low=op == ">=")
+	return None
+
+
+def _scan(rows: Iterable[dict], matches: Callable[[Mapping], bool]) -> Iterator[dict]:
+	"""Просмотр записей; число просмотренных записей идёт в метрики."""
+	scanned = 0
+	try:
+		for row in rows:
+			scanned += 1
+			if matches(row):
+				yield row
+	finally:
+		metrics.count("rows_scanned", scanned)
+
+
+def iter_rows(table_data: Mapping[int, dict], condition: Condition,
+              indexes: dict[str, HashIndex] | None = None) -> Iterator[dict]:
+	"""
+	Перебирает записи, удовлетворяющие условию, в порядке ID.
+
+	Равенство и IN по ID выполняются поиском по первичному ключу, равенство
+	и IN по столбцу с индексом - поиском в индексе, сравнения и BETWEEN - по
+	упорядоченному индексу. Если индекс не подходит, таблица просматривается,
+	и записи выдаются по мере нахождения; большие колоночные таблицы (от
+	PARALLEL_SCAN_THRESHOLD записей) просматриваются частями в пуле процессов.
+	У секционированной таблицы не просматриваются сегменты, которые по
+	минимумам и максимумам столбцов не могут содержать подходящих записей.
+
+	:param table_data: (Mapping[int, dict]) записи таблицы по ID
+	:param condition: (Condition) условие
+	:param indexes: (dict[str, HashIndex] | None) индексы таблицы
+	:return: (Iterator[dict]) подходящие записи
+	"""
+	candidates = _candidates(condition.tree, table_data, indexes or {})
+	matches = condition.matches
+	if candidates is None:
+		if isinstance(table_data, SegmentedTable):
+			return _scan(table_data.scan(condition.tree), matches)
+		if use_parallel_scan(table_data):
+			return parallel_scan(table_data, condition.tree, matches)
+		return _scan(table_data.values(), matches)
+	metrics.count("rows_scanned", len(candidates))
+	rows = {id_of(row): row for row in candidates if matches(row)}
+	return (rows[row_id] for row_id in sorted(rows))
+
+
+def find_rows(table_data: Mapping[int, dict], condition: Condition,
+              indexes: dict[str, HashIndex] | None = None) -> list[dict]:
+	"""
+	Находит записи, удовлетворяющие условию, в порядке ID (см. iter_rows).
+
+	:param table_data: (Mapping[int, dict]) записи таблицы по ID
+	:param condition: (Condition) условие
+	:param indexes: (dict[str, HashIndex] | None) индексы таблицы
+	:return: (list[dict]) подходящие записи
+	"""
+	return list(iter_rows(table_data, condition, indexes))
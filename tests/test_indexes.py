@@ -0,0 +1,47 @@
+import random
+import unittest
+
+from src.primitive_db.indexes import SortedIndex
+from src.primitive_db.rows import as_row
+
+# Сколько записей в индексе: построение по одной записи заняло бы минуты
+_ROWS = 300_000
+
+
+class SortedIndexTest(unittest.TestCase):
+
+	def setUp(self) -> None:
+		generator = random.Random(7)
+		self.rows = [as_row({"ID": row_id, "n": generator.randrange(1000)})
+			for row_id in range(1, _ROWS + 1)]
+		self.index = SortedIndex("n", self.rows)
+
+	def _expected(self, low: int, high: int) -> list[int]:
+		rows = sorted((row for row in self.rows if low <= row["n"] <= high),
+			key=lambda row: (row["n"], row["ID"]))
+		return [row["ID"] for row in rows]
+
+	def _range(self, *args, **kwargs) -> list[int]:
+		return [row["ID"] for row in self.index.range(*args, **kwargs)]
+
+	def test_build_range(self) -> None:
+		self.assertEqual(self._range(100, 200), self._expected(100, 200))
+		self.assertEqual(self._range(high=5), self._expected(0, 5))
+		self.assertEqual(self._range(low=995), self._expected(995, 999))
+		self.assertEqual(self._range(500, 500, include_low=False), [])
+		self.assertEqual(len(self._range()), _ROWS)
+		self.assertEqual([row["ID"] for row in self.index.lookup(42)],
+			[row["ID"] for row in self.rows if row["n"] == 42])
+
+	def test_add_and_remove_after_build(self) -> None:
+		row = as_row({"ID": _ROWS + 1, "n": 300})
+		self.index.add(row)
+		self.rows.append(row)
+		self.index.remove(self.rows[0])
+		removed = self.rows.pop(0)
+		self.assertEqual(self._range(250, 350), self._expected(250, 350))
+		self.assertNotIn(removed["ID"], self._range())
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,175 @@
+import json
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from src.primitive_db import store as store_module
+from src.primitive_db import utils
+from src.primitive_db.api import Database
+from src.primitive_db.journal import CommitJournal
+from src.primitive_db.store import TableStore
+from src.primitive_db.utils import encode_log_entries, load_metadata, table_log_path
+
+# Сколько потоков одновременно фиксируют изменения
+_THREADS = 8
+
+
+class _SlowJournal(CommitJournal):
+	"""
+	Журнал, который медленно пишет на диск и запоминает размеры групп: пока
+	пишет ведущий, остальные транзакции успевают встать в очередь.
+	"""
+
+	def __init__(self, path: Path) -> None:
+		super().__init__(path)
+		self.groups: list[int] = []
+
+	def _write(self, group: list) -> None:
+		time.sleep(0.05)
+		self.groups.append(len(group))
+		super()._write(group)
+
+
+class JournalTestCase(unittest.TestCase):
+	"""Каталог данных и журнал фиксации во временном каталоге."""
+
+	def setUp(self) -> None:
+		tmp = tempfile.TemporaryDirectory()
+		self.addCleanup(tmp.cleanup)
+		self.root = Path(tmp.name)
+		self.data_dir = self.root / "data"
+		self.data_dir.mkdir()
+		self.meta_file = self.root / "db_meta.json"
+		self.index_file = self.root / "db_indexes.json"
+		self.journal = _SlowJournal(self.data_dir / "commit.journal")
+		for patcher in (mock.patch.object(utils, "DATA_DIR", self.data_dir),
+				mock.patch.object(store_module, "commit_journal",
+					lambda: self.journal)):
+			patcher.start()
+			self.addCleanup(patcher.stop)
+
+	def _run_threads(self, target) -> None:
+		barrier = threading.Barrier(_THREADS)
+
+		def run(number: int) -> None:
+			barrier.wait()
+			target(number)
+
+		threads = [threading.Thread(target=run, args=(number,))
+			for number in range(_THREADS)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+
+
+class GroupCommitTest(JournalTestCase):
+
+	def test_concurrent_commits_share_a_flush(self) -> None:
+		def commit(number: int) -> None:
+			self.journal.commit({f"t{number}": [{"op": "delete", "ids": [number]}]}, {})
+
+		self._run_threads(commit)
+
+		self.assertEqual(sum(self.journal.groups), _THREADS)
+		self.assertLess(len(self.journal.groups), _THREADS)
+		for number in range(_THREADS):
+			self.assertEqual(table_log_path(f"t{number}").read_bytes(),
+				encode_log_entries([{"op": "delete", "ids": [number]}]))
+		self.assertEqual(self.journal.path.read_bytes(), b"")
+
+	def test_database_transactions_share_a_flush(self) -> None:
+		db = Database(TableStore(self.meta_file, self.index_file))
+		db.create_table("accounts", {"owner": "str", "balance": "int"})
+		db.create_table("transfers", {"owner": "str", "amount": "int"})
+		db.insert_many("accounts", [(f"u{number}", 100) for number in range(_THREADS)])
+		self.journal.groups.clear()
+		results = {}
+
+		def transfer(number: int) -> None:
+			with db.transaction() as tx:
+				tx.update("accounts", {"balance": 100 - number},
+					where=f"owner = u{number}")
+				tx.insert("transfers", [f"u{number}", number])
+			results[number] = tx.results
+
+		self._run_threads(transfer)
+		db.close()
+
+		self.assertLess(len(self.journal.groups), _THREADS)
+		for number in range(_THREADS):
+			self.assertEqual(results[number][0], 1)
+		with Database(TableStore(self.meta_file, self.index_file)) as reopened:
+			balances = {row["owner"]: row["balance"]
+				for row in reopened.select("accounts")}
+			self.assertEqual(balances,
+				{f"u{number}": 100 - number for number in range(_THREADS)})
+			self.assertEqual(reopened.count("transfers"), _THREADS)
+
+	def test_failed_transaction_changes_nothing(self) -> None:
+		with Database(TableStore(self.meta_file, self.index_file)) as db:
+			db.create_table("accounts", {"owner": "str", "balance": "int"})
+			db.insert("accounts", ["a", 1])
+			with self.assertRaises(RuntimeError):
+				with db.transaction() as tx:
+					tx.insert("accounts", ["b", 2])
+					raise RuntimeError
+			with self.assertRaises(Exception):
+				with db.transaction() as tx:
+					tx.insert("accounts", ["c", 3])
+					tx.delete("missing")
+			self.assertEqual([row["owner"] for row in db.select("accounts")], ["a"])
+
+
+class RecoveryTest(JournalTestCase):
+
+	def _record(self) -> tuple[dict, list[dict]]:
+		entries = [{"op": "insert", "row": {"ID": row_id, "owner": f"u{row_id}"}}
+			for row_id in (1, 2, 3)]
+		entry = {"columns": {"ID": "int", "owner": "str"}, "next_id": 4,
+			"storage": "json", "rows": 3}
+		record = {"logs": {"users": {"offset": 0, "entries": entries}},
+			"metadata": {str(self.meta_file): {"users": entry}}}
+		return record, entries
+
+	def test_torn_record_is_discarded(self) -> None:
+		record, _ = self._record()
+		line = json.dumps(record).encode("utf-8")
+		self.journal.path.write_bytes(line[:len(line) // 2])
+
+		self.assertFalse(self.journal.recover())
+		self.assertEqual(self.journal.path.read_bytes(), b"")
+		self.assertFalse(table_log_path("users").exists())
+		self.assertEqual(load_metadata(self.meta_file), {})
+
+	def test_record_is_reapplied_once(self) -> None:
+		record, entries = self._record()
+		expected = encode_log_entries(entries)
+		# сбой посреди применения: журнал таблицы дописан наполовину
+		table_log_path("users").write_bytes(expected[:len(expected) // 2])
+		self.journal.path.write_bytes(json.dumps(record).encode("utf-8") + b"\n")
+
+		self.assertTrue(self.journal.recover())
+		self.assertEqual(table_log_path("users").read_bytes(), expected)
+		self.assertEqual(load_metadata(self.meta_file)["users"]["next_id"], 4)
+		self.assertEqual(self.journal.path.read_bytes(), b"")
+
+		# повторное применение той же записи журнал таблицы не меняет
+		self.journal.path.write_bytes(json.dumps(record).encode("utf-8") + b"\n")
+		self.assertTrue(self.journal.recover())
+		self.assertEqual(table_log_path("users").read_bytes(), expected)
+
+	def test_store_recovers_on_open(self) -> None:
+		record, _ = self._record()
+		self.journal.path.write_bytes(json.dumps(record).encode("utf-8") + b"\n")
+
+		with Database(TableStore(self.meta_file, self.index_file)) as db:
+			self.assertEqual([row["owner"] for row in db.select("users")],
+				["u1", "u2", "u3"])
+
+
+if __name__ == "__main__":
+	unittest.main()
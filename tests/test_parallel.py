@@ -0,0 +1,76 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.primitive_db import parallel
+from src.primitive_db.columnar import write_columnar
+from src.primitive_db.lazy import LazyTable
+from src.primitive_db.metrics import metrics
+from src.primitive_db.rows import as_row
+from src.primitive_db.where import _scan, parse_condition
+
+_COLUMNS = {"ID": "int", "name": "str", "n": "int"}
+
+
+class ParallelScanTest(unittest.TestCase):
+
+	def setUp(self) -> None:
+		tmp = tempfile.TemporaryDirectory()
+		self.addCleanup(tmp.cleanup)
+		self.path = Path(tmp.name) / "big.col"
+		rows = [as_row({"ID": row_id, "name": f"u{row_id}", "n": row_id % 10})
+			for row_id in range(1, 1001)]
+		write_columnar(str(self.path), _COLUMNS, rows)
+
+	def _scan(self, table: LazyTable, where: str) -> tuple[list, list]:
+		condition = parse_condition(where.split(), _COLUMNS)
+		found = parallel.parallel_scan(table, condition.tree, condition.matches,
+			workers=2)
+		serial = _scan(table.values(), condition.matches)
+		return [row["ID"] for row in found], [row["ID"] for row in serial]
+
+	def test_matches_serial_scan(self) -> None:
+		table = LazyTable(self.path, [])
+		found, serial = self._scan(table, "n = 3")
+		self.assertEqual(found, serial)
+		self.assertEqual(len(found), 100)
+
+	def test_log_changes_are_checked(self) -> None:
+		table = LazyTable(self.path, [
+			{"op": "update", "id": 3, "set": {"n": 4}},
+			{"op": "update", "id": 4, "set": {"n": 3}},
+			{"op": "delete", "ids": [13]},
+			{"op": "insert", "row": {"ID": 1001, "name": "tail", "n": 3}},
+		])
+		found, serial = self._scan(table, "n = 3")
+		self.assertEqual(found, serial)
+		self.assertIn(4, found)
+		self.assertNotIn(3, found)
+		self.assertNotIn(13, found)
+		self.assertEqual(found[-1], 1001)
+
+	def test_scanned_rows_counted_when_closed_early(self) -> None:
+		table = LazyTable(self.path, [])
+		condition = parse_condition(["n", "=", "3"], _COLUMNS)
+		metrics.reset()
+		found = parallel.parallel_scan(table, condition.tree, condition.matches,
+			workers=2)
+		# как при LIMIT 1: перебор закрывается после первой записи
+		self.assertEqual(next(found)["ID"], 3)
+		found.close()
+		scanned = metrics.snapshot()["counters"].get("rows_scanned", 0)
+		self.assertGreater(scanned, 0)
+		self.assertLess(scanned, 1000)
+
+	def test_replaced_snapshot_is_scanned_here(self) -> None:
+		table = LazyTable(self.path, [])
+		# снимок свернули: по пути лежит другой файл, открытый mmap - прежний
+		self.path.unlink()
+		write_columnar(str(self.path), _COLUMNS, [])
+		found, serial = self._scan(table, "n = 3")
+		self.assertEqual(found, serial)
+		self.assertEqual(len(found), 100)
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,94 @@
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from src import decorators
+from src.primitive_db import store as store_module
+from src.primitive_db import utils
+from src.primitive_db.journal import CommitJournal
+from src.primitive_db.server import QueryServer, _ThreadOutput
+from src.primitive_db.store import TableStore
+
+# Сколько запросов выполняется одновременно
+_THREADS = 8
+
+
+class ConcurrentReadTest(unittest.TestCase):
+
+	def setUp(self) -> None:
+		tmp = tempfile.TemporaryDirectory()
+		self.addCleanup(tmp.cleanup)
+		root = Path(tmp.name)
+		(root / "data").mkdir()
+		self.files = (root / "db_meta.json", root / "db_indexes.json")
+		journal = CommitJournal(root / "data" / "commit.journal")
+		output = _ThreadOutput(sys.stdout)
+		for patcher in (mock.patch.object(utils, "DATA_DIR", root / "data"),
+				mock.patch.object(store_module, "commit_journal", lambda: journal),
+				mock.patch.object(sys, "stdout", output)):
+			patcher.start()
+			self.addCleanup(patcher.stop)
+		decorators.set_assume_yes(True)
+		self.addCleanup(decorators.set_assume_yes, False)
+
+		server = self._server(output)
+		for command in ("create_table users name:str age:int",
+				"insert into users values " + ", ".join(f"(u{n}, {n % 50})"
+					for n in range(2000)),
+				"create_index users age sorted"):
+			server.execute(command)
+		server.store.flush()
+		self.output = output
+
+	def _server(self, output: _ThreadOutput) -> QueryServer:
+		server = QueryServer(TableStore(*self.files), workers=_THREADS)
+		server._output = output
+		self.addCleanup(server._pool.shutdown)
+		return server
+
+	def test_first_load_and_index_build_happen_once(self) -> None:
+		server = self._server(self.output)
+		loads, builds = [], []
+		load_table_data = store_module.load_table_data
+		build_index = store_module.build_index
+
+		def slow_load(*args):
+			loads.append(args[0])
+			time.sleep(0.05)
+			return load_table_data(*args)
+
+		def slow_build(*args):
+			builds.append(args[:2])
+			time.sleep(0.05)
+			return build_index(*args)
+
+		barrier = threading.Barrier(_THREADS)
+		outputs = []
+
+		def select(number: int) -> None:
+			barrier.wait()
+			outputs.append(server.execute(f"select from users where age > {number}"))
+
+		with (mock.patch.object(store_module, "load_table_data", slow_load),
+				mock.patch.object(store_module, "build_index", slow_build)):
+			threads = [threading.Thread(target=select, args=(number,))
+				for number in range(_THREADS)]
+			for thread in threads:
+				thread.start()
+			for thread in threads:
+				thread.join()
+
+		self.assertEqual(loads, ["users"])
+		self.assertEqual(builds, [("sorted", "age")])
+		self.assertEqual(len(outputs), _THREADS)
+		for proceed, text in outputs:
+			self.assertTrue(proceed)
+			self.assertIn("u49", text)
+
+
+if __name__ == "__main__":
+	unittest.main()
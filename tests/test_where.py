@@ -0,0 +1,104 @@
+import unittest
+
+from src.primitive_db.indexes import HashIndex, SortedIndex
+from src.primitive_db.rows import as_row, id_of
+from src.primitive_db.utils import split_command
+from src.primitive_db.where import _candidates, find_rows, parse_condition
+
+_COLUMNS = {"ID": "int", "name": "str", "age": "int", "active": "bool"}
+
+
+def _condition(text: str):
+	return parse_condition(split_command(text), _COLUMNS)
+
+
+class ParseConditionTest(unittest.TestCase):
+
+	def test_comparison_values_are_typed(self) -> None:
+		self.assertEqual(_condition("age >= 18").tree, ("cmp", "age", ">=", 18))
+		self.assertEqual(_condition("name = 'Bob'").tree, ("cmp", "name", "=", "Bob"))
+		self.assertEqual(_condition("active != true").tree,
+			("cmp", "active", "!=", True))
+
+	def test_and_binds_tighter_than_or(self) -> None:
+		self.assertEqual(_condition("age > 1 and age < 5 or name = x").tree,
+			("or", ("and", ("cmp", "age", ">", 1), ("cmp", "age", "<", 5)),
+				("cmp", "name", "=", "x")))
+		self.assertEqual(_condition("name = x or age > 1 AND age < 5").tree,
+			("or", ("cmp", "name", "=", "x"),
+				("and", ("cmp", "age", ">", 1), ("cmp", "age", "<", 5))))
+
+	def test_in_and_between(self) -> None:
+		self.assertEqual(_condition("age in (1, 2,3)").tree, ("in", "age", (1, 2, 3)))
+		self.assertEqual(_condition("name in (Alice,Bob)").tree,
+			("in", "name", ("Alice", "Bob")))
+		self.assertEqual(_condition("age between 10 and 20 and active = true").tree,
+			("and", ("between", "age", 10, 20), ("cmp", "active", "=", True)))
+
+	def test_errors(self) -> None:
+		for text in ("nope = 1", "age ~ 1", "age = abc", "age >", "age = 1 name",
+				"age in 1, 2", "age in (1,,2)", "age between 1 2"):
+			with self.subTest(text=text), self.assertRaises(ValueError):
+				_condition(text)
+
+
+class MatchRowsTest(unittest.TestCase):
+
+	def setUp(self) -> None:
+		ages = [9, 10, 25, 100, 10, 42]
+		self.table = {row_id: as_row({"ID": row_id, "name": f"u{row_id}",
+			"age": age, "active": row_id % 2 == 0})
+			for row_id, age in enumerate(ages, start=1)}
+
+	def _ids(self, text: str, indexes: dict | None = None) -> list[int]:
+		return [id_of(row) for row in find_rows(self.table, _condition(text), indexes)]
+
+	def test_int_values_compare_as_numbers(self) -> None:
+		# строки "10" и "9" сравнивались бы наоборот
+		self.assertEqual(self._ids("age > 9"), [2, 3, 4, 5, 6])
+		self.assertEqual(self._ids("age < 10"), [1])
+		self.assertEqual(self._ids("age >= 100"), [4])
+
+	def test_operators(self) -> None:
+		cases = {
+			"age = 10": [2, 5],
+			"age != 10": [1, 3, 4, 6],
+			"age <= 10": [1, 2, 5],
+			"age in (9, 100)": [1, 4],
+			"age between 10 and 42": [2, 3, 5, 6],
+			"name = u3": [3],
+			"active = true": [2, 4, 6],
+			"active = false and age > 9": [3, 5],
+			"age = 9 or age = 42 and active = true": [1, 6],
+			"ID in (2, 7)": [2],
+		}
+		for text, expected in cases.items():
+			with self.subTest(text=text):
+				self.assertEqual(self._ids(text), expected)
+
+	def test_sorted_index_ranges(self) -> None:
+		indexes = {"age": SortedIndex("age", self.table.values())}
+		cases = {
+			"age > 10": [3, 4, 6],
+			"age >= 10": [2, 3, 4, 5, 6],
+			"age < 25": [1, 2, 5],
+			"age <= 25": [1, 2, 3, 5],
+			"age between 10 and 42": [2, 3, 5, 6],
+		}
+		for text, expected in cases.items():
+			with self.subTest(text=text):
+				candidates = _candidates(_condition(text).tree, self.table, indexes)
+				self.assertEqual(sorted(id_of(row) for row in candidates), expected)
+				self.assertEqual(self._ids(text, indexes), expected)
+
+	def test_hash_index_does_not_serve_ranges(self) -> None:
+		indexes = {"age": HashIndex("age", self.table.values())}
+		self.assertIsNone(_candidates(_condition("age > 10").tree, self.table, indexes))
+		self.assertEqual(
+			[id_of(row) for row in _candidates(_condition("age = 10").tree,
+				self.table, indexes)], [2, 5])
+		self.assertEqual(self._ids("age > 10", indexes), [3, 4, 6])
+
+
+if __name__ == "__main__":
+	unittest.main()